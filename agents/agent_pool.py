@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import OrderedDict
+
+AGENT_POOL_MAX_BYTES = 1024 * 1024 * 1024
+AGENT_POOL_IDLE_SECONDS = 30 * 60
+# How often the shared pool evicts idle agents when no requests arrive
+AGENT_POOL_SWEEP_SECONDS = 60
+
+
+class AgentPool:
+    """
+    Bounded pool of per-family RouterAgents shared by all Streamlit sessions.
+
+    Agents are built on first request and evicted least-recently-used first
+    when the pool's estimated size exceeds `max_bytes`, or once they have been
+    idle for `idle_seconds`. Sizes come from `agent.memory_bytes()` and are
+    re-measured on every access, since sub-agents are built lazily. The agent
+    just requested is never evicted, so a single oversized family still works.
+
+    Eviction only drops the pool's reference; a session still holding the
+    agent keeps using it until its request finishes.
+    """
+
+    def __init__(self, factory=None, max_bytes: int = AGENT_POOL_MAX_BYTES,
+                 idle_seconds: float = AGENT_POOL_IDLE_SECONDS):
+        self.factory = factory if factory is not None else _build_router
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        # family -> [agent, size, last_used]; order is LRU order
+        self._entries = OrderedDict()
+        self._build_locks = {}
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"budget": 0, "idle": 0}
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def get(self, family_name: str):
+        """
+        Returns the family's agent, building it if it isn't pooled. Concurrent
+        requests for the same family build it only once.
+        """
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(family_name)
+            if entry is not None:
+                self.hits += 1
+                entry[2] = time.monotonic()
+                self._entries.move_to_end(family_name)
+                agent = entry[0]
+            else:
+                agent = None
+                build_lock = self._build_locks.setdefault(family_name, threading.Lock())
+
+        if agent is None:
+            with build_lock:
+                with self._lock:
+                    # Another session may have built it while we waited
+                    entry = self._entries.get(family_name)
+                    if entry is not None:
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                if entry is not None:
+                    agent = entry[0]
+                else:
+                    agent = self.factory(family_name)
+                    with self._lock:
+                        self._entries[family_name] = [agent, 0, time.monotonic()]
+                        self._build_locks.pop(family_name, None)
+
+        self._measure(family_name, agent)
+        return agent
+
+    def sweep(self):
+        """
+        Evicts idle agents and re-measures the rest; call periodically to
+        release memory when no requests arrive.
+        """
+        with self._lock:
+            self._evict_idle()
+            entries = [(family, entry[0]) for family, entry in self._entries.items()]
+        for family, agent in entries:
+            self._measure(family, agent, protect=False)
+
+    def start_sweeper(self, interval: float = AGENT_POOL_SWEEP_SECONDS):
+        """
+        Calls `sweep` every `interval` seconds in a daemon thread until `stop_sweeper`.
+        """
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._stop.clear()
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, args=(interval,), name="agent-pool-sweeper", daemon=True
+            )
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        with self._lock:
+            sweeper, self._sweeper = self._sweeper, None
+        self._stop.set()
+        if sweeper is not None:
+            sweeper.join()
+
+    def evict(self, family_name: str) -> bool:
+        """
+        Drops a family's agent, e.g. after its data was replaced.
+        """
+        with self._lock:
+            if family_name not in self._entries:
+                return False
+            self._drop(family_name)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": sum(self.evictions.values()),
+                "budget_evictions": self.evictions["budget"],
+                "idle_evictions": self.evictions["idle"],
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "sizes": {family: entry[1] for family, entry in self._entries.items()},
+            }
+
+    def _measure(self, family_name: str, agent, protect: bool = True):
+        """
+        Updates the entry's size and enforces the memory budget. With `protect`,
+        the measured family itself is never evicted.
+        """
+        try:
+            size = agent.memory_bytes()
+        except Exception as e:
+            print(f"Warning: Could not size agent for {family_name} ({e})")
+            return
+        with self._lock:
+            entry = self._entries.get(family_name)
+            if entry is None or entry[0] is not agent:
+                return
+            self.resident_bytes += size - entry[1]
+            entry[1] = size
+            keep = family_name if protect else None
+            for family in list(self._entries):
+                if self.resident_bytes <= self.max_bytes:
+                    break
+                if family != keep:
+                    self._drop(family)
+                    self.evictions["budget"] += 1
+
+    def _sweep_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: Agent pool sweep failed ({e})")
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for family in [family for family, entry in self._entries.items() if entry[2] <= cutoff]:
+            self._drop(family)
+            self.evictions["idle"] += 1
+
+    def _drop(self, family_name: str):
+        entry = self._entries.pop(family_name)
+        self.resident_bytes -= entry[1]
+
+
+def _build_router(family_name: str):
+    # Imported on first build so the pool (and the family picker) loads without langchain
+    from agents.router import RouterAgent
+
+    # Sub-agents start building in the background as soon as the router exists
+    return RouterAgent(family_name=family_name, warm_up=True)
+
+
+_agent_pool = None
+_agent_pool_lock = threading.Lock()
+
+
+def get_agent_pool() -> AgentPool:
+    """
+    Returns the process-wide agent pool shared by every session. Idle agents
+    are swept in the background, so memory is released without new requests.
+    """
+    global _agent_pool
+    with _agent_pool_lock:
+        if _agent_pool is None:
+            _agent_pool = AgentPool()
+            _agent_pool.start_sweeper()
+        return _agent_pool
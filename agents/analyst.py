@@ -1,39 +1,182 @@
-import pandas as pd
-from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
-from langchain_openai import ChatOpenAI
 import os
+from agents.llm_backends import create_chat_model
+from agents.portfolio_rollups import get_rollups
+from agents.portfolio_store import get_portfolio_store
+from agents.query_engine import QueryEngine
+from agents.sql_analyst import SQLAnalyst
+
+# Answers questions the fast path can't: "pandas" (an agent running generated
+# Python over the family frame) or "sql" (generated, read-only SQL over the
+# indexed holdings database).
+ANALYST_BACKEND = os.getenv("WEALTHBRAIN_ANALYST_BACKEND", "pandas")
+# Where the pandas agent's generated code runs: "pool" (isolated worker
+# processes with timeouts and memory limits) or "inline" (this process).
+ANALYST_CODE_EXECUTION = os.getenv("WEALTHBRAIN_ANALYST_CODE_EXECUTION", "pool")
 
 class AnalystAgent:
-    def __init__(self, family_name: str = "Wayne"):
-        self.df = pd.read_csv("data/portfolio.csv")
-        # Filter by family
-        self.df = self.df[self.df['Family'] == family_name]
+    def __init__(self, family_name: str = "Wayne", backend: str = None, code_execution: str = None):
+        # Family view from the shared, parse-once portfolio store
+        self.family_name = family_name
+        self.digest = get_portfolio_store().family_digest(family_name)
+        self.df = get_portfolio_store().family(family_name)
+        self.backend = backend or ANALYST_BACKEND
+        self.code_execution = code_execution or ANALYST_CODE_EXECUTION
         
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0)
-        self.agent = create_pandas_dataframe_agent(
-            self.llm,
-            self.df,
-            verbose=True,
-            allow_dangerous_code=True, # Required for Pandas agent to execute Python
-            agent_type="openai-tools",
+        self.llm = create_chat_model("gpt-4o")
+        self.agent = None
+        self.sql = None
+        if self.backend == "sql":
+            self.sql = SQLAnalyst(family_name, self.llm)
+        else:
+            # langchain_experimental (and the code pool) load only with the pandas backend
+            from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+            from agents.code_pool import PooledPythonTool, get_code_pool
+
+            self.agent = create_pandas_dataframe_agent(
+                self.llm,
+                self.df,
+                verbose=True,
+                allow_dangerous_code=True, # Required for Pandas agent to execute Python
+                agent_type="openai-tools",
+            )
+            if self.code_execution == "pool":
+                # Same tool name and schema the model was given, executed in a worker process
+                self.agent.tools = [PooledPythonTool(family_name=family_name, pool=get_code_pool())]
+        # Deterministic fast path for common aggregations (totals, group-bys, top-N);
+        # portfolio-wide aggregates come from the maintained family rollup
+        self._query_engine = QueryEngine(self.df, rollup=lambda: get_rollups().get(family_name))
+
+    @property
+    def query_engine(self) -> QueryEngine:
+        """
+        The fast-path engine over the family's current rows. It is rebuilt
+        when the family's digest changes, so filtered answers agree with the
+        rollup after a reingest.
+        """
+        self._refresh()
+        return self._query_engine
+
+    def _refresh(self):
+        store = get_portfolio_store()
+        digest = store.family_digest(self.family_name)
+        if digest == self.digest:
+            return
+        df = store.family(self.family_name)
+        self._query_engine = QueryEngine(df, rollup=lambda: get_rollups().get(self.family_name))
+        self.df = df
+        if self.agent is not None and self.code_execution != "pool":
+            # The in-process tool runs against its own `df`; the pooled tool follows the digest itself
+            for tool in self.agent.tools:
+                if isinstance(getattr(tool, "locals", None), dict) and "df" in tool.locals:
+                    tool.locals["df"] = df
+        self.digest = digest
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size of the family view and its fast-path arrays.
+        """
+        engine = self._query_engine
+        return int(
+            self.df.memory_usage(index=True, deep=True).sum()
+            + engine.values.nbytes
+            + engine.names.nbytes
+            + sum(codes.nbytes for codes in engine.codes.values())
         )
 
     def run(self, query: str) -> str:
         """
         Executes the query against the portfolio dataframe.
         """
+        return self.answer(query)["response"]
+
+    def answer(self, query: str) -> dict:
+        """
+        Answers the query via the fast path when it can be parsed, otherwise via the
+        backend. Returns a dictionary with 'response' and 'path' ('fast_path',
+        'llm_agent' or 'sql'); SQL answers also carry the query, its
+        'execution_ms' and 'plan_cache'.
+        """
+        fast_response = self.query_engine.answer(query)
+        if fast_response is not None:
+            return {"response": fast_response, "path": "fast_path"}
+        if self.sql is not None:
+            return {**self.sql.answer(query), "path": "sql"}
+        return {"response": self._run_agent(query), "path": "llm_agent"}
+
+    async def arun(self, query: str) -> str:
+        """
+        Async version of `run`.
+        """
+        return (await self.aanswer(query))["response"]
+
+    async def aanswer(self, query: str) -> dict:
+        """
+        Async version of `answer`; the fast path runs inline, the pandas agent is awaited.
+        """
+        fast_response = self.query_engine.answer(query)
+        if fast_response is not None:
+            return {"response": fast_response, "path": "fast_path"}
+        if self.sql is not None:
+            return {**(await self.sql.aanswer(query)), "path": "sql"}
+        return {"response": await self._arun_agent(query), "path": "llm_agent"}
+
+    async def astream(self, query: str):
+        """
+        Streams the answer. A fast-path answer is yielded in one piece; the
+        pandas agent streams the tokens of its final answer as they arrive; a
+        SQL answer is yielded once the query has run.
+        """
+        fast_response = self.query_engine.answer(query)
+        if fast_response is not None:
+            yield fast_response
+            return
+        if self.sql is not None:
+            yield (await self.sql.aanswer(query))["response"]
+            return
+
+        try:
+            root_run_id = None
+            streamed = False
+            async for event in self.agent.astream_events(self._full_query(query), version="v1"):
+                if root_run_id is None:
+                    root_run_id = event["run_id"]
+                if event["event"] == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        streamed = True
+                        yield content
+                elif event["event"] == "on_chain_end" and event["run_id"] == root_run_id and not streamed:
+                    # Nothing was streamed (e.g. a non-streaming model): emit the final output
+                    yield event["data"]["output"]["output"]
+        except Exception as e:
+            yield f"Error executing analyst query: {str(e)}"
+
+    def _full_query(self, query: str) -> str:
         system_prompt = """
         You are a Data Analyst for a Family Office. You have access to a dataframe `df`.
         When asked for 'Total', sum the `Value_USD` column.
         When asked for 'Liquidity', filter by the `Liquidity` column.
         Always output the final answer in a complete sentence: 'The total value is $X'.
         """
+        if self.code_execution == "pool":
+            system_prompt += "Each Python call starts fresh with only `df` defined; variables from earlier calls are not kept.\n"
         
         # We prepend the system prompt to the query to guide the agent
-        full_query = f"{system_prompt}\n\nQuery: {query}"
-        
+        return f"{system_prompt}\n\nQuery: {query}"
+
+    def _run_agent(self, query: str) -> str:
+        """
+        Executes the query through the LLM pandas agent.
+        """
+        try:
+            response = self.agent.invoke(self._full_query(query))
+            return response["output"]
+        except Exception as e:
+            return f"Error executing analyst query: {str(e)}"
+
+    async def _arun_agent(self, query: str) -> str:
         try:
-            response = self.agent.invoke(full_query)
+            response = await self.agent.ainvoke(self._full_query(query))
             return response["output"]
         except Exception as e:
             return f"Error executing analyst query: {str(e)}"
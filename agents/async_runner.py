@@ -0,0 +1,60 @@
+import asyncio
+import queue
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+_DONE = object()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agents-event-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code (e.g. Streamlit).
+
+    All coroutines share one long-lived background event loop, so async HTTP
+    clients held by the LLM wrappers are never reused across closed loops the
+    way repeated `asyncio.run` calls would. Must not be called from a coroutine
+    running on that loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def iterate_sync(agen):
+    """
+    Iterates an async generator from synchronous code on the shared background
+    loop. The generator runs to completion in a single task (so context
+    variables such as the current trace persist across its yields) and hands
+    items over through a queue. Stopping early cancels and closes it.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put((item, None))
+            items.put((_DONE, None))
+        except Exception as e:
+            items.put((_DONE, e))
+        finally:
+            await agen.aclose()
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _get_loop())
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from agents.agent_pool import get_agent_pool
+from agents.async_runner import run_sync
+from agents.llm_backends import create_chat_model
+from agents.llm_scheduler import BATCH, lane
+from agents.researcher import ResearcherAgent
+from agents.route_classifier import get_route_classifier
+from agents.router import ROUTE_CONFIDENCE_THRESHOLD, create_llm_router, is_answer
+
+# Jobs executed at the same time (and LLM routing calls in flight).
+BATCH_CONCURRENCY = 8
+# Profile used for market questions fetched once for every family in a batch.
+SHARED_RESEARCH_CONTEXT = """
+Client Portfolio Profile (all family offices, nightly report):
+- This brief is shared by several family offices with different holdings.
+- Cover the implications across asset classes (equities, fixed income, real estate, private markets, commodities, cash).
+"""
+
+
+def make_jobs(pairs) -> list:
+    """
+    Turns (family, query) pairs into jobs with ids that are stable across runs,
+    so a rerun over the same input can tell which jobs are already done.
+    """
+    jobs, seen = [], {}
+    for family, query in pairs:
+        occurrence = seen.get((family, query), 0)
+        seen[(family, query)] = occurrence + 1
+        digest = hashlib.sha256(f"{family}\0{query}\0{occurrence}".encode("utf-8")).hexdigest()[:16]
+        jobs.append({"id": digest, "family": family, "query": query})
+    return jobs
+
+
+def load_checkpoint(output_path: str) -> set:
+    """
+    Returns the ids of jobs that already succeeded in `output_path`. A line
+    cut short by a crash is truncated away so new results append cleanly.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    good_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            good_bytes += len(line)
+            # Agents return their failures as "Error ..." responses; those jobs are retried
+            if is_answer(record):
+                done.add(record["id"])
+    if good_bytes < os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(good_bytes)
+    return done
+
+
+class BatchRunner:
+    """
+    Runs (family, query) pairs through the agents with bounded concurrency.
+
+    Work that doesn't depend on the family is done once per batch:
+    - Routing depends only on the question, so each distinct question is routed
+      once; those the local classifier isn't sure of go to the LLM router in a
+      single `abatch` call.
+    - Questions routed to the Researcher are fetched once per distinct question
+      with a batch-wide profile (SHARED_RESEARCH_CONTEXT) rather than per family.
+    Everything else runs through the family's pooled RouterAgent.
+
+    Each result is appended to the output JSONL as soon as it finishes. The
+    file doubles as the checkpoint: rerunning with the same output skips jobs
+    that already succeeded and retries the ones that failed.
+    """
+
+    def __init__(self, concurrency: int = BATCH_CONCURRENCY, router_factory=None, share_research: bool = True,
+                 route_confidence_threshold: float = ROUTE_CONFIDENCE_THRESHOLD):
+        self.concurrency = concurrency
+        # family -> RouterAgent; defaults to the shared, memory-bounded pool
+        self.router_factory = router_factory or get_agent_pool().get
+        self.share_research = share_research
+        self.route_confidence_threshold = route_confidence_threshold
+        self._researcher = None
+        self._research = {}
+        self.stats = {}
+
+    def run(self, pairs, output_path: str, resume: bool = True, on_result=None) -> dict:
+        """
+        Runs the batch and returns a summary. `on_result(record)` is called as
+        each job finishes.
+        """
+        return run_sync(self.arun(pairs, output_path, resume, on_result))
+
+    async def arun(self, pairs, output_path: str, resume: bool = True, on_result=None) -> dict:
+        """
+        Async version of `run`. Model calls go through the scheduler's batch
+        lane, behind interactive requests.
+        """
+        with lane(BATCH):
+            return await self._arun(pairs, output_path, resume, on_result)
+
+    async def _arun(self, pairs, output_path: str, resume: bool, on_result) -> dict:
+        start = time.perf_counter()
+        jobs = make_jobs(pairs)
+        done = load_checkpoint(output_path) if resume else set()
+        pending = [job for job in jobs if job["id"] not in done]
+        self._research = {}
+        self.stats = {"routing_llm_calls": 0, "research_fetches": 0, "completed": 0, "errors": 0}
+
+        routings = await self._aroute_all(sorted({job["query"] for job in pending}))
+        queue = asyncio.Queue()
+        for job in pending:
+            queue.put_nowait(job)
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "a" if resume else "w") as out:
+            async def worker():
+                while not queue.empty():
+                    job = queue.get_nowait()
+                    record = await self._arun_job(job, routings.get(job["query"]))
+                    # Written and synced one line at a time, so a crash loses at most one result
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+                    self.stats["completed"] += 1
+                    self.stats["errors"] += not is_answer(record)
+                    if on_result:
+                        on_result(record)
+
+            await asyncio.gather(*(worker() for _ in range(max(1, min(self.concurrency, len(pending))))))
+
+        seconds = time.perf_counter() - start
+        return {
+            "jobs": len(jobs),
+            "skipped": len(jobs) - len(pending),
+            **self.stats,
+            "seconds": seconds,
+            "queries_per_minute": self.stats["completed"] / seconds * 60 if seconds else 0.0,
+        }
+
+    async def _aroute_all(self, queries: list) -> dict:
+        """
+        Routes each distinct question once. Returns query -> routing (as
+        `RouterAgent.aroute`), or None where the LLM router failed, in which
+        case the family's router routes that job itself.
+        """
+        classifier = get_route_classifier()
+        routings, unsure = {}, []
+        for query in queries:
+            label, confidence = classifier.predict(query)
+            if confidence >= self.route_confidence_threshold:
+                routings[query] = {"route": label, "confidence": confidence, "router": "local"}
+            else:
+                unsure.append((query, confidence))
+        if unsure:
+            llm_router = create_llm_router(create_chat_model("gpt-4o"))
+            outputs = await llm_router.abatch(
+                [{"input": query} for query, _ in unsure],
+                config={"max_concurrency": self.concurrency},
+                return_exceptions=True,
+            )
+            self.stats["routing_llm_calls"] += len(unsure)
+            for (query, confidence), output in zip(unsure, outputs):
+                if isinstance(output, Exception):
+                    routings[query] = None
+                else:
+                    routings[query] = {"route": output.strip(), "confidence": confidence, "router": "llm"}
+        return routings
+
+    async def _arun_job(self, job: dict, routing) -> dict:
+        start = time.perf_counter()
+        try:
+            if self.share_research and routing is not None and _is_research(routing["route"]):
+                result = {"agent": "Researcher", **(await self._ashared_research(job["query"])), "shared": True}
+            else:
+                router = await asyncio.to_thread(self.router_factory, job["family"])
+                result = await router.aroute_and_execute(job["query"], routing)
+        except Exception as e:
+            result = {"agent": "Error", "response": f"Batch error: {str(e)}"}
+        record = {**job, **result}
+        if routing is not None:
+            record["route"] = routing["route"]
+            record["router"] = routing["router"]
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        record["finished_at"] = time.time()
+        return record
+
+    async def _ashared_research(self, query: str) -> dict:
+        """
+        One Researcher fetch per distinct question; concurrent jobs asking the
+        same question wait for the same fetch.
+        """
+        key = " ".join(query.lower().split()).rstrip("?!. ")
+        task = self._research.get(key)
+        if task is None:
+            if self._researcher is None:
+                self._researcher = ResearcherAgent("All families", portfolio_context=SHARED_RESEARCH_CONTEXT)
+            self.stats["research_fetches"] += 1
+            task = self._research[key] = asyncio.ensure_future(self._researcher.aanswer(query))
+        return await asyncio.shield(task)
+
+
+def _is_research(route: str) -> bool:
+    # Same precedence as RouterAgent._aexecute
+    return "Researcher" in route and "Analyst" not in route and "Lawyer" not in route
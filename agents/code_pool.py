@@ -0,0 +1,357 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import re
+import resource
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Optional, Type
+
+import pyarrow as pa
+import pyarrow.ipc
+from langchain_core.pydantic_v1 import BaseModel
+from langchain_core.tools import BaseTool
+from langchain_experimental.tools.python.tool import PythonAstREPLTool, PythonInputs
+
+from agents.portfolio_store import get_portfolio_store
+from agents.tracing import get_tracer, span
+
+# Worker processes running the Analyst's generated code (0 = one per CPU, at most 4).
+CODE_POOL_WORKERS = int(os.getenv("WEALTHBRAIN_CODE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+# Wall-clock limit per snippet; the worker is killed and replaced when it is exceeded.
+CODE_TIMEOUT_SECONDS = float(os.getenv("WEALTHBRAIN_CODE_TIMEOUT_SECONDS", "30"))
+# Memory each worker may allocate beyond what it had reserved at startup (RLIMIT_DATA);
+# the memory-mapped family frames don't count towards it.
+CODE_MEMORY_LIMIT_BYTES = int(os.getenv("WEALTHBRAIN_CODE_MEMORY_MB", "2048")) * 1024 * 1024
+# Family frames exported once as uncompressed Arrow files and memory-mapped by every worker.
+FRAME_DIR = "data/cache/frames"
+WORKER_FRAME_CACHE_SIZE = 32
+CODE_OUTPUT_MAX_CHARS = 20_000
+
+# A new worker that hasn't reported ready within this long is treated as crashed.
+WORKER_START_TIMEOUT_SECONDS = 60.0
+
+_POLL_SECONDS = 0.05
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _worker_main(conn, memory_limit: int):
+    """
+    Worker loop: receives (frame path, code), replies (status, output).
+
+    Frames are read zero-copy from the memory-mapped Arrow files, so all
+    workers share one copy of each family's data in the page cache. Each
+    snippet runs in a fresh namespace holding only `df`.
+    """
+    if memory_limit:
+        # The limit counts reserved address space, which the allocators already
+        # hold plenty of at startup, so it is set relative to that baseline
+        limit = _data_segment_bytes() + memory_limit
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    frames = OrderedDict()
+    conn.send(("ready", ""))
+    while True:
+        try:
+            path, code = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            frame = frames.get(path)
+            if frame is None:
+                table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+                frame = frames[path] = table.to_pandas(split_blocks=True)
+                while len(frames) > WORKER_FRAME_CACHE_SIZE:
+                    frames.popitem(last=False)
+            frames.move_to_end(path)
+            output = "" if code is None else str(PythonAstREPLTool(locals={"df": frame.copy(deep=False)}).run(code))
+        except MemoryError:
+            output = "MemoryError: out of memory"
+        except Exception as e:
+            output = f"{type(e).__name__}: {e}"
+        if output.startswith("MemoryError"):
+            # Exit so the pool starts a fresh worker with its heap returned to the OS
+            conn.send(("memory", output))
+            return
+        if len(output) > CODE_OUTPUT_MAX_CHARS:
+            output = output[:CODE_OUTPUT_MAX_CHARS] + f"\n... (output truncated to {CODE_OUTPUT_MAX_CHARS} characters)"
+        conn.send(("ok", output))
+
+
+def _data_segment_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmData:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class _Worker:
+    def __init__(self, context, memory_limit: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_limit), name="analyst-code-worker", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self) -> bool:
+        if not self.ready:
+            try:
+                self.ready = self.conn.poll(WORKER_START_TIMEOUT_SECONDS) and self.conn.recv()[0] == "ready"
+            except (EOFError, OSError):
+                return False
+        return self.ready
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class CodeExecutionPool:
+    """
+    Pre-started worker processes that run the pandas agent's generated Python
+    instead of the app server process.
+
+    A snippet waits for an idle worker, then runs with a wall-clock timeout
+    and a heap limit; a worker that times out, is cancelled, runs out of
+    memory or crashes is killed and replaced, so a runaway `df.apply` or
+    cartesian merge costs one worker, not every session. Several sessions'
+    snippets run in parallel, one per worker.
+
+    Family frames are exported once per content digest to Arrow files under
+    `frame_dir` and memory-mapped by the workers, never pickled per call.
+    Queue wait, execution time and kills are recorded in the tracer metrics
+    and in `stats()`.
+    """
+
+    def __init__(self, workers: int = CODE_POOL_WORKERS, timeout_seconds: float = CODE_TIMEOUT_SECONDS,
+                 memory_limit: int = CODE_MEMORY_LIMIT_BYTES, frame_dir: str = FRAME_DIR,
+                 store=None, metrics=None):
+        self.workers = workers
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit = memory_limit
+        self.frame_dir = frame_dir
+        self.store = store or get_portfolio_store()
+        self.metrics = metrics if metrics is not None else get_tracer().metrics
+        self._context = multiprocessing.get_context(_START_METHOD)
+        if _START_METHOD == "forkserver":
+            # Workers fork from a server that has already imported this module
+            # (pandas, pyarrow, the REPL tool), so a replacement starts warm
+            self._context.set_forkserver_preload([__name__])
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._started = False
+        self._busy = 0
+        self._waiting = 0
+        self.runs = 0
+        self.kills = Counter()
+        self.queue_wait_seconds = 0.0
+        self.execution_seconds = 0.0
+
+    def run(self, family_name: str, code: str, timeout_seconds: float = None, cancel: threading.Event = None) -> str:
+        """
+        Runs `code` against the family's `df` in a worker and returns its output
+        (as the REPL tool would). Timeouts, cancellation (`cancel` set) and
+        memory exhaustion return an error message instead.
+        """
+        timeout_seconds = self.timeout_seconds if timeout_seconds is None else timeout_seconds
+        with span("code_execution", family=family_name) as exec_span:
+            status, output, waited, elapsed = self._execute(self.frame_path(family_name), code, timeout_seconds, cancel)
+            exec_span.set(status=status, queue_wait_ms=round(waited * 1000, 3), execution_ms=round(elapsed * 1000, 3))
+        with self._lock:
+            self.runs += 1
+            self.queue_wait_seconds += waited
+            self.execution_seconds += elapsed
+        self.metrics.inc("wealthbrain_code_runs_total", (("status", status),))
+        self.metrics.observe("wealthbrain_code_queue_wait_seconds", (), waited)
+        self.metrics.observe("wealthbrain_code_execution_seconds", (("status", status),), elapsed)
+        return output
+
+    async def arun(self, family_name: str, code: str, timeout_seconds: float = None) -> str:
+        """
+        Async version of `run`; cancelling the awaiting task kills the worker.
+        """
+        cancel = threading.Event()
+        try:
+            return await asyncio.to_thread(self.run, family_name, code, timeout_seconds, cancel)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def warm(self, family_names: list):
+        """
+        Exports the families' frames and has every worker map them, so the
+        first question pays neither.
+        """
+        self._start()
+        for family_name in family_names:
+            path = self.frame_path(family_name)
+            # Idle workers are taken in FIFO order, so each one gets the frame once
+            for _ in range(self.workers):
+                self._execute(path, None, self.timeout_seconds, None)
+
+    def frame_path(self, family_name: str) -> str:
+        """
+        Returns the Arrow file holding the family's current rows, writing it
+        if the family changed since it was last exported.
+        """
+        digest = self.store.family_digest(family_name)
+        prefix = re.sub(r"[^A-Za-z0-9_-]", "_", family_name) + "-"
+        path = os.path.join(self.frame_dir, f"{prefix}{digest[:16]}.arrow")
+        if os.path.exists(path):
+            return path
+        with self._export_lock:
+            if not os.path.exists(path):
+                os.makedirs(self.frame_dir, exist_ok=True)
+                table = pa.Table.from_pandas(self.store.family(family_name), preserve_index=False)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                os.replace(tmp_path, path)
+                # Workers still mapping an older export keep it until they drop it
+                stale = re.compile(re.escape(prefix) + r"[0-9a-f]*\.arrow")
+                for name in os.listdir(self.frame_dir):
+                    if stale.fullmatch(name) and name != os.path.basename(path):
+                        os.remove(os.path.join(self.frame_dir, name))
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "queued": self._waiting,
+                "runs": self.runs,
+                "kills": dict(self.kills),
+                "mean_queue_wait_ms": 1000 * self.queue_wait_seconds / self.runs if self.runs else 0.0,
+                "mean_execution_ms": 1000 * self.execution_seconds / self.runs if self.runs else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            started, self._started = self._started, False
+        while started:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.workers):
+            self._idle.put(_Worker(self._context, self.memory_limit))
+
+    def _execute(self, path: str, code, timeout_seconds: float, cancel) -> tuple:
+        """
+        Returns (status, output, queue wait, execution time).
+        """
+        self._start()
+        queued_at = time.monotonic()
+        worker = None
+        with self._lock:
+            self._waiting += 1
+        try:
+            while worker is None:
+                if cancel is not None and cancel.is_set():
+                    return "cancelled", "Cancelled before it ran.", time.monotonic() - queued_at, 0.0
+                try:
+                    worker = self._idle.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    pass
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not worker.wait_ready():
+            # A replacement that failed to start: report it like a crash and start another
+            self._replace(worker, "crashed")
+            return "crashed", "Error: a code worker failed to start.", time.monotonic() - queued_at, 0.0
+        started_at = time.monotonic()
+        waited = started_at - queued_at
+        with self._lock:
+            self._busy += 1
+            busy = self._busy
+        self.metrics.set_gauge("wealthbrain_code_workers_busy", (), busy)
+        try:
+            status, output = self._wait(worker, path, code, started_at + timeout_seconds, cancel)
+        finally:
+            with self._lock:
+                self._busy -= 1
+                busy = self._busy
+            self.metrics.set_gauge("wealthbrain_code_workers_busy", (), busy)
+        elapsed = time.monotonic() - started_at
+        if status == "ok":
+            self._idle.put(worker)
+            return status, output, waited, elapsed
+
+        self._replace(worker, status)
+        if status == "timeout":
+            output = f"TimeoutError: the code ran longer than {timeout_seconds:g}s and was stopped."
+        elif status == "cancelled":
+            output = "Cancelled while running."
+        elif status == "crashed":
+            output = "Error: the code crashed its worker process."
+        return status, output, waited, elapsed
+
+    def _replace(self, worker: _Worker, reason: str):
+        worker.kill()
+        with self._lock:
+            self.kills[reason] += 1
+        self.metrics.inc("wealthbrain_code_kills_total", (("reason", reason),))
+        self._idle.put(_Worker(self._context, self.memory_limit))
+
+    def _wait(self, worker: _Worker, path: str, code, deadline: float, cancel) -> tuple:
+        try:
+            worker.conn.send((path, code))
+            while not worker.conn.poll(_POLL_SECONDS):
+                if cancel is not None and cancel.is_set():
+                    return "cancelled", ""
+                if time.monotonic() >= deadline:
+                    return "timeout", ""
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            return "crashed", ""
+
+
+class PooledPythonTool(BaseTool):
+    """
+    Drop-in for the pandas agent's `python_repl_ast` tool that runs the code
+    in a `CodeExecutionPool` worker against the family's frame.
+    """
+
+    name: str = "python_repl_ast"
+    description: str = PythonAstREPLTool.__fields__["description"].default
+    args_schema: Type[BaseModel] = PythonInputs
+    family_name: str
+    pool: Any = None
+
+    def _run(self, query: str, run_manager: Optional[Any] = None) -> str:
+        return self.pool.run(self.family_name, query)
+
+    async def _arun(self, query: str, run_manager: Optional[Any] = None) -> str:
+        return await self.pool.arun(self.family_name, query)
+
+
+_code_pool = None
+_code_pool_lock = threading.Lock()
+
+
+def get_code_pool() -> CodeExecutionPool:
+    """
+    Returns the process-wide code execution pool; workers start on first use.
+    """
+    global _code_pool
+    with _code_pool_lock:
+        if _code_pool is None:
+            _code_pool = CodeExecutionPool()
+        return _code_pool
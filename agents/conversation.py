@@ -0,0 +1,150 @@
+import re
+import threading
+
+from agents.llm_backends import create_chat_model
+from agents.llm_scheduler import BATCH, lane
+from agents.portfolio_context import CHARS_PER_TOKEN, count_tokens
+
+# Hard cap on the history rendered into a prompt (summary plus recent turns).
+CONVERSATION_TOKEN_BUDGET = 1000
+# Part of the budget the rolling summary may use.
+SUMMARY_TOKEN_BUDGET = 300
+# Turns kept verbatim; older ones are folded into the summary.
+RECENT_TURNS = 3
+# Longest answer kept verbatim in a turn (long tables are clipped).
+TURN_TOKEN_LIMIT = 250
+# Turns waiting for the summary are dropped beyond this if summarizing keeps failing.
+MAX_PENDING_TURNS = 12
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Questions leaning on earlier turns: pronouns, "what about ...", "and ...", "same", ...
+FOLLOW_UP = re.compile(
+    r"\b(?:it|its|that|those|these|them|they|their|this|he|she|him|her|his|same|previous|above|earlier|"
+    r"else|instead|also|too)\b|^\s*(?:and|but|so|then|what about|how about)\b",
+    re.IGNORECASE,
+)
+
+SUMMARY_PROMPT = """You maintain the memory of a conversation between a Family Office client and their AI concierge.
+
+Current summary:
+{summary}
+
+Newer turns:
+{turns}
+
+Write an updated summary of the whole conversation in at most {words} words. Keep the names, assets, figures, dates and open questions the client may refer back to; drop pleasantries. Reply with the summary only."""
+
+
+class Conversation:
+    """
+    Memory of one chat session: the last `recent_turns` turns verbatim and a
+    rolling summary of everything older, rendered within `token_budget`
+    tokens however long the session runs.
+
+    After each answer, turns beyond the recent window are folded into the
+    summary by an LLM call in a background thread (batch lane), off the
+    critical path. Until that finishes they are left out of the context, so
+    a question never waits for a summary. Only the unsummarized turns are
+    stored.
+    """
+
+    def __init__(self, llm=None, token_budget: int = CONVERSATION_TOKEN_BUDGET,
+                 summary_budget: int = SUMMARY_TOKEN_BUDGET, recent_turns: int = RECENT_TURNS):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.recent_turns = recent_turns
+        self.summary = ""
+        self.turn_count = 0
+        self.summary_failures = 0
+        # (question, answer) not yet folded into the summary, oldest first
+        self._turns = []
+        self._lock = threading.Lock()
+        self._summarizer = None
+
+    def add_turn(self, question: str, answer: str):
+        """
+        Records an answered question and starts summarizing older turns in
+        the background if needed. Returns the summarizer thread, if started.
+        """
+        with self._lock:
+            self._turns.append((question, clip_tokens(answer, TURN_TOKEN_LIMIT)))
+            self.turn_count += 1
+            del self._turns[:-(MAX_PENDING_TURNS + self.recent_turns)]
+            if self._summarizer is not None or len(self._turns) <= self.recent_turns:
+                return None
+            self._summarizer = threading.Thread(target=self._summarize, name="conversation-summary", daemon=True)
+            thread = self._summarizer
+        thread.start()
+        return thread
+
+    def context(self) -> str:
+        """
+        The summary and the most recent turns that fit in the token budget,
+        oldest first; empty at the start of a session.
+        """
+        with self._lock:
+            summary, turns = self.summary, self._turns[max(0, len(self._turns) - self.recent_turns):]
+        parts = []
+        budget = self.token_budget
+        if summary:
+            parts.append(f"Summary of the earlier conversation: {summary}")
+            budget -= count_tokens(parts[0])
+        recent = []
+        for question, answer in reversed(turns):
+            text = f"User: {question}\nAssistant: {answer}"
+            tokens = count_tokens(text)
+            if tokens > budget:
+                break
+            recent.append(text)
+            budget -= tokens
+        return "\n\n".join(parts + recent[::-1])
+
+    def is_follow_up(self, question: str) -> bool:
+        """
+        Whether the question likely depends on earlier turns.
+        """
+        return bool(self.summary or self._turns) and FOLLOW_UP.search(question) is not None
+
+    def _summarize(self):
+        try:
+            while True:
+                with self._lock:
+                    older = self._turns[:max(0, len(self._turns) - self.recent_turns)]
+                    summary = self.summary
+                if not older:
+                    return
+                prompt = SUMMARY_PROMPT.format(
+                    summary=summary or "(none yet)",
+                    turns="\n\n".join(f"User: {q}\nAssistant: {a}" for q, a in older),
+                    words=self.summary_budget * 3 // 4,
+                )
+                if self.llm is None:
+                    self.llm = create_chat_model(SUMMARY_MODEL)
+                with lane(BATCH):
+                    text = self.llm.invoke(prompt).content.strip()
+                with self._lock:
+                    self.summary = clip_tokens(text, self.summary_budget)
+                    # Turns up to the newest one summarized; some may have been dropped meanwhile
+                    for i, turn in enumerate(self._turns):
+                        if turn is older[-1]:
+                            del self._turns[:i + 1]
+                            break
+        except Exception as e:
+            self.summary_failures += 1
+            print(f"Warning: Could not summarize the conversation ({e})")
+        finally:
+            with self._lock:
+                self._summarizer = None
+
+
+def clip_tokens(text: str, limit: int) -> str:
+    """
+    Cuts `text` to at most `limit` tokens, marking the cut with "...".
+    """
+    if count_tokens(text) <= limit:
+        return text
+    end = limit * CHARS_PER_TOKEN
+    while end > 0 and count_tokens(text[:end] + " ...") > limit:
+        end = end * 9 // 10
+    return text[:end].rstrip() + " ..."
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import Any, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from agents.llm_backends import set_backends
+
+FAKE_VOCABULARY = (
+    "the portfolio allocation remains resilient while rates and liquidity shift across equities "
+    "real estate private markets cash and fixed income with moderate risk and steady returns"
+).split()
+
+
+class FakeRateLimitError(Exception):
+    """
+    Stand-in for a provider's HTTP 429 response.
+    """
+
+    status_code = 429
+
+    def __init__(self, retry_after: float = None):
+        super().__init__("Rate limit exceeded (fake provider)")
+        self.retry_after = retry_after
+
+
+class FakeRateLimiter:
+    """
+    Provider-side limit of a fake backend: a call beyond `max_requests` in the
+    trailing `window_seconds` is rejected with FakeRateLimitError, like a 429.
+    """
+
+    def __init__(self, max_requests: int, window_seconds: float = 60.0, retry_after: float = None):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.retry_after = retry_after
+        self.accepted = 0
+        self.rejected = 0
+        self._calls = []
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            now = time.monotonic()
+            self._calls = [t for t in self._calls if now - t < self.window_seconds]
+            if len(self._calls) >= self.max_requests:
+                self.rejected += 1
+                raise FakeRateLimitError(self.retry_after)
+            self._calls.append(now)
+            self.accepted += 1
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model with simulated latency.
+
+    The reply is the first `rules` entry whose marker appears in the prompt, or
+    else `response_tokens` words picked deterministically from a hash of the
+    prompt. Latency is `latency_seconds` to the first token plus
+    `token_latency_seconds` per token, both when invoked and when streamed.
+    Any bound tools are ignored, so tool-calling agents finish in one step.
+    With a `rate_limiter`, calls over its limit fail like a 429 response.
+    """
+
+    latency_seconds: float = 0.0
+    token_latency_seconds: float = 0.0
+    response_tokens: int = 40
+    rules: List[Any] = []
+    model_name: str = "fake-chat"
+    rate_limiter: Any = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages) -> tuple:
+        if self.rate_limiter is not None:
+            self.rate_limiter.check()
+        prompt = "\n".join(str(message.content) for message in messages)
+        for marker, reply in self.rules:
+            if marker in prompt:
+                return prompt, reply.split(" ")
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        return prompt, [rng.choice(FAKE_VOCABULARY) for _ in range(self.response_tokens)]
+
+    def _result(self, prompt: str, tokens: list) -> ChatResult:
+        usage = {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt.split()) + len(tokens),
+        }
+        message = AIMessage(content=" ".join(tokens), response_metadata={"token_usage": usage})
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": usage, "model_name": self.model_name},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        prompt, tokens = self._reply(messages)
+        time.sleep(self.latency_seconds + self.token_latency_seconds * len(tokens))
+        return self._result(prompt, tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        prompt, tokens = self._reply(messages)
+        await asyncio.sleep(self.latency_seconds + self.token_latency_seconds * len(tokens))
+        return self._result(prompt, tokens)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        _, tokens = self._reply(messages)
+        time.sleep(self.latency_seconds)
+        for i, token in enumerate(tokens):
+            time.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token if i == 0 else f" {token}"))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        _, tokens = self._reply(messages)
+        await asyncio.sleep(self.latency_seconds)
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token if i == 0 else f" {token}"))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: each text maps to a fixed random unit
+    vector seeded by its hash. Each call costs `latency_seconds` plus
+    `per_text_seconds` per text, and may be rejected by a `rate_limiter`.
+    """
+
+    def __init__(self, size: int = 1536, latency_seconds: float = 0.0, per_text_seconds: float = 0.0,
+                 rate_limiter: FakeRateLimiter = None):
+        self.size = size
+        self.rate_limiter = rate_limiter
+        self.latency_seconds = latency_seconds
+        self.per_text_seconds = per_text_seconds
+        self.model = f"fake-embedding-{size}"
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _delay(self, count: int) -> float:
+        if self.rate_limiter is not None:
+            self.rate_limiter.check()
+        self.calls += 1
+        self.texts += count
+        return self.latency_seconds + self.per_text_seconds * count
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._delay(1))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._delay(1))
+        return self._vector(text)
+
+
+def install_fake_backends(chat_latency: float = 0.0, token_latency: float = 0.0, response_tokens: int = 40,
+                          embedding_latency: float = 0.0, embedding_per_text: float = 0.0,
+                          embedding_size: int = 1536, rules=(), rate_limiters: dict = None) -> dict:
+    """
+    Routes every agent's chat and embedding models to the fakes above. Returns
+    the created instances by kind ("chat", "embeddings") so callers can read
+    their call counters. `rate_limiters` maps a provider ("openai",
+    "perplexity", "embeddings") to a FakeRateLimiter shared by its models.
+    """
+    rate_limiters = rate_limiters or {}
+    created = {"chat": [], "embeddings": []}
+
+    def chat_factory(provider, model, temperature):
+        chat = FakeChatModel(
+            latency_seconds=chat_latency,
+            token_latency_seconds=token_latency,
+            response_tokens=response_tokens,
+            rules=list(rules),
+            model_name=f"fake-{provider}-{model}",
+            rate_limiter=rate_limiters.get(provider),
+        )
+        created["chat"].append(chat)
+        return chat
+
+    def embeddings_factory():
+        embeddings = FakeEmbeddings(embedding_size, embedding_latency, embedding_per_text,
+                                    rate_limiters.get("embeddings"))
+        created["embeddings"].append(embeddings)
+        return embeddings
+
+    set_backends(chat_factory, embeddings_factory)
+    return created
@@ -0,0 +1,318 @@
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from agents.portfolio_store import get_portfolio_store
+
+HOLDINGS_DB_PATH = "data/holdings.sqlite"
+HOLDINGS_COLUMNS = [
+    "Asset_ID", "Asset_Name", "Asset_Class", "Location", "Value_USD",
+    "Custodian", "Liquidity", "Entity_Owner", "Family",
+]
+# The declared schema, also shown to the LLM that writes queries against it.
+HOLDINGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS holdings (
+    Asset_ID TEXT NOT NULL,
+    Asset_Name TEXT NOT NULL,
+    Asset_Class TEXT NOT NULL,
+    Location TEXT NOT NULL,
+    Value_USD REAL NOT NULL,
+    Custodian TEXT NOT NULL,
+    Liquidity TEXT NOT NULL,
+    Entity_Owner TEXT NOT NULL,
+    Family TEXT NOT NULL
+)
+""".strip()
+# Every query is scoped to one family, so each index leads with Family; ending
+# with Value_USD lets sums, group-bys and top-N lists be answered from the index.
+HOLDINGS_INDEXES = {
+    "holdings_family": "Family, Value_USD",
+    "holdings_asset_class": "Family, Asset_Class, Value_USD",
+    "holdings_location": "Family, Location, Value_USD",
+    "holdings_liquidity": "Family, Liquidity, Value_USD",
+    "holdings_custodian": "Family, Custodian, Value_USD",
+}
+# Prepared statements kept per connection, keyed by SQL text.
+STATEMENT_CACHE_SIZE = 256
+# Rows returned to the caller; more are reported as truncated.
+MAX_ROWS = 200
+# Queries running longer than this are interrupted.
+QUERY_TIMEOUT_SECONDS = 10.0
+INSERT_BATCH_ROWS = 100_000
+# Columns whose values are listed in prompts and recognised in questions.
+VALUE_COLUMNS = ["Asset_Class", "Location", "Liquidity", "Custodian"]
+
+# Statement kinds a generated query may use (see `sqlite3.Connection.set_authorizer`).
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# "main.holdings" would name the table itself rather than the family-scoped CTE
+_SCHEMA_QUALIFIED = re.compile(r"(?:\b(?:main|temp)|[\"`\[]\s*(?:main|temp)\s*[\"`\]])\s*\.", re.IGNORECASE)
+# A comment between "main" and ".holdings" would hide the schema from the check above
+_COMMENT = re.compile(r"--|/\*")
+
+
+class QueryError(Exception):
+    """
+    A generated query that was rejected or failed to run.
+    """
+
+
+class HoldingsDatabase:
+    """
+    Holdings in an embedded SQLite file, indexed for per-family queries.
+
+    Rows are copied from the portfolio store family by family and re-copied
+    whenever a family's digest changes, so the table follows `portfolio.csv`
+    like every other view of the holdings. `sync()` loads every family (the
+    indexes are built after a bulk load); after that, each query reloads its
+    family first if the family changed.
+
+    `execute` runs generated SQL on a read-only connection that only allows
+    SELECTs reading the `holdings` table, with the table name bound to the
+    requesting family's rows, so a query can neither write nor see another
+    family's holdings.
+    """
+
+    def __init__(self, path: str = HOLDINGS_DB_PATH, store=None):
+        self.path = path
+        self.store = store or get_portfolio_store()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # family -> digest of the rows currently in the table
+        self._digests = None
+        # family -> {column: values} for VALUE_COLUMNS, saved with the digest
+        self._values = {}
+        # column -> values across all families; cleared whenever a family changes
+        self._known_values = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # WAL lets queries keep reading while a family is being reloaded
+        with contextlib.closing(sqlite3.connect(path)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as conn:
+            conn.execute(HOLDINGS_SCHEMA)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS families (Family TEXT PRIMARY KEY, digest TEXT NOT NULL, column_values TEXT NOT NULL)"
+            )
+            self._create_indexes(conn)
+
+    def sync(self) -> int:
+        """
+        Brings every family in line with the store. Returns the number of
+        families (re)loaded.
+        """
+        families = {name: self.store.family_digest(name) for name in self.store.families()}
+        with self._lock:
+            digests = self._load_digests()
+            stale = [name for name, digest in families.items() if digests.get(name) != digest]
+            removed = [name for name in digests if name not in families]
+            if not stale and not removed:
+                return 0
+            with self._transaction() as conn:
+                # Loading into an empty table is much faster without the indexes
+                bulk = not digests
+                if bulk:
+                    self._drop_indexes(conn)
+                for name in removed:
+                    self._delete_family(conn, name)
+                for name in stale:
+                    self._load_family(conn, name, families[name])
+                if bulk:
+                    self._create_indexes(conn)
+                conn.execute("ANALYZE")
+            return len(stale) + len(removed)
+
+    def ensure_family(self, family_name: str):
+        """
+        Loads or reloads one family if its rows changed in the store.
+        """
+        digest = self.store.family_digest(family_name)
+        with self._lock:
+            if self._load_digests().get(family_name, "") == digest:
+                return
+            with self._transaction() as conn:
+                if digest:
+                    self._load_family(conn, family_name, digest)
+                else:
+                    self._delete_family(conn, family_name)
+
+    def distinct_values(self, family_name: str, column: str) -> list:
+        """
+        The values of one of VALUE_COLUMNS, for prompts and question shapes:
+        the family's, or with `family_name=None` every family's. Recorded when
+        a family is loaded, so this never scans the table.
+        """
+        if column not in VALUE_COLUMNS:
+            raise ValueError(f"Not a listed column: {column}")
+        if family_name is not None:
+            self.ensure_family(family_name)
+        with self._lock:
+            self._load_digests()
+            if family_name is not None:
+                return self._values.get(family_name, {}).get(column, [])
+            known = self._known_values.get(column)
+            if known is None:
+                known = self._known_values[column] = sorted(
+                    {value for values in self._values.values() for value in values[column]}
+                )
+            return known
+
+    def execute(self, family_name: str, sql: str, params: dict = None) -> dict:
+        """
+        Runs one generated SELECT against the family's holdings. Returns
+        {"columns", "rows", "truncated", "execution_ms"}; raises QueryError if
+        the query is not a single read-only SELECT over `holdings` or fails.
+        """
+        self.ensure_family(family_name)
+        statement = _scoped(sql)
+        bound = {**(params or {}), "family": family_name}
+        conn = self._reader()
+        deadline = time.monotonic() + QUERY_TIMEOUT_SECONDS
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+        start = time.perf_counter()
+        try:
+            cursor = conn.execute(statement, bound)
+            rows = cursor.fetchmany(MAX_ROWS + 1)
+        except sqlite3.Error as e:
+            raise QueryError(str(e)) from e
+        finally:
+            conn.set_progress_handler(None, 0)
+        execution_ms = (time.perf_counter() - start) * 1000
+        return {
+            "columns": [d[0] for d in cursor.description],
+            "rows": rows[:MAX_ROWS],
+            "truncated": len(rows) > MAX_ROWS,
+            "execution_ms": execution_ms,
+        }
+
+    def explain(self, family_name: str, sql: str, params: dict = None) -> list:
+        """
+        SQLite's query plan for a generated query (e.g. to check index use).
+        """
+        bound = {**(params or {}), "family": family_name}
+        return [row[-1] for row in self._reader().execute("EXPLAIN QUERY PLAN " + _scoped(sql), bound)]
+
+    def _load_digests(self) -> dict:
+        # Must be called with the lock held
+        if self._digests is None:
+            with self._transaction() as conn:
+                rows = conn.execute("SELECT Family, digest, column_values FROM families").fetchall()
+            self._digests = {family: digest for family, digest, _ in rows}
+            self._values = {family: json.loads(values) for family, _, values in rows}
+            self._known_values = {}
+        return self._digests
+
+    def _load_family(self, conn, family_name: str, digest: str):
+        self._delete_family(conn, family_name)
+        frame = self.store.family(family_name, columns=HOLDINGS_COLUMNS)
+        placeholders = ", ".join("?" * len(HOLDINGS_COLUMNS))
+        for start in range(0, len(frame), INSERT_BATCH_ROWS):
+            chunk = frame.iloc[start:start + INSERT_BATCH_ROWS]
+            columns = [chunk[c].astype(float if c == "Value_USD" else str).tolist() for c in HOLDINGS_COLUMNS]
+            conn.executemany(f"INSERT INTO holdings VALUES ({placeholders})", zip(*columns))
+        values = {column: sorted(frame[column].astype(str).unique().tolist()) for column in VALUE_COLUMNS}
+        conn.execute("INSERT OR REPLACE INTO families VALUES (?, ?, ?)", (family_name, digest, json.dumps(values)))
+        self._digests[family_name] = digest
+        self._values[family_name] = values
+
+    def _delete_family(self, conn, family_name: str):
+        self._known_values = {}
+        conn.execute("DELETE FROM holdings WHERE Family = ?", (family_name,))
+        conn.execute("DELETE FROM families WHERE Family = ?", (family_name,))
+        self._digests.pop(family_name, None)
+        self._values.pop(family_name, None)
+
+    def _create_indexes(self, conn):
+        for name, columns in HOLDINGS_INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON holdings ({columns})")
+
+    def _drop_indexes(self, conn):
+        for name in HOLDINGS_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        A short-lived read-write connection inside one transaction.
+        """
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        # Safe with WAL: a crash can lose the last commits but not corrupt the file
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            conn.execute("BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Re-read which families were actually committed
+            self._digests = None
+            raise
+        finally:
+            conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        """
+        This thread's read-only connection; the authorizer rejects anything
+        but reading `holdings`.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, cached_statements=STATEMENT_CACHE_SIZE
+            )
+            conn.execute("PRAGMA query_only = 1")
+            conn.set_authorizer(_authorize)
+            self._local.conn = conn
+        return conn
+
+
+def _authorize(action, arg1, arg2, db_name, trigger):
+    if action not in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_READ and arg1 != "holdings":
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_FUNCTION and arg2 in ("load_extension", "readfile", "writefile"):
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def _scoped(sql: str) -> str:
+    """
+    Wraps a generated query so `holdings` means the `:family` rows only: a
+    common table expression takes precedence over the table of the same name.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    if ";" in sql or not sqlite3.complete_statement(sql + ";"):
+        raise QueryError("Expected a single SQL statement")
+    unquoted = _STRING_LITERAL.sub("''", sql)
+    if _COMMENT.search(unquoted):
+        raise QueryError("SQL comments are not allowed")
+    if _SCHEMA_QUALIFIED.search(unquoted):
+        raise QueryError("Schema-qualified table names are not allowed")
+    head = sql[:9].upper()
+    scope = "holdings AS (SELECT * FROM main.holdings WHERE Family = :family)"
+    if head.startswith("SELECT"):
+        return f"WITH {scope} {sql}"
+    if head.startswith("WITH") and not head.startswith("WITH RECU"):
+        return f"WITH {scope}, {sql[4:].lstrip()}"
+    raise QueryError("Only SELECT queries are allowed")
+
+
+_holdings_db = None
+_holdings_db_lock = threading.Lock()
+
+
+def get_holdings_db() -> HoldingsDatabase:
+    """
+    Returns the process-wide holdings database used by SQL-backed Analysts.
+    """
+    global _holdings_db
+    with _holdings_db_lock:
+        if _holdings_db is None:
+            _holdings_db = HoldingsDatabase()
+            _holdings_db.sync()
+        return _holdings_db
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import shutil
+
+from langchain_community.document_loaders import TextLoader
+from langchain_community.vectorstores import FAISS
+
+INDEX_DIR = "data/index"
+MANIFEST_NAME = "manifest.json"
+
+
+def hash_files(source_dir: str) -> dict:
+    """
+    Maps each .txt file under `source_dir` (relative path) to its SHA-256.
+    """
+    hashes = {}
+    for dirpath, _, filenames in os.walk(source_dir):
+        for name in sorted(filenames):
+            if not name.endswith(".txt"):
+                continue
+            full_path = os.path.join(dirpath, name)
+            with open(full_path, "rb") as f:
+                hashes[os.path.relpath(full_path, source_dir)] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+class LegalIndexStore:
+    """
+    On-disk FAISS index store with one index per family.
+
+    Each family gets its own folder holding the saved FAISS index plus a manifest
+    of per-file content hashes and the chunk ids produced from each file. On load
+    the manifest is diffed against the documents on disk so that only added,
+    changed or removed files are re-embedded or deleted.
+
+    LawyerAgent now uses the shared multi-tenant `TenantIndex`; this per-family
+    layout is kept as the baseline for benchmark_tenant_index.py.
+    """
+
+    def __init__(self, embeddings, text_splitter, root: str = INDEX_DIR):
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+        self.root = root
+
+    def load(self, family_name: str, source_dir: str) -> FAISS:
+        """
+        Returns the FAISS store for a family, syncing it with `source_dir` first.
+        """
+        index_dir = os.path.join(self.root, family_name)
+        current = hash_files(source_dir)
+        manifest = self._read_manifest(index_dir)
+
+        vector_store = None
+        if manifest is not None:
+            try:
+                # The pickled docstore is written by us, so deserializing it is safe.
+                vector_store = FAISS.load_local(
+                    index_dir, self.embeddings, allow_dangerous_deserialization=True
+                )
+            except Exception as e:
+                print(f"Warning: Could not load index for {family_name} ({e}). Rebuilding.")
+                manifest = None
+
+        if manifest is None:
+            vector_store = None
+            manifest = {"embedding_model": self._model_name(), "files": {}}
+
+        files = manifest["files"]
+        removed = [rel for rel in files if rel not in current]
+        changed = [rel for rel, digest in current.items() if files.get(rel, {}).get("sha256") != digest]
+        if not removed and not changed:
+            return vector_store
+
+        try:
+            vector_store = self._apply_changes(vector_store, source_dir, files, current, removed, changed)
+        except Exception as e:
+            # A half-applied update (e.g. crash between index and manifest writes)
+            # leaves ids out of sync, so start over from the documents on disk.
+            print(f"Warning: Incremental update failed for {family_name} ({e}). Rebuilding.")
+            files = {}
+            vector_store = self._apply_changes(None, source_dir, files, current, [], list(current))
+
+        manifest["files"] = files
+        self._save(index_dir, vector_store, manifest)
+        return vector_store
+
+    def _apply_changes(self, vector_store, source_dir, files, current, removed, changed):
+        """
+        Deletes the chunks of removed/changed files and embeds the chunks of
+        added/changed files, updating `files` in place.
+        """
+        stale_ids = []
+        for rel in removed + changed:
+            entry = files.pop(rel, None)
+            if entry:
+                stale_ids.extend(entry["chunk_ids"])
+
+        new_docs, new_ids = [], []
+        for rel in changed:
+            digest = current[rel]
+            docs = TextLoader(os.path.join(source_dir, rel)).load()
+            splits = self.text_splitter.split_documents(docs)
+            ids = [f"{rel}#{digest[:12]}#{i}" for i in range(len(splits))]
+            files[rel] = {"sha256": digest, "chunk_ids": ids}
+            new_docs.extend(splits)
+            new_ids.extend(ids)
+
+        if vector_store is None:
+            if not new_docs:
+                raise ValueError(f"No documents found in {source_dir}")
+            return FAISS.from_documents(new_docs, self.embeddings, ids=new_ids)
+
+        if stale_ids:
+            vector_store.delete(stale_ids)
+        if new_docs:
+            vector_store.add_documents(new_docs, ids=new_ids)
+        return vector_store
+
+    def _read_manifest(self, index_dir: str):
+        try:
+            with open(os.path.join(index_dir, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Vectors from a different embedding model are not comparable.
+        if manifest.get("embedding_model") != self._model_name():
+            return None
+        return manifest
+
+    def _save(self, index_dir: str, vector_store: FAISS, manifest: dict):
+        os.makedirs(index_dir, exist_ok=True)
+        vector_store.save_local(index_dir)
+        tmp_path = os.path.join(index_dir, MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(index_dir, MANIFEST_NAME))
+
+    def _model_name(self) -> str:
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+    def drop(self, family_name: str):
+        """
+        Removes the saved index for a family.
+        """
+        shutil.rmtree(os.path.join(self.root, family_name), ignore_errors=True)
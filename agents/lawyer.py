@@ -1,48 +1,79 @@
+import asyncio
 import os
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain.chains.retrieval import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
+from agents.legal_facts import answer_from_facts
+from agents.llm_backends import create_chat_model
+from agents.tenant_index import DEFAULT_RETRIEVAL_MODE, get_tenant_index
 
 class LawyerAgent:
-    def __init__(self, family_name: str = "Wayne"):
+    def __init__(self, family_name: str = "Wayne", retrieval_mode: str = DEFAULT_RETRIEVAL_MODE):
         self.family_name = family_name.lower()
-        self.embeddings = OpenAIEmbeddings()
-        self.vector_store = self._build_vector_store()
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0)
+        # See RETRIEVAL_MODES; "auto" skips the query embedding for questions naming a known person or asset
+        self.retrieval_mode = retrieval_mode
+        # One index shared by all families; searches only see this family's chunks
+        self.index = get_tenant_index()
+        self.embeddings = self.index.embeddings
+        self.doc_path = f"data/legal_docs/{self.family_name}"
+        self._doc_signature = None
+        self.has_documents = self._sync_documents()
+        self.llm = create_chat_model("gpt-4o")
         
-    def _build_vector_store(self):
+    def _sync_documents(self) -> bool:
         """
-        Loads documents, splits them, and creates a FAISS vector store.
-        In a real app, this would persist to disk and load if exists.
+        Syncs the family's documents into the shared index, re-embedding only the
+        files that were added, changed or removed. Returns False if the family
+        has no documents; there is deliberately no fallback to another family's.
         """
-        # Load from specific family directory
-        path = f"data/legal_docs/{self.family_name}"
+        path = self.doc_path
+        self._doc_signature = self._signature()
         if not os.path.exists(path):
-            print(f"Warning: Path {path} does not exist. Using default.")
-            path = "data/legal_docs/wayne"
-            
-        loader = DirectoryLoader(path, glob="**/*.txt", loader_cls=TextLoader)
-        docs = loader.load()
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100
+            print(f"Warning: Path {path} does not exist. No legal documents for {self.family_name}.")
+        self.index.sync(self.family_name, path)
+        return self.index.has_tenant(self.family_name)
+
+    def _signature(self) -> tuple:
+        """
+        Names, sizes and mtimes of the family's documents; cheap enough to check per question.
+        """
+        if not os.path.isdir(self.doc_path):
+            return ()
+        return tuple(
+            (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in sorted(os.scandir(self.doc_path), key=lambda entry: entry.name)
         )
-        splits = text_splitter.split_documents(docs)
-        
-        vector_store = FAISS.from_documents(splits, self.embeddings)
-        return vector_store
 
-    def run(self, query: str) -> str:
+    def _refresh(self):
         """
-        Executes the query against the legal documents.
+        Re-syncs if the documents changed since the last sync, so answers
+        (facts and retrieval alike) never come from an older version.
+        """
+        if self._signature() != self._doc_signature:
+            self.has_documents = self._sync_documents()
+
+    def fact_answer(self, query: str):
+        """
+        The answer from the family's extracted fact table when the question is
+        a plain lookup (beneficiaries, trustee, trust assets, premium, ...),
+        otherwise None.
         """
-        retriever = self.vector_store.as_retriever(search_type="mmr")
+        self._refresh()
+        if not self.has_documents:
+            return None
+        return answer_from_facts(query, self.index.facts(self.family_name), self.family_name)
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size of this family's share of the shared index.
+        """
+        return self.index.tenant_bytes(self.family_name)
+
+    def _build_chain(self):
+        """
+        Builds the retrieval chain over the family's chunks (BM25 and vectors).
+        """
+        retriever = self.index.as_retriever(self.family_name, mode=self.retrieval_mode)
         
         system_prompt = (
             "You are a Lawyer for a Family Office. "
@@ -62,13 +93,73 @@ class LawyerAgent:
         )
         
         question_answer_chain = create_stuff_documents_chain(self.llm, prompt)
-        rag_chain = create_retrieval_chain(retriever, question_answer_chain)
-        
+        return create_retrieval_chain(retriever, question_answer_chain)
+
+    def _no_documents_message(self) -> str:
+        return f"No legal documents are on file for the {self.family_name.title()} family."
+
+    def run(self, query: str) -> str:
+        """
+        Executes the query against the legal documents.
+        """
+        return self.answer(query)["response"]
+
+    def answer(self, query: str) -> dict:
+        """
+        Answers from the fact table when possible, otherwise via retrieval and
+        the LLM. Returns a dictionary with 'response' and 'path'.
+        """
+        fact_response = self.fact_answer(query)
+        if fact_response is not None:
+            return {"response": fact_response, "path": "fast_path"}
+        if not self.has_documents:
+            return {"response": self._no_documents_message(), "path": "rag"}
+        try:
+            response = self._build_chain().invoke({"input": query})
+            return {"response": response["answer"], "path": "rag"}
+        except Exception as e:
+            return {"response": f"Error executing lawyer query: {str(e)}", "path": "rag"}
+
+    async def arun(self, query: str) -> str:
+        """
+        Async version of `run`.
+        """
+        return (await self.aanswer(query))["response"]
+
+    async def aanswer(self, query: str) -> dict:
+        """
+        Async version of `answer`.
+        """
+        # A document change means a re-sync (embedding calls, file I/O): keep it off the event loop
+        fact_response = await asyncio.to_thread(self.fact_answer, query)
+        if fact_response is not None:
+            return {"response": fact_response, "path": "fast_path"}
+        if not self.has_documents:
+            return {"response": self._no_documents_message(), "path": "rag"}
+        try:
+            response = await self._build_chain().ainvoke({"input": query})
+            return {"response": response["answer"], "path": "rag"}
+        except Exception as e:
+            return {"response": f"Error executing lawyer query: {str(e)}", "path": "rag"}
+
+    async def astream(self, query: str):
+        """
+        Streams the answer tokens as they are generated. A fact-table answer is
+        yielded in one piece.
+        """
+        fact_response = await asyncio.to_thread(self.fact_answer, query)
+        if fact_response is not None:
+            yield fact_response
+            return
+        if not self.has_documents:
+            yield self._no_documents_message()
+            return
         try:
-            response = rag_chain.invoke({"input": query})
-            return response["answer"]
+            async for chunk in self._build_chain().astream({"input": query}):
+                if chunk.get("answer"):
+                    yield chunk["answer"]
         except Exception as e:
-            return f"Error executing lawyer query: {str(e)}"
+            yield f"Error executing lawyer query: {str(e)}"
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
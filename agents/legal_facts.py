@@ -0,0 +1,170 @@
+import re
+
+# Document labels -> fact fields. Lines like "Trustee: X", list headings like
+# "I. BENEFICIARIES" or "Assets Held:" and "I appoint X as the executor".
+FIELD_LABELS = {
+    "beneficiaries": "beneficiaries",
+    "executor": "executor",
+    "trustee": "trustee",
+    "assets held": "trust_assets",
+    "purpose": "purpose",
+    "coverage": "coverage",
+    "premium": "premium",
+    "exclusions": "exclusions",
+    "risk tolerance": "risk_tolerance",
+    "target return": "target_return",
+    "restrictions": "restrictions",
+}
+# Dropped from questions before matching, so "Who is the trustee of my family trust?" reads "who is trustee of trust"
+FILLER_WORDS = frozenset("the my our a an please family currently all named".split())
+
+_HEADING = re.compile(r"^[IVXLC]+\.\s+(.+)$")
+_ITEM = re.compile(r"^(?:\d+\.|[-*•])\s+(.+)$")
+_LABEL = re.compile(r"^([A-Za-z][A-Za-z ]{1,40}):\s*(.*)$")
+_APPOINT = re.compile(r"\bappoints?\s+(.+?)\s+as\s+(?:the\s+|my\s+|our\s+)?(executor|trustee)\b", re.IGNORECASE)
+
+_DOC = r"(?:will|estate|trust|trust deed|deed|insurance|insurance policy|policy|investment mandate|mandate|investment agreement|agreement)"
+_PREPOSITIONS = r"(?:of|in|under|for|on|from|by)"
+# "of the Wayne family trust" is matched as "of trust": the family's own name is removed first
+_TAIL = rf"(?: {_PREPOSITIONS}(?: house)?(?: (?P<doc>{_DOC}))?)?"
+# Document named in a question -> word its file name contains (will.txt, trust_deed.txt, ...)
+DOCUMENT_FILES = {
+    "will": "will", "estate": "will",
+    "trust": "trust", "trust deed": "trust", "deed": "trust",
+    "insurance": "insurance", "insurance policy": "insurance", "policy": "insurance",
+    "investment mandate": "investment", "mandate": "investment",
+    "investment agreement": "investment", "agreement": "investment",
+}
+# (field, kind, pattern) tried against the whole normalised question. "list"
+# answers with every value; "member" checks the captured name against them.
+QUESTION_PATTERNS = [
+    ("beneficiaries", "list", rf"(?:who (?:is|are)|list|name|what are|show) beneficiar(?:y|ies){_TAIL}"),
+    ("beneficiaries", "member", rf"(?:is|are) (?P<name>.+?) (?:an? )?beneficiar(?:y|ies){_TAIL}"),
+    ("executor", "list", rf"who (?:is|are) executors?{_TAIL}"),
+    ("trustee", "list", rf"who (?:is|are) trustees?{_TAIL}"),
+    ("trust_assets", "list", rf"(?:what|which|list) assets (?:are |does )?(?:held|hold|in trust|held (?:in|by) trust|trust hold){_TAIL}"),
+    ("trust_assets", "member", rf"does trust (?:hold|own|include) (?P<name>.+?){_TAIL}"),
+    ("trust_assets", "member", rf"is (?P<name>.+?) (?:held (?:in|by)|owned by|in|part of) trust{_TAIL}"),
+    ("purpose", "list", rf"what is purpose{_TAIL}"),
+    ("premium", "list", rf"(?:what is|how much is) (?:annual )?(?:insurance )?premium(?: per annum| per year)?{_TAIL}"),
+    ("coverage", "list", rf"what (?:is|does) (?:insurance )?(?:policy )?(?:coverage|cover){_TAIL}"),
+    ("exclusions", "list", rf"(?:what (?:are|does) (?:insurance )?(?:policy )?(?:exclusions|exclude)|what is (?:not covered|excluded)){_TAIL}"),
+    ("risk_tolerance", "list", rf"what is (?:investment )?(?:mandate )?risk (?:tolerance|appetite|profile){_TAIL}"),
+    ("target_return", "list", rf"what is (?:investment )?(?:mandate )?target return{_TAIL}"),
+    ("restrictions", "list", rf"what (?:are )?(?:investment )?(?:mandate )?restrictions{_TAIL}"),
+]
+QUESTION_PATTERNS = [(field, kind, re.compile(pattern)) for field, kind, pattern in QUESTION_PATTERNS]
+ANSWER_TEMPLATES = {
+    "beneficiaries": "The beneficiaries are {values}.",
+    "executor": "The executor is {values}.",
+    "trustee": "The trustee is {values}.",
+    "trust_assets": "The trust holds {values}.",
+    "purpose": "The purpose of the trust is: {values}.",
+    "coverage": "The insurance coverage is: {values}.",
+    "premium": "The premium is {values}.",
+    "exclusions": "The insurance policy excludes: {values}.",
+    "risk_tolerance": "The investment mandate's risk tolerance is {values}.",
+    "target_return": "The investment mandate's target return is {values}.",
+    "restrictions": "The investment mandate's restrictions: {values}.",
+}
+MEMBER_NOUNS = {"beneficiaries": "a named beneficiary", "trust_assets": "held by the trust"}
+
+
+def extract_facts(text: str) -> dict:
+    """
+    Structured facts from one legal document: field -> list of values.
+    """
+    facts, section = {}, None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            section = None
+            continue
+        heading, item, label = _HEADING.match(line), _ITEM.match(line), _LABEL.match(line)
+        if heading:
+            section = FIELD_LABELS.get(heading.group(1).strip().lower())
+        elif item and section:
+            facts.setdefault(section, []).append(_clean(item.group(1)))
+        elif label:
+            field = FIELD_LABELS.get(label.group(1).strip().lower())
+            section = field if not label.group(2) else None
+            if field and label.group(2):
+                facts.setdefault(field, []).append(_clean(label.group(2)))
+        for name, role in _APPOINT.findall(line):
+            facts.setdefault(role.lower(), []).append(_clean(name))
+    return facts
+
+
+def merge_facts(files: dict) -> dict:
+    """
+    Combines {file: facts} into field -> {"values": [...], "files": [...],
+    "by_file": {file: [...]}}.
+    """
+    merged = {}
+    for rel in sorted(files):
+        for field, values in files[rel].items():
+            entry = merged.setdefault(field, {"values": [], "files": [], "by_file": {}})
+            entry["values"].extend(v for v in values if v not in entry["values"])
+            entry["files"].append(rel)
+            entry["by_file"][rel] = list(values)
+    return merged
+
+
+def answer_from_facts(query: str, facts: dict, family_name: str = "") -> str:
+    """
+    Answers a question from a family's merged facts, or returns None when it
+    isn't a plain lookup of a known field (the caller then uses RAG). The
+    whole question must match, so "Who is the trustee and how is she paid?"
+    is not answered with just the trustee.
+
+    A question naming a document ("... of the trust") is only answered from
+    facts extracted from that document. A name that isn't among the extracted
+    values is left to RAG rather than answered "No", since the extraction
+    may have missed it.
+    """
+    question = _normalise(query)
+    family = _normalise(family_name)
+    if family:
+        question = re.sub(rf"\b({_PREPOSITIONS}(?: house)?) {re.escape(family)}\b", r"\1", question)
+    for field, kind, pattern in QUESTION_PATTERNS:
+        match = pattern.fullmatch(question)
+        if not match or field not in facts:
+            continue
+        entry = facts[field]
+        files = entry["files"]
+        if match.group("doc"):
+            word = DOCUMENT_FILES[match.group("doc")]
+            files = [rel for rel in files if word in rel.lower()]
+            if not files:
+                return None
+        values = []
+        for rel in files:
+            values.extend(v for v in entry.get("by_file", {}).get(rel, entry["values"]) if v not in values)
+        source = f" (Source: {', '.join(files)})"
+        if kind == "list":
+            return ANSWER_TEMPLATES[field].format(values=_join(values)) + source
+        found = _matching(match.group("name"), values)
+        if not found:
+            return None
+        verb = "is" if len(found) == 1 else "are"
+        return f"Yes. {_join(found)} {verb} {MEMBER_NOUNS[field]}.{source}"
+    return None
+
+
+def _matching(name: str, values: list) -> list:
+    # Every word asked for must appear in the value: "Tim" finds "Tim Drake", "Bruce Wayne" doesn't find "Damian Wayne"
+    words = set(name.split())
+    return [value for value in values if words <= set(_normalise(value).split())]
+
+
+def _normalise(text: str) -> str:
+    words = re.sub(r"[^a-z0-9%' ]+", " ", text.lower().replace("’", "'")).replace("'s ", " ").split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+def _clean(value: str) -> str:
+    return value.strip().rstrip(".").strip()
+
+
+def _join(values: list) -> str:
+    return values[0] if len(values) == 1 else ", ".join(values[:-1]) + " and " + values[-1]
@@ -0,0 +1,125 @@
+import math
+import re
+from collections import Counter
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant: score = sum(1 / (RRF_K + rank))
+RRF_K = 60
+STOPWORDS = frozenset(
+    "a an and any are as at be by do does for from has have how i in is it me my of on or our "
+    "the their there this to was we what when where which who whom will with".split()
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Two or more capitalised words ("Tim Drake", "Casterly Rock"); all-caps headings don't match
+_ENTITY = re.compile(r"\b[A-Z][a-z0-9'’]+(?:[ \t]+[A-Z][a-z0-9'’]+)+\b")
+
+
+def tokenize(text: str) -> list:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def extract_entities(text: str) -> set:
+    """
+    Proper names in a document, lowercased with whitespace collapsed.
+    """
+    return {" ".join(match.lower().split()) for match in _ENTITY.findall(text)}
+
+
+def reciprocal_rank_fusion(*rankings) -> list:
+    """
+    Fuses ranked id lists into one, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """
+    Per-family BM25 inverted index over the same chunk ids as `TenantIndex`.
+
+    Each family has its own postings and statistics, so term weights come
+    only from that family's documents and a search can never see another
+    family's chunks. Also keeps the proper names found in each family's
+    chunks, used to spot queries that name a known person or asset.
+    Not thread-safe on its own; `TenantIndex` calls it under its lock.
+    """
+
+    def __init__(self):
+        # family -> term -> {chunk id: term frequency}
+        self._postings = {}
+        # family -> {chunk id: length in tokens}
+        self._lengths = {}
+        # family -> Counter(entity -> number of chunks mentioning it)
+        self._entities = {}
+        # chunk id -> (family, terms, entities), for removal
+        self._chunks = {}
+
+    def add(self, chunk_id: int, family_name: str, text: str):
+        terms = Counter(tokenize(text))
+        entities = extract_entities(text)
+        postings = self._postings.setdefault(family_name, {})
+        for term, tf in terms.items():
+            postings.setdefault(term, {})[chunk_id] = tf
+        self._lengths.setdefault(family_name, {})[chunk_id] = sum(terms.values())
+        self._entities.setdefault(family_name, Counter()).update(entities)
+        self._chunks[chunk_id] = (family_name, list(terms), entities)
+
+    def remove(self, chunk_id: int):
+        family_name, terms, entities = self._chunks.pop(chunk_id)
+        postings = self._postings[family_name]
+        for term in terms:
+            del postings[term][chunk_id]
+            if not postings[term]:
+                del postings[term]
+        del self._lengths[family_name][chunk_id]
+        self._entities[family_name].subtract(entities)
+        self._entities[family_name] += Counter()  # drops zero counts
+        if not self._lengths[family_name]:
+            del self._postings[family_name], self._lengths[family_name], self._entities[family_name]
+
+    def search(self, family_name: str, query: str, k: int = 4) -> list:
+        """
+        Top `k` (chunk id, BM25 score) pairs from the family's chunks. Chunks
+        sharing no term with the query are not returned.
+        """
+        lengths = self._lengths.get(family_name)
+        if not lengths:
+            return []
+        postings = self._postings[family_name]
+        count = len(lengths)
+        average = sum(lengths.values()) / count or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            matches = postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (count - len(matches) + 0.5) / (len(matches) + 0.5))
+            for chunk_id, tf in matches.items():
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[chunk_id] / average)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def entities_in(self, family_name: str, query: str) -> list:
+        """
+        The family's known entity names that appear in the query (case-insensitive).
+        """
+        entities = self._entities.get(family_name)
+        if not entities:
+            return []
+        text = " ".join(query.lower().split())
+        return [entity for entity in entities if re.search(r"\b" + re.escape(entity) + r"\b", text)]
+
+    def chunk_entities(self, chunk_id: int) -> set:
+        return self._chunks[chunk_id][2]
+
+    def memory_bytes(self) -> int:
+        """
+        Rough size of the postings (about 100 bytes per posting).
+        """
+        return 100 * sum(len(terms) for _, terms, _ in self._chunks.values())
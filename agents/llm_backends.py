@@ -0,0 +1,52 @@
+import os
+import threading
+
+from agents.llm_scheduler import ScheduledChatModel, ScheduledEmbeddings
+
+_chat_factory = None
+_embeddings_factory = None
+_backends_lock = threading.Lock()
+
+
+def set_backends(chat_factory=None, embeddings_factory=None):
+    """
+    Replaces the model constructors used by every agent, e.g. with the
+    deterministic fakes in agents.fake_backends for offline benchmarks.
+    `chat_factory(provider, model, temperature)` returns a chat model and
+    `embeddings_factory()` an Embeddings instance; None restores the real ones.
+    Call before the agents (and the shared caches and indexes) are built.
+    """
+    global _chat_factory, _embeddings_factory
+    with _backends_lock:
+        _chat_factory = chat_factory
+        _embeddings_factory = embeddings_factory
+
+
+def create_chat_model(model: str = "gpt-4o", provider: str = "openai", temperature: float = 0):
+    """
+    Returns the chat model for `provider` ("openai" or "perplexity"). Every
+    call goes through the shared rate-limit scheduler, which also owns retries.
+    """
+    if _chat_factory is not None:
+        chat = _chat_factory(provider=provider, model=model, temperature=temperature)
+    elif provider == "perplexity":
+        # Client libraries are imported on first use; the fakes never need them
+        from langchain_community.chat_models import ChatPerplexity
+        chat = ChatPerplexity(temperature=temperature, pplx_api_key=os.getenv("PERPLEXITY_API_KEY"), model=model,
+                              max_retries=0)
+        # ChatPerplexity ignores max_retries and builds its OpenAI client with the SDK's default retries
+        chat.client = chat.client.with_options(max_retries=0)
+    else:
+        from langchain_openai import ChatOpenAI
+        chat = ChatOpenAI(model=model, temperature=temperature, max_retries=0)
+    return ScheduledChatModel(inner=chat, provider=provider)
+
+
+def create_embeddings():
+    """
+    Returns the (uncached) embedding model, rate limited by the shared scheduler.
+    """
+    if _embeddings_factory is not None:
+        return ScheduledEmbeddings(_embeddings_factory())
+    from langchain_openai import OpenAIEmbeddings
+    return ScheduledEmbeddings(OpenAIEmbeddings(max_retries=0))
@@ -0,0 +1,480 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from agents.tracing import get_tracer
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Lower rank is served first
+LANE_RANKS = {INTERACTIVE: 0, BATCH: 1}
+
+# Requests and tokens per minute per provider; override with e.g.
+# WEALTHBRAIN_OPENAI_RPM / WEALTHBRAIN_OPENAI_TPM.
+PROVIDER_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 150_000},
+    "perplexity": {"rpm": 50, "tpm": 200_000},
+    "embeddings": {"rpm": 3_000, "tpm": 1_000_000},
+}
+# Share of each bucket the batch lane leaves for interactive requests.
+BATCH_HEADROOM = 0.2
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+# Completion size assumed when reserving tokens; corrected from the reported usage.
+COMPLETION_TOKEN_ESTIMATE = 256
+CHARS_PER_TOKEN = 4
+# Longest sleep between admission checks while queued behind another request
+POLL_SECONDS = 0.05
+
+_lane = contextvars.ContextVar("wealthbrain_llm_lane", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def lane(name: str):
+    """
+    Runs the LLM and embedding calls made inside the block (including tasks
+    and threads started from it) in the given lane, e.g. `with lane(BATCH):`.
+    """
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """
+    Refills continuously at `per_minute / 60` units per second, up to one
+    minute's worth. The level may go negative when actual usage exceeds what
+    was reserved; later requests then wait for the debt to be repaid.
+    """
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """
+        Seconds until `amount` can be taken while leaving `reserve` (a share of
+        capacity) in the bucket.
+        """
+        self._refill()
+        floor = self.capacity * reserve
+        # A request larger than the bucket only waits for a full bucket
+        amount = min(amount, self.capacity - floor)
+        missing = amount + floor - self.level
+        return max(0.0, missing / self.rate) if self.rate else 0.0
+
+    def take(self, amount: float):
+        """
+        Takes `amount` (a negative amount returns unused reservation).
+        """
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class ProviderQueue:
+    """
+    Rate limits and waiting requests of one provider.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float, clock=time.monotonic):
+        self.name = name
+        self.requests = TokenBucket(rpm, clock)
+        self.tokens = TokenBucket(tpm, clock)
+        # Heap of tickets [lane rank, seq, lane, tokens, enqueued at]
+        self.waiters = []
+        self.depth = {lane_name: 0 for lane_name in LANE_RANKS}
+        self.cooldown_until = 0.0
+
+
+class LLMScheduler:
+    """
+    Admits every LLM and embedding call under per-provider rate limits.
+
+    Each provider has a requests-per-minute and a tokens-per-minute token
+    bucket. Waiting requests are served in priority order: interactive before
+    batch, then first come first served. The batch lane also stops short of
+    the last BATCH_HEADROOM of each bucket, so bulk work can't starve users.
+    Rate-limit (429) and transient server errors are retried with jittered
+    exponential backoff (or the provider's Retry-After), and pause the whole
+    provider meanwhile. Queue depth, wait time, retries and 429s are exported
+    through the tracer's Prometheus metrics.
+    """
+
+    def __init__(self, limits: dict = None, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE_SECONDS, backoff_max: float = BACKOFF_MAX_SECONDS,
+                 batch_headroom: float = BATCH_HEADROOM, metrics=None, clock=time.monotonic, rng=None):
+        self.limits = limits or _limits_from_env()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_headroom = batch_headroom
+        self.metrics = metrics if metrics is not None else get_tracer().metrics
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._queues = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def call(self, provider: str, fn, tokens: int = 0, usage=None):
+        """
+        Runs `fn()` once admitted, retrying rate-limited and transient errors.
+        `usage(result)` may return the tokens actually used, to correct the
+        reservation.
+        """
+        for attempt in itertools.count():
+            ticket = self.acquire(provider, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(self.backoff(provider, e, attempt))
+                continue
+            self._settle(provider, ticket, result, usage)
+            return result
+
+    async def acall(self, provider: str, fn, tokens: int = 0, usage=None):
+        """
+        Async version of `call`; `fn()` returns an awaitable.
+        """
+        for attempt in itertools.count():
+            ticket = await self.aacquire(provider, tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(self.backoff(provider, e, attempt))
+                continue
+            self._settle(provider, ticket, result, usage)
+            return result
+
+    def acquire(self, provider: str, tokens: int = 0) -> list:
+        """
+        Blocks until the request may be sent. Returns its ticket.
+        """
+        ticket = self._enqueue(provider, tokens)
+        admitted = False
+        try:
+            while True:
+                wait = self._poll(provider, ticket)
+                if wait == 0:
+                    admitted = True
+                    return ticket
+                time.sleep(wait)
+        finally:
+            if not admitted:
+                self._abandon(provider, ticket)
+
+    async def aacquire(self, provider: str, tokens: int = 0) -> list:
+        """
+        Async version of `acquire`. A cancelled waiter leaves the queue.
+        """
+        ticket = self._enqueue(provider, tokens)
+        admitted = False
+        try:
+            while True:
+                wait = self._poll(provider, ticket)
+                if wait == 0:
+                    admitted = True
+                    return ticket
+                await asyncio.sleep(wait)
+        finally:
+            if not admitted:
+                self._abandon(provider, ticket)
+
+    def backoff(self, provider: str, error: Exception, attempt: int) -> float:
+        """
+        Returns how long to wait before retrying after `error`, and pauses the
+        provider for that long: its other requests would be rejected too.
+        """
+        delay = retry_after(error)
+        if delay is None:
+            # Full jitter: uniform in [0, base * 2^attempt], capped
+            delay = self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        status = getattr(error, "status_code", None)
+        with self._lock:
+            queue = self._queue(provider)
+            queue.cooldown_until = max(queue.cooldown_until, self.clock() + delay)
+        self.metrics.inc("wealthbrain_llm_retries_total", (("provider", provider), ("status", str(status or "error"))))
+        return delay
+
+    def stats(self) -> dict:
+        """
+        Returns {provider: {'queued': {lane: n}, 'requests_available', 'tokens_available'}}.
+        """
+        with self._lock:
+            result = {}
+            for name, queue in self._queues.items():
+                queue.requests._refill()
+                queue.tokens._refill()
+                result[name] = {
+                    "queued": dict(queue.depth),
+                    "requests_available": queue.requests.level,
+                    "tokens_available": queue.tokens.level,
+                }
+            return result
+
+    def _queue(self, provider: str) -> ProviderQueue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            limits = self.limits.get(provider) or self.limits.get("openai")
+            queue = self._queues[provider] = ProviderQueue(provider, limits["rpm"], limits["tpm"], self.clock)
+        return queue
+
+    def _enqueue(self, provider: str, tokens: int) -> list:
+        lane_name = _lane.get()
+        ticket = [LANE_RANKS.get(lane_name, 0), next(self._seq), lane_name, tokens, self.clock()]
+        with self._lock:
+            queue = self._queue(provider)
+            heapq.heappush(queue.waiters, ticket)
+            queue.depth[lane_name] += 1
+            self._report_depth(queue, lane_name)
+        return ticket
+
+    def _poll(self, provider: str, ticket: list) -> float:
+        """
+        Admits the ticket (returns 0) or returns how long to wait before asking again.
+        """
+        with self._lock:
+            queue = self._queue(provider)
+            now = self.clock()
+            if now < queue.cooldown_until:
+                return min(queue.cooldown_until - now, POLL_SECONDS * 10)
+            if queue.waiters[0] is not ticket:
+                return POLL_SECONDS
+            reserve = self.batch_headroom if ticket[2] == BATCH else 0.0
+            wait = max(queue.requests.wait_time(1, reserve), queue.tokens.wait_time(ticket[3], reserve))
+            if wait > 0:
+                # Re-check soon in case a higher-priority request arrives
+                return min(wait, POLL_SECONDS)
+            queue.requests.take(1)
+            queue.tokens.take(ticket[3])
+            heapq.heappop(queue.waiters)
+            queue.depth[ticket[2]] -= 1
+            self._report_depth(queue, ticket[2])
+        labels = (("provider", provider), ("lane", ticket[2]))
+        self.metrics.inc("wealthbrain_llm_requests_total", labels)
+        self.metrics.observe("wealthbrain_llm_queue_wait_seconds", labels, now - ticket[4])
+        return 0
+
+    def _abandon(self, provider: str, ticket: list):
+        with self._lock:
+            queue = self._queue(provider)
+            if ticket in queue.waiters:
+                queue.waiters.remove(ticket)
+                heapq.heapify(queue.waiters)
+                queue.depth[ticket[2]] -= 1
+                self._report_depth(queue, ticket[2])
+
+    def _settle(self, provider: str, ticket: list, result, usage):
+        actual = usage(result) if usage else None
+        if actual is None:
+            return
+        with self._lock:
+            self._queue(provider).tokens.take(actual - ticket[3])
+
+    def _report_depth(self, queue: ProviderQueue, lane_name: str):
+        self.metrics.set_gauge(
+            "wealthbrain_llm_queue_depth", (("provider", queue.name), ("lane", lane_name)), queue.depth[lane_name]
+        )
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Rate limits, server errors and connection failures are worth retrying.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "RateLimitError")
+
+
+def retry_after(error: Exception):
+    """
+    Seconds the provider asked us to wait (Retry-After header), if any.
+    """
+    seconds = getattr(error, "retry_after", None)
+    if seconds is None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        seconds = headers.get("retry-after")
+    try:
+        return float(seconds) if seconds is not None else None
+    except ValueError:
+        return None
+
+
+def estimate_tokens(texts) -> int:
+    return sum(len(str(text)) for text in texts) // CHARS_PER_TOKEN + 1
+
+
+def _limits_from_env() -> dict:
+    limits = {}
+    for provider, defaults in PROVIDER_LIMITS.items():
+        limits[provider] = {
+            key: float(os.getenv(f"WEALTHBRAIN_{provider.upper()}_{key.upper()}", value))
+            for key, value in defaults.items()
+        }
+    return limits
+
+
+def _usage_tokens(result):
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Chat model that sends every call of `inner` through the scheduler. Tool
+    bindings and other call kwargs are passed through unchanged; a streamed
+    call is retried only until its first chunk arrives.
+    """
+
+    inner: Any
+    provider: str = "openai"
+    scheduler: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": getattr(self.inner, "model_name", None), **self.inner._identifying_params}
+
+    @property
+    def _scheduler(self) -> LLMScheduler:
+        return self.scheduler or get_scheduler()
+
+    def _tokens(self, messages) -> int:
+        return estimate_tokens(message.content for message in messages) + COMPLETION_TOKEN_ESTIMATE
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._scheduler.call(
+            self.provider,
+            lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            self._tokens(messages),
+            usage=_usage_tokens,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await self._scheduler.acall(
+            self.provider,
+            lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            self._tokens(messages),
+            usage=_usage_tokens,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = self._scheduler
+        for attempt in itertools.count():
+            scheduler.acquire(self.provider, self._tokens(messages))
+            chunks = self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            try:
+                first = next(chunks)
+                break
+            except StopIteration:
+                return
+            except Exception as e:
+                if attempt >= scheduler.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(scheduler.backoff(self.provider, e, attempt))
+        yield first
+        yield from chunks
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = self._scheduler
+        for attempt in itertools.count():
+            await scheduler.aacquire(self.provider, self._tokens(messages))
+            chunks = self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            try:
+                first = await chunks.__anext__()
+                break
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                if attempt >= scheduler.max_retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(scheduler.backoff(self.provider, e, attempt))
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Embeddings that send every call of `inner` through the scheduler.
+    """
+
+    def __init__(self, inner: Embeddings, provider: str = "embeddings", scheduler: LLMScheduler = None):
+        self.inner = inner
+        self.provider = provider
+        self.scheduler = scheduler
+        # Cache keys (see CachedEmbeddings) follow the wrapped model
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    @property
+    def _scheduler(self) -> LLMScheduler:
+        return self.scheduler or get_scheduler()
+
+    def embed_documents(self, texts):
+        return self._scheduler.call(self.provider, lambda: self.inner.embed_documents(texts), estimate_tokens(texts))
+
+    def embed_query(self, text):
+        return self._scheduler.call(self.provider, lambda: self.inner.embed_query(text), estimate_tokens([text]))
+
+    async def aembed_documents(self, texts):
+        return await self._scheduler.acall(
+            self.provider, lambda: self.inner.aembed_documents(texts), estimate_tokens(texts)
+        )
+
+    async def aembed_query(self, text):
+        return await self._scheduler.acall(
+            self.provider, lambda: self.inner.aembed_query(text), estimate_tokens([text])
+        )
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Returns the process-wide scheduler shared by every model.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler: LLMScheduler):
+    """
+    Replaces the shared scheduler (e.g. with tighter limits in a test).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
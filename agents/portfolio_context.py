@@ -0,0 +1,140 @@
+import re
+import threading
+
+import pandas as pd
+
+PORTFOLIO_CONTEXT_TOKEN_BUDGET = 1200
+TOKEN_ENCODING = "cl100k_base"
+# Rough tokens per character when the tokenizer is unavailable (e.g. offline).
+CHARS_PER_TOKEN = 4
+MATCH_COLUMNS = ["Asset_Name", "Asset_Class", "Location", "Custodian"]
+QUERY_STOP_WORDS = {
+    "the", "and", "for", "how", "what", "does", "will", "would", "could", "with", "from", "about",
+    "impact", "affect", "affects", "influence", "consequence", "consequences", "outlook", "my", "our",
+    "are", "this", "that", "these", "those", "into", "over", "new", "latest", "news", "portfolio",
+    "assets", "holdings", "specific", "market", "markets",
+}
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with the OpenAI tokenizer, falling back to a character
+    estimate if it can't be loaded.
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception:
+                _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PortfolioContextBuilder:
+    """
+    Renders a family's holdings for an LLM prompt within a token budget.
+
+    Holdings are ranked by relevance to the query (query words matching the
+    asset name, class, location or custodian) and then by value. The top of the
+    ranking is listed row by row while it fits; the long tail is rolled up into
+    one line per Asset_Class/Location with counts and totals, and whatever
+    still doesn't fit is summarized in a final line. A header with the total
+    and the allocation by asset class is always included, so the prompt size is
+    bounded by `token_budget` however large the portfolio is.
+    """
+
+    def __init__(self, token_budget: int = PORTFOLIO_CONTEXT_TOKEN_BUDGET, tail_share: float = 0.25):
+        self.token_budget = token_budget
+        # Share of the budget kept back for the rolled-up tail
+        self.tail_share = tail_share
+
+    def build(self, df: pd.DataFrame, query: str) -> dict:
+        """
+        Returns {'text', 'tokens', 'rows_listed', 'rows_rolled_up', 'total_rows'}.
+        """
+        if df.empty:
+            text = "Current Portfolio Holdings: No data available."
+            return {"text": text, "tokens": count_tokens(text), "rows_listed": 0, "rows_rolled_up": 0, "total_rows": 0}
+
+        total = float(df["Value_USD"].sum())
+        lines = [f"Current Portfolio Holdings ({len(df)} holdings, total ${total:,.0f}):"]
+        by_class = df.groupby("Asset_Class", observed=True)["Value_USD"].sum().sort_values(ascending=False)
+        lines.append("Allocation: " + ", ".join(
+            f"{name} {value / total * 100:.1f}%" for name, value in by_class.items()
+        ))
+        used = count_tokens("\n".join(lines))
+
+        ranked = self._rank(df, query)
+        table_header = "| Asset | Class | Location | Value (USD) | Liquidity |\n|---|---|---|---|---|"
+        listed = []
+        listing_budget = self.token_budget - used - count_tokens(table_header)
+        listing_budget -= int(self.token_budget * self.tail_share) if len(ranked) > 1 else 0
+        for row in ranked.itertuples(index=False):
+            line = f"| {row.Asset_Name} | {row.Asset_Class} | {row.Location} | {row.Value_USD:,.0f} | {row.Liquidity} |"
+            cost = count_tokens(line) + 1
+            if cost > listing_budget:
+                break
+            listed.append(line)
+            listing_budget -= cost
+        if listed:
+            lines.append(table_header)
+            lines.extend(listed)
+            used = count_tokens("\n".join(lines))
+
+        tail = ranked.iloc[len(listed):]
+        if not tail.empty:
+            lines.extend(self._roll_up(tail, self.token_budget - used))
+
+        text = "\n".join(lines)
+        return {
+            "text": text,
+            "tokens": count_tokens(text),
+            "rows_listed": len(listed),
+            "rows_rolled_up": len(tail),
+            "total_rows": len(df),
+        }
+
+    def _rank(self, df: pd.DataFrame, query: str) -> pd.DataFrame:
+        words = {w for w in WORD_RE.findall(query.lower()) if len(w) > 2 and w not in QUERY_STOP_WORDS}
+        relevance = pd.Series(0, index=df.index)
+        if words:
+            pattern = r"\b(?:" + "|".join(re.escape(w) for w in sorted(words)) + r")"
+            for column in MATCH_COLUMNS:
+                relevance += df[column].astype(str).str.lower().str.count(pattern)
+        ranked = df.assign(_relevance=relevance).sort_values(
+            ["_relevance", "Value_USD"], ascending=[False, False], kind="stable"
+        )
+        return ranked.drop(columns="_relevance")
+
+    def _roll_up(self, tail: pd.DataFrame, budget: int) -> list:
+        groups = (
+            tail.groupby(["Asset_Class", "Location"], observed=True)["Value_USD"]
+            .agg(["count", "sum"])
+            .sort_values("sum", ascending=False)
+        )
+        lines = ["Other holdings (rolled up):"]
+        budget -= count_tokens(lines[0]) + 1
+        shown_count, shown_value = 0, 0.0
+        rest_count, rest_value = int(groups["count"].sum()), float(groups["sum"].sum())
+        # Keep room for the closing "all other" line
+        budget -= count_tokens(f"- All other: {rest_count} holdings, ${rest_value:,.0f}") + 1
+        for (asset_class, location), group in groups.iterrows():
+            line = f"- {asset_class} in {location}: {int(group['count'])} holdings, ${group['sum']:,.0f}"
+            cost = count_tokens(line) + 1
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+            shown_count += int(group["count"])
+            shown_value += float(group["sum"])
+        if shown_count < rest_count:
+            lines.append(f"- All other: {rest_count - shown_count} holdings, ${rest_value - shown_value:,.0f}")
+        return lines
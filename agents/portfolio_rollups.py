@@ -0,0 +1,214 @@
+import heapq
+import threading
+from collections import OrderedDict
+
+from agents.portfolio_store import get_portfolio_store
+
+# Largest holdings kept ordered per family; deeper top-N questions use the full data.
+ROLLUP_TOP_K = 20
+# Families whose rollups stay resident; others are rebuilt on their next lookup.
+ROLLUP_CACHE_SIZE = 256
+CASH_CLASS = "Cash"
+ROLLUP_COLUMNS = ["Asset_ID", "Asset_Name", "Asset_Class", "Liquidity", "Value_USD"]
+
+
+class FamilyRollup:
+    """
+    Materialized aggregates of one family's holdings.
+
+    Keeps the total, per-asset-class and per-liquidity buckets ([value, count])
+    and a min-heap of the `top_k` largest holdings. `upsert` and `remove` apply
+    one holding's change to every aggregate in O(log top_k), so reads are O(1)
+    (or O(buckets) for ordered allocations). When a holding leaves or shrinks
+    inside the top-K the heap is marked stale and rebuilt on the next `top` call.
+    """
+
+    def __init__(self, family_name: str, top_k: int = ROLLUP_TOP_K):
+        self.family_name = family_name
+        self.top_k = top_k
+        # Portfolio digest the rollup reflects, and a counter bumped on every change
+        self.digest = ""
+        self.version = 0
+        self.total = 0.0
+        self.count = 0
+        self.by_class = {}
+        self.by_liquidity = {}
+        # asset key -> (name, asset_class, liquidity, value, seq)
+        self._holdings = {}
+        self._seq = 0
+        # Min-heap of (value, -seq, key): ties keep the earlier holding
+        self._top = []
+        self._top_keys = set()
+        self._top_stale = False
+        self._lock = threading.RLock()
+
+    @property
+    def cash(self) -> float:
+        return self.by_class.get(CASH_CLASS, [0.0, 0])[0]
+
+    def upsert(self, key: str, name: str, asset_class: str, liquidity: str, value: float):
+        """
+        Adds a holding or replaces the one stored under `key`.
+        """
+        with self._lock:
+            previous = self._holdings.get(key)
+            if previous is not None:
+                if previous[:4] == (name, asset_class, liquidity, value):
+                    return
+                self._subtract(previous)
+                seq = previous[4]
+            else:
+                seq = self._seq
+                self._seq += 1
+            holding = (name, asset_class, liquidity, value, seq)
+            self._holdings[key] = holding
+            self._add(holding)
+
+            if key in self._top_keys:
+                # The heap entry is outdated; a shrunk holding may no longer belong
+                self._top_stale = True
+            elif not self._top_stale:
+                entry = (value, -seq, key)
+                if len(self._top) < self.top_k:
+                    heapq.heappush(self._top, entry)
+                    self._top_keys.add(key)
+                elif entry > self._top[0]:
+                    self._top_keys.discard(heapq.heapreplace(self._top, entry)[2])
+                    self._top_keys.add(key)
+            self.version += 1
+
+    def remove(self, key: str):
+        """
+        Removes the holding stored under `key`, if any.
+        """
+        with self._lock:
+            previous = self._holdings.pop(key, None)
+            if previous is None:
+                return
+            self._subtract(previous)
+            if key in self._top_keys:
+                self._top_stale = True
+            self.version += 1
+
+    def allocation(self, column: str = "Asset_Class") -> list:
+        """
+        Returns [(bucket, value, count)] by Asset_Class or Liquidity, largest first.
+        """
+        buckets = self.by_class if column == "Asset_Class" else self.by_liquidity
+        with self._lock:
+            items = [(name, value, count) for name, (value, count) in buckets.items()]
+        return sorted(items, key=lambda item: -item[1])
+
+    def top(self, n: int) -> list:
+        """
+        Returns the n (at most top_k) largest holdings as [(name, value)].
+        """
+        with self._lock:
+            if self._top_stale:
+                self._top = [
+                    (holding[3], -holding[4], key)
+                    for key, holding in self._holdings.items()
+                ]
+                self._top = heapq.nlargest(self.top_k, self._top)
+                heapq.heapify(self._top)
+                self._top_keys = {entry[2] for entry in self._top}
+                self._top_stale = False
+            ranked = sorted(self._top, reverse=True)[:min(n, self.top_k)]
+            return [(self._holdings[key][0], value) for value, _, key in ranked]
+
+    def reconcile(self, df):
+        """
+        Brings the rollup in line with `df` (the family's current holdings) by
+        applying only the rows that were added, changed or removed.
+        """
+        with self._lock:
+            seen = set()
+            for asset_id, name, asset_class, liquidity, value in zip(
+                df["Asset_ID"], df["Asset_Name"], df["Asset_Class"], df["Liquidity"], df["Value_USD"]
+            ):
+                key = str(asset_id)
+                # Duplicate IDs are kept apart rather than collapsed
+                while key in seen:
+                    key += "#"
+                seen.add(key)
+                self.upsert(key, str(name), str(asset_class), str(liquidity), float(value))
+            for key in [key for key in self._holdings if key not in seen]:
+                self.remove(key)
+
+    def memory_bytes(self) -> int:
+        """
+        Rough resident size: about 200 bytes per holding plus the buckets.
+        """
+        return 200 * len(self._holdings) + 100 * (len(self.by_class) + len(self.by_liquidity) + len(self._top))
+
+    def _add(self, holding: tuple):
+        _, asset_class, liquidity, value, _ = holding
+        self.total += value
+        self.count += 1
+        for buckets, name in ((self.by_class, asset_class), (self.by_liquidity, liquidity)):
+            bucket = buckets.setdefault(name, [0.0, 0])
+            bucket[0] += value
+            bucket[1] += 1
+
+    def _subtract(self, holding: tuple):
+        _, asset_class, liquidity, value, _ = holding
+        self.total -= value
+        self.count -= 1
+        for buckets, name in ((self.by_class, asset_class), (self.by_liquidity, liquidity)):
+            bucket = buckets[name]
+            bucket[0] -= value
+            bucket[1] -= 1
+            if bucket[1] == 0:
+                del buckets[name]
+        if self.count == 0:
+            # Drop accumulated floating-point drift
+            self.total = 0.0
+
+
+class RollupStore:
+    """
+    Per-family rollups kept in step with the portfolio store.
+
+    `get` compares the family's portfolio digest with the one the rollup was
+    last reconciled against and, only when it changed, applies the difference.
+    Rollups of the most recently used families stay resident (LRU).
+    """
+
+    def __init__(self, store=None, top_k: int = ROLLUP_TOP_K, cache_size: int = ROLLUP_CACHE_SIZE):
+        self.store = store or get_portfolio_store()
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self._rollups = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, family_name: str) -> FamilyRollup:
+        digest = self.store.family_digest(family_name)
+        with self._lock:
+            rollup = self._rollups.get(family_name)
+            if rollup is None:
+                rollup = self._rollups[family_name] = FamilyRollup(family_name, self.top_k)
+            self._rollups.move_to_end(family_name)
+            while len(self._rollups) > self.cache_size:
+                self._rollups.popitem(last=False)
+
+        if rollup.digest != digest:
+            with rollup._lock:
+                if rollup.digest != digest:
+                    rollup.reconcile(self.store.family(family_name, columns=ROLLUP_COLUMNS))
+                    rollup.digest = digest
+        return rollup
+
+
+_rollups = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups() -> RollupStore:
+    """
+    Returns the process-wide RollupStore over the shared portfolio store.
+    """
+    global _rollups
+    with _rollups_lock:
+        if _rollups is None:
+            _rollups = RollupStore()
+        return _rollups
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PORTFOLIO_PATH = "data/portfolio.csv"
+PORTFOLIO_DATASET_DIR = "data/portfolio"
+MANIFEST_NAME = "_manifest.json"
+# Typed schema of the stored holdings; Family is the partition key, not a column in the files.
+PORTFOLIO_SCHEMA = pa.schema([
+    ("Asset_ID", pa.string()),
+    ("Asset_Name", pa.string()),
+    ("Asset_Class", pa.dictionary(pa.int32(), pa.string())),
+    ("Location", pa.dictionary(pa.int32(), pa.string())),
+    ("Value_USD", pa.float64()),
+    ("Custodian", pa.dictionary(pa.int32(), pa.string())),
+    ("Liquidity", pa.dictionary(pa.int32(), pa.string())),
+    ("Entity_Owner", pa.string()),
+    ("Family", pa.string()),
+])
+# Rows sorted and written per pass when ingesting; bounds ingest memory.
+INGEST_CHUNK_ROWS = 2_000_000
+# Family frames kept in memory; older ones are re-read from their partition.
+FAMILY_CACHE_SIZE = 256
+# Replaced dataset versions are deleted this long after they were replaced, so
+# a reader that loaded the previous manifest can still open its partitions.
+OLD_VERSION_GRACE_SECONDS = 10 * 60
+
+
+def ingest_csv(csv_path: str = PORTFOLIO_PATH, dataset_dir: str = PORTFOLIO_DATASET_DIR) -> dict:
+    """
+    Converts the portfolio CSV into a Parquet dataset partitioned by Family
+    (`Family=<name>/part-*.parquet`) with the typed PORTFOLIO_SCHEMA. The CSV is
+    streamed and written in sorted chunks of INGEST_CHUNK_ROWS, so it never has
+    to fit in memory and each family ends up in a handful of files. Returns
+    the manifest.
+
+    Each ingest writes a new version directory (`<dataset_dir>/v-<id>/`) and
+    switches to it by atomically replacing `_manifest.json`, whose partition
+    paths point into that version. Readers in any process always see a
+    complete dataset. Versions no longer referenced are deleted by a later
+    ingest once they were replaced OLD_VERSION_GRACE_SECONDS ago.
+    """
+    with open(csv_path, "rb") as f:
+        source_digest = _sha256_file(f)
+
+    string_schema = pa.schema([
+        (field.name, field.type.value_type if pa.types.is_dictionary(field.type) else field.type)
+        for field in PORTFOLIO_SCHEMA
+    ])
+    reader = pacsv.open_csv(
+        csv_path, convert_options=pacsv.ConvertOptions(column_types=string_schema, include_columns=string_schema.names)
+    )
+
+    _remove_old_versions(dataset_dir)
+    version = f"v-{uuid.uuid4().hex[:12]}"
+    tmp_dir = os.path.join(dataset_dir, version)
+    os.makedirs(tmp_dir)
+    partitioning = ds.partitioning(pa.schema([("Family", pa.string())]), flavor="hive")
+
+    def write_chunk(batches: list, chunk: int):
+        # Sorted by family, each partition is written as one file per chunk
+        table = pa.Table.from_batches(batches).sort_by("Family")
+        ds.write_dataset(
+            table,
+            tmp_dir,
+            format="parquet",
+            partitioning=partitioning,
+            basename_template=f"part-{chunk}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_partitions=1 << 20,
+        )
+
+    pending, pending_rows, chunk = [], 0, 0
+    for batch in reader:
+        pending.append(pa.RecordBatch.from_arrays(
+            [batch.column(field.name).cast(field.type) for field in PORTFOLIO_SCHEMA], schema=PORTFOLIO_SCHEMA
+        ))
+        pending_rows += batch.num_rows
+        if pending_rows >= INGEST_CHUNK_ROWS:
+            write_chunk(pending, chunk)
+            pending, pending_rows, chunk = [], 0, chunk + 1
+    if pending:
+        write_chunk(pending, chunk)
+
+    families = {}
+    for entry in sorted(os.listdir(tmp_dir)):
+        if not entry.startswith("Family="):
+            continue
+        partition = os.path.join(tmp_dir, entry)
+        files = sorted(name for name in os.listdir(partition) if name.endswith(".parquet"))
+        digest = hashlib.sha256()
+        rows = 0
+        for name in files:
+            with open(os.path.join(partition, name), "rb") as f:
+                digest.update(_sha256_file(f).encode("ascii"))
+            rows += pq.ParquetFile(os.path.join(partition, name)).metadata.num_rows
+        families[unquote(entry[len("Family="):])] = {
+            "path": f"{version}/{entry}", "rows": rows, "digest": digest.hexdigest(),
+        }
+
+    manifest = {
+        "source_sha256": source_digest, "version": version, "columns": PORTFOLIO_SCHEMA.names, "families": families,
+    }
+    manifest_tmp = os.path.join(dataset_dir, f"{MANIFEST_NAME}.{version}")
+    with open(manifest_tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    # The replaced version's grace period starts at the switch: its mtime is
+    # when it was written, which may be long past
+    for name in _versions_in_use(dataset_dir):
+        if os.path.isdir(os.path.join(dataset_dir, name)):
+            os.utime(os.path.join(dataset_dir, name))
+    os.replace(manifest_tmp, os.path.join(dataset_dir, MANIFEST_NAME))
+    return manifest
+
+
+def _remove_old_versions(dataset_dir: str):
+    """
+    Deletes dataset versions (and partitions from the older unversioned
+    layout) that the current manifest doesn't use, once they are past the
+    grace period. Open memory maps of their files stay valid after unlinking.
+    """
+    if not os.path.isdir(dataset_dir):
+        return
+    in_use = _versions_in_use(dataset_dir)
+    cutoff = time.time() - OLD_VERSION_GRACE_SECONDS
+    for name in os.listdir(dataset_dir):
+        path = os.path.join(dataset_dir, name)
+        if name in in_use or name == MANIFEST_NAME or os.path.getmtime(path) > cutoff:
+            continue
+        if name.startswith("v-") or name.startswith("Family="):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.startswith(f"{MANIFEST_NAME}."):
+            os.remove(path)
+
+
+def _versions_in_use(dataset_dir: str) -> set:
+    """
+    Top-level directories the current manifest's partitions live in.
+    """
+    current = _read_manifest(os.path.join(dataset_dir, MANIFEST_NAME))
+    return {entry["path"].split("/")[0] for entry in current.get("families", {}).values()}
+
+
+def _sha256_file(f) -> str:
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(1 << 20), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class PortfolioStore:
+    """
+    Process-wide view of the holdings, stored as Parquet partitioned by family.
+
+    A family lookup reads only that family's partition (and only the requested
+    columns), memory-mapped, and keeps recently used family frames in memory.
+    The CSV at `path` stays the import source: whenever its content changes it
+    is re-ingested into the dataset. Without a CSV, an existing dataset (e.g.
+    ingested elsewhere) is used as is.
+    """
+
+    def __init__(self, path: str = PORTFOLIO_PATH, dataset_dir: str = PORTFOLIO_DATASET_DIR,
+                 cache_size: int = FAMILY_CACHE_SIZE):
+        self.path = path
+        self.dataset_dir = dataset_dir
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._csv_stat = None
+        self._manifest_stat = None
+        self._manifest = {"columns": PORTFOLIO_SCHEMA.names, "families": {}}
+        # family -> (digest, frame); order is LRU order
+        self._frames = OrderedDict()
+
+    def family(self, family_name: str, columns: list = None) -> pd.DataFrame:
+        """
+        Returns the holdings of one family, optionally only some `columns`.
+
+        The result is a shallow copy of the cached frame: callers may add
+        columns freely but must treat the values as read-only.
+        """
+        self._refresh()
+        entry = self._manifest["families"].get(family_name)
+        if entry is None:
+            return pd.DataFrame(columns=columns or self._manifest["columns"])
+        with self._lock:
+            cached = self._frames.get(family_name)
+            if cached is not None and cached[0] == entry["digest"]:
+                self._frames.move_to_end(family_name)
+                frame = cached[1]
+                return (frame[columns] if columns else frame).copy(deep=False)
+        if columns:
+            # Column projection: don't cache partial frames
+            return self._read(family_name, entry, columns)
+
+        frame = self._read(family_name, entry, None)
+        with self._lock:
+            self._frames[family_name] = (entry["digest"], frame)
+            self._frames.move_to_end(family_name)
+            while len(self._frames) > self.cache_size:
+                self._frames.popitem(last=False)
+        return frame.copy(deep=False)
+
+    def family_digest(self, family_name: str) -> str:
+        """
+        Content hash of one family's rows; changes whenever those rows change.
+        """
+        self._refresh()
+        return self._manifest["families"].get(family_name, {}).get("digest", "")
+
+    def families(self) -> list:
+        self._refresh()
+        return list(self._manifest["families"])
+
+    def _read(self, family_name: str, entry: dict, columns) -> pd.DataFrame:
+        wanted = [c for c in (columns or self._manifest["columns"]) if c != "Family"]
+        table = pq.read_table(
+            os.path.join(self.dataset_dir, entry["path"]), columns=wanted, memory_map=True, partitioning=None
+        )
+        frame = table.to_pandas()
+        for column in frame.select_dtypes("category"):
+            # Dictionaries are shared by the families written in the same chunk
+            frame[column] = frame[column].cat.remove_unused_categories()
+        if columns is None or "Family" in columns:
+            frame["Family"] = pd.Categorical([family_name] * len(frame))
+        return frame[columns or self._manifest["columns"]]
+
+    def _refresh(self):
+        csv_stat = _stat(self.path)
+        manifest_path = os.path.join(self.dataset_dir, MANIFEST_NAME)
+        if csv_stat == self._csv_stat and _stat(manifest_path) == self._manifest_stat:
+            return
+
+        with self._lock:
+            if csv_stat is not None and csv_stat != self._csv_stat:
+                with open(self.path, "rb") as f:
+                    digest = _sha256_file(f)
+                # A touched but unchanged CSV keeps the existing dataset.
+                if digest != _read_manifest(manifest_path).get("source_sha256"):
+                    ingest_csv(self.path, self.dataset_dir)
+                self._csv_stat = csv_stat
+
+            manifest_stat = _stat(manifest_path)
+            if manifest_stat != self._manifest_stat:
+                manifest = _read_manifest(manifest_path)
+                if not manifest and csv_stat is None:
+                    raise FileNotFoundError(f"No portfolio data at {self.path} or {self.dataset_dir}")
+                self._manifest = manifest or self._manifest
+                self._manifest_stat = manifest_stat
+
+
+def _stat(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _read_manifest(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_portfolio_store(path: str = PORTFOLIO_PATH, dataset_dir: str = PORTFOLIO_DATASET_DIR) -> PortfolioStore:
+    """
+    Returns the shared PortfolioStore for `path` and `dataset_dir`.
+    """
+    with _stores_lock:
+        key = (path, dataset_dir)
+        if key not in _stores:
+            _stores[key] = PortfolioStore(path, dataset_dir)
+        return _stores[key]
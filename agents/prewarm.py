@@ -0,0 +1,148 @@
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Load every family's portfolio view and legal index while the picker is shown
+PREWARM_ENABLED = os.getenv("WEALTHBRAIN_PREWARM", "1") == "1"
+PREWARM_WORKERS = int(os.getenv("WEALTHBRAIN_PREWARM_WORKERS", "4"))
+LEGAL_DOCS_DIR = "data/legal_docs"
+
+
+class Prewarmer:
+    """
+    Loads the resources a family's first question needs in the background:
+    the modules behind the agents, each family's portfolio view (the cached
+    frame and its rollup) and its share of the legal index (loaded from disk,
+    or synced if the documents changed).
+
+    Families are warmed concurrently in a thread pool; a family that fails is
+    reported and skipped, and its resources are simply built on first use as
+    before. This module imports nothing heavy itself, so starting it costs
+    the picker page nothing.
+    """
+
+    def __init__(self, families: list, workers: int = PREWARM_WORKERS, docs_dir: str = LEGAL_DOCS_DIR):
+        self.families = list(families)
+        self.workers = workers
+        self.docs_dir = docs_dir
+        self.started_at = None
+        self.finished_at = None
+        # step or family -> {resource: seconds}
+        self.timings = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._done = threading.Event()
+
+    def start(self) -> "Prewarmer":
+        """
+        Starts warming in a daemon thread; calling it again does nothing.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until warming finished; returns False on timeout.
+        """
+        return self._done.wait(timeout)
+
+    def report(self) -> dict:
+        with self._lock:
+            finished = self.finished_at
+            elapsed = (finished or time.perf_counter()) - self.started_at if self.started_at else 0.0
+            return {
+                "state": "done" if finished else ("running" if self.started_at else "idle"),
+                "seconds": elapsed,
+                "families": len(self.families),
+                "timings": {key: dict(value) for key, value in self.timings.items()},
+                "errors": dict(self.errors),
+            }
+
+    def _run(self):
+        try:
+            # The agents' own imports first: langchain, the model clients and FAISS
+            self._step("startup", "imports", lambda: importlib.import_module("agents.router"))
+            from agents.portfolio_rollups import get_rollups
+            from agents.portfolio_store import get_portfolio_store
+            from agents.tenant_index import get_tenant_index
+
+            index = self._step("startup", "legal_index_load", get_tenant_index)
+            store = self._step("startup", "portfolio_store", get_portfolio_store)
+            if store is None:
+                return
+            rollups = get_rollups()
+
+            # Returns True if the family's legal documents had to be re-synced
+            def warm(family) -> bool:
+                self._step(family, "portfolio", lambda: (store.family(family), rollups.get(family)))
+                if index is None:
+                    return False
+                path = os.path.join(self.docs_dir, family.lower())
+                return bool(self._step(family, "legal_index", lambda: index.sync(family.lower(), path, save=False)))
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prewarm") as executor:
+                changed = any(list(executor.map(warm, self.families)))
+            # Synced tenants are saved together rather than once per family
+            if changed:
+                self._step("startup", "legal_index_save", index.save)
+        finally:
+            with self._lock:
+                self.finished_at = time.perf_counter()
+            self._record_metrics()
+            self._done.set()
+
+    def _step(self, key: str, resource: str, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        except Exception as e:
+            print(f"Warning: Could not prewarm {resource} for {key} ({e})")
+            with self._lock:
+                self.errors[f"{key}/{resource}"] = str(e)
+            return None
+        finally:
+            with self._lock:
+                self.timings.setdefault(key, {})[resource] = time.perf_counter() - start
+
+    def _record_metrics(self):
+        from agents.tracing import get_tracer
+
+        metrics = get_tracer().metrics
+        report = self.report()
+        metrics.set_gauge("wealthbrain_prewarm_seconds", (), report["seconds"])
+        for resources in report["timings"].values():
+            for resource, seconds in resources.items():
+                metrics.observe("wealthbrain_prewarm_step_seconds", (("resource", resource),), seconds)
+        metrics.inc("wealthbrain_prewarm_errors_total", (), len(report["errors"]))
+
+
+_prewarmer = None
+_prewarmer_lock = threading.Lock()
+
+
+def start_prewarm(families: list) -> Prewarmer:
+    """
+    Starts the process-wide prewarm once; later calls (every Streamlit rerun)
+    return the same prewarmer.
+    """
+    global _prewarmer
+    with _prewarmer_lock:
+        if _prewarmer is None:
+            _prewarmer = Prewarmer(families)
+        return _prewarmer.start()
+
+
+def get_prewarmer():
+    """
+    Returns the process-wide prewarmer, or None if prewarming was never started.
+    """
+    with _prewarmer_lock:
+        return _prewarmer
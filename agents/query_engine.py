@@ -0,0 +1,330 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+FILTER_COLUMNS = ["Asset_Class", "Location", "Liquidity", "Custodian", "Entity_Owner"]
+
+# Everyday words mapped to the canonical column values they stand for.
+SYNONYMS = {
+    "Asset_Class": {
+        "stocks": "Equities", "stock": "Equities", "equity": "Equities", "shares": "Equities",
+        "bonds": "Fixed Income", "bond": "Fixed Income",
+        "property": "Real Estate", "properties": "Real Estate",
+        "commodity": "Commodities", "collectible": "Collectibles",
+    },
+    "Location": {
+        "united states": "USA", "america": "USA",
+        "swiss": "Switzerland",
+        "united kingdom": "UK", "britain": "UK", "england": "UK",
+    },
+    "Liquidity": {
+        "liquid": "High",
+    },
+}
+
+GROUP_BY_WORDS = {
+    "asset class": "Asset_Class", "class": "Asset_Class", "type": "Asset_Class",
+    "location": "Location", "country": "Location", "jurisdiction": "Location", "region": "Location",
+    "liquidity": "Liquidity",
+    "custodian": "Custodian", "bank": "Custodian",
+    "entity": "Entity_Owner", "owner": "Entity_Owner",
+}
+
+# Words that carry no meaning for the fast path; anything outside this set, the
+# operation keywords and the known column values sends the query to the LLM.
+FILLER_WORDS = {
+    "what", "whats", "is", "are", "the", "my", "our", "me", "i", "we", "do", "does",
+    "have", "has", "hold", "held", "own", "in", "of", "for", "a", "an", "at", "to",
+    "with", "and", "all", "tell", "give", "please", "can", "you", "located", "based",
+    "currently", "current", "there", "it", "this", "that", "across", "from", "on",
+    "portfolio", "assets", "asset", "holdings", "holding", "investments", "investment",
+    "positions", "position",
+    "family", "house", "office", "usd", "dollars", "s", "overall", "entire", "whole",
+    "class", "classes", "each", "per", "which", "list", "show", "value", "valued",
+    "worth", "net", "total", "sum", "aum", "count", "number",
+    "allocation", "breakdown", "distribution", "split", "exposure", "top", "largest",
+    "biggest", "smallest", "most", "least", "valuable", "percentage", "percent",
+    "share", "proportion", "by",
+}
+
+PERCENT_RE = re.compile(r"\b(percent|percentage|proportion|share)\b|%")
+COUNT_RE = re.compile(r"\bhow many\b|\bcount\b|\bnumber of\b")
+HOW_RE = re.compile(r"\bhow (much|many)\b")
+TOP_RE = re.compile(r"\b(top|largest|biggest|smallest|most valuable|least valuable)\b(?:\s+(\d+))?")
+# "top"/"largest" followed by a singular noun asks for one asset
+SINGULAR_RE = re.compile(r"\b(asset|holding|investment|position)\b")
+# "least liquid" is a ranking, not the Liquidity=High filter "liquid" stands for
+LIQUIDITY_RANK_RE = re.compile(r"\b(most|least|more|less)\s+(il)?liquid")
+GROUP_RE = re.compile(r"\b(allocation|breakdown|distribution|split|exposure)\b")
+SUM_RE = re.compile(r"\b(total|sum|aum|how much|value|worth)\b")
+LIST_RE = re.compile(r"\b(list|show|which)\b")
+GROUP_BY_RE = re.compile(
+    r"\b(?:by|per|each)\s+(" + "|".join(sorted(GROUP_BY_WORDS, key=len, reverse=True)) + r")\b"
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class QueryEngine:
+    """
+    Deterministic fast path for common portfolio questions.
+
+    Parses totals, group-bys, filters on the categorical columns, counts,
+    percentages and top-N questions into an intent, and answers it with
+    vectorized numpy operations over column codes factorized once at
+    construction. `answer` returns None for anything it cannot parse fully,
+    so the caller can fall back to the LLM agent.
+
+    With a `rollup` (a callable returning the family's FamilyRollup), totals,
+    counts, shares and allocations over the whole portfolio or one asset class
+    or liquidity bucket, and unfiltered top-N lists, are read from the
+    maintained rollup instead of being computed over the arrays.
+    """
+
+    def __init__(self, df: pd.DataFrame, rollup=None):
+        self.rollup = rollup
+        self.values = df["Value_USD"].to_numpy(dtype=float)
+        self.names = df["Asset_Name"].to_numpy()
+        self.codes = {}
+        self.uniques = {}
+        phrases = {}
+        for col in FILTER_COLUMNS:
+            codes, uniques = pd.factorize(df[col])
+            self.codes[col] = codes
+            self.uniques[col] = list(uniques)
+            for value in uniques:
+                phrases[str(value).lower()] = (col, value)
+        for col, synonyms in SYNONYMS.items():
+            for word, value in synonyms.items():
+                phrases.setdefault(word, (col, value))
+        self.phrases = phrases
+        self.phrase_re = re.compile(
+            r"\b(" + "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True)) + r")\b"
+        ) if phrases else None
+        self.ignored = FILLER_WORDS | {str(f).lower() for f in df["Family"].unique()}
+
+    def parse(self, query: str):
+        """
+        Returns an intent dict, or None if the query is outside the fast path.
+        """
+        text = query.lower().replace("'s", "").replace("’s", "")
+        if LIQUIDITY_RANK_RE.search(text):
+            return None
+
+        filters = {}
+        if self.phrase_re is not None:
+            for match in self.phrase_re.finditer(text):
+                col, value = self.phrases[match.group(1)]
+                filters.setdefault(col, [])
+                if value not in filters[col]:
+                    filters[col].append(value)
+            remainder = self.phrase_re.sub(" ", text)
+        else:
+            remainder = text
+
+        group_match = GROUP_BY_RE.search(remainder)
+        group_by = GROUP_BY_WORDS[group_match.group(1)] if group_match else None
+        if group_match:
+            remainder = remainder.replace(group_match.group(0), " ")
+
+        # "how" is only understood as part of "how much"/"how many".
+        remainder = HOW_RE.sub(" ", remainder)
+
+        top_match = TOP_RE.search(remainder)
+        if top_match and top_match.group(2):
+            n = int(top_match.group(2))
+            remainder = remainder.replace(top_match.group(0), " ")
+        else:
+            n = 1 if SINGULAR_RE.search(text) else 5
+
+        # Every remaining word must be understood, otherwise we might answer a
+        # different question than the one asked (e.g. "How much is my Villa worth?").
+        leftover = [t for t in TOKEN_RE.findall(remainder) if t not in self.ignored]
+        if leftover:
+            return None
+
+        if PERCENT_RE.search(text):
+            op = "percent"
+        elif COUNT_RE.search(text):
+            op = "count"
+        elif top_match:
+            op = "top"
+        elif group_by or GROUP_RE.search(text):
+            op = "group"
+        elif SUM_RE.search(text):
+            op = "sum"
+        elif LIST_RE.search(text) or filters:
+            op = "list"
+        else:
+            return None
+
+        if op == "percent" and not filters:
+            return None
+
+        return {
+            "op": op,
+            "filters": filters,
+            "group_by": group_by or "Asset_Class",
+            "n": n,
+            "ascending": bool(top_match and top_match.group(1) in ("smallest", "least valuable")),
+        }
+
+    def execute(self, intent: dict) -> str:
+        """
+        Answers a parsed intent.
+        """
+        if self.rollup is not None:
+            response = self._execute_rollup(intent)
+            if response is not None:
+                return response
+
+        mask = np.ones(len(self.values), dtype=bool)
+        for col, wanted in intent["filters"].items():
+            wanted_codes = [i for i, value in enumerate(self.uniques[col]) if value in wanted]
+            mask &= np.isin(self.codes[col], wanted_codes)
+
+        scope = self._describe(intent["filters"])
+        counted = scope if intent["filters"] else "assets in the portfolio"
+        op = intent["op"]
+        selected = self.values[mask]
+
+        if op == "sum":
+            return f"The total value of {scope} is ${selected.sum():,.2f}."
+
+        if op == "count":
+            return f"There are {int(mask.sum())} {counted}."
+
+        if op == "percent":
+            total = self.values.sum()
+            part = selected.sum()
+            pct = (part / total * 100) if total else 0
+            return (
+                f"{scope[0].upper() + scope[1:]} make up {pct:.1f}% of the portfolio "
+                f"(${part:,.2f} of ${total:,.2f})."
+            )
+
+        if not mask.any():
+            return f"There are no {counted}."
+
+        if op == "group":
+            col = intent["group_by"]
+            codes = self.codes[col][mask]
+            valid = codes >= 0
+            totals = np.bincount(codes[valid], weights=selected[valid], minlength=len(self.uniques[col]))
+            present = np.bincount(codes[valid], minlength=len(self.uniques[col])) > 0
+            grand_total = selected.sum()
+            lines = [f"Allocation of {scope} by {col.replace('_', ' ')}:"]
+            for i in np.argsort(-totals):
+                if not present[i]:
+                    continue
+                pct = (totals[i] / grand_total * 100) if grand_total else 0
+                lines.append(f"- {self.uniques[col][i]}: ${totals[i]:,.2f} ({pct:.1f}%)")
+            return "\n".join(lines)
+
+        idx = np.flatnonzero(mask)
+        order = np.argsort(selected if intent["ascending"] else -selected, kind="stable")
+        if op == "top":
+            order = order[:intent["n"]]
+            label = "smallest" if intent["ascending"] else "largest"
+            return _format_top(label, counted, [(self.names[idx[i]], selected[i]) for i in order])
+
+        lines = [f"{scope[0].upper() + scope[1:]} ({len(idx)} holdings, total value ${selected.sum():,.2f}):"]
+        for i in order:
+            row = idx[i]
+            lines.append(
+                f"- {self.names[row]} ({self.uniques['Asset_Class'][self.codes['Asset_Class'][row]]}, "
+                f"{self.uniques['Location'][self.codes['Location'][row]]}): ${selected[i]:,.2f}"
+            )
+        return "\n".join(lines)
+
+    def _execute_rollup(self, intent: dict):
+        """
+        Answers the intent from the family rollup, or returns None if the
+        rollup doesn't hold the needed aggregate.
+        """
+        filters = intent["filters"]
+        if len(filters) > 1 or not set(filters) <= {"Asset_Class", "Liquidity"}:
+            return None
+        op = intent["op"]
+        rollup = self.rollup()
+        scope = self._describe(filters)
+        counted = scope if filters else "assets in the portfolio"
+
+        if filters:
+            if op not in ("sum", "count", "percent"):
+                return None
+            (col, wanted), = filters.items()
+            buckets = rollup.by_class if col == "Asset_Class" else rollup.by_liquidity
+            value = sum(buckets[name][0] for name in wanted if name in buckets)
+            count = sum(buckets[name][1] for name in wanted if name in buckets)
+        else:
+            value, count = rollup.total, rollup.count
+
+        if op == "sum":
+            return f"The total value of {scope} is ${value:,.2f}."
+
+        if op == "count":
+            return f"There are {count} {counted}."
+
+        if op == "percent":
+            total = rollup.total
+            pct = (value / total * 100) if total else 0
+            return (
+                f"{scope[0].upper() + scope[1:]} make up {pct:.1f}% of the portfolio "
+                f"(${value:,.2f} of ${total:,.2f})."
+            )
+
+        if op == "group" and intent["group_by"] in ("Asset_Class", "Liquidity"):
+            if not count:
+                return f"There are no {counted}."
+            col = intent["group_by"]
+            lines = [f"Allocation of {scope} by {col.replace('_', ' ')}:"]
+            for name, bucket_value, _ in rollup.allocation(col):
+                pct = (bucket_value / value * 100) if value else 0
+                lines.append(f"- {name}: ${bucket_value:,.2f} ({pct:.1f}%)")
+            return "\n".join(lines)
+
+        if op == "top" and not intent["ascending"] and intent["n"] <= rollup.top_k:
+            if not count:
+                return f"There are no {counted}."
+            return _format_top("largest", counted, rollup.top(intent["n"]))
+        return None
+
+    def answer(self, query: str):
+        """
+        Returns the fast-path answer for `query`, or None if it can't be parsed.
+        """
+        intent = self.parse(query)
+        if intent is None:
+            return None
+        return self.execute(intent)
+
+    def _describe(self, filters: dict) -> str:
+        """
+        Renders the active filters as a phrase, e.g. "Cash assets located in UK".
+        """
+        subject = " or ".join(filters["Asset_Class"]) + " assets" if "Asset_Class" in filters else "assets"
+        qualifiers = []
+        for col, values in filters.items():
+            joined = " or ".join(str(v) for v in values)
+            if col == "Location":
+                qualifiers.append(f"located in {joined}")
+            elif col == "Liquidity":
+                qualifiers.append("that are illiquid" if values == ["Illiquid"] else f"with {joined} liquidity")
+            elif col == "Custodian":
+                qualifiers.append(f"held at {joined}")
+            elif col == "Entity_Owner":
+                qualifiers.append(f"owned by {joined}")
+        if not filters:
+            return "the portfolio"
+        return " ".join([subject] + qualifiers)
+
+
+def _format_top(label: str, counted: str, top: list) -> str:
+    if len(top) == 1:
+        name, value = top[0]
+        return f"The {label} of the {counted} is {name}: ${value:,.2f}."
+    lines = [f"The {len(top)} {label} {counted} are:"]
+    for rank, (name, value) in enumerate(top, 1):
+        lines.append(f"{rank}. {name}: ${value:,.2f}")
+    return "\n".join(lines)
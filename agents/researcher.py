@@ -1,73 +1,20 @@
+import hashlib
 import os
-import pandas as pd
-from langchain_community.chat_models import ChatPerplexity
+import threading
 from langchain_core.prompts import ChatPromptTemplate
+from agents.llm_backends import create_chat_model
+from agents.portfolio_rollups import FamilyRollup, get_rollups
+from agents.response_cache import ResponseCache
+from agents.think_filter import ThinkFilter, strip_think
 
-class ResearcherAgent:
-    def __init__(self, family_name: str = "Wayne"):
-        self.family_name = family_name
-        self.portfolio_context = self._generate_portfolio_context(family_name)
-
-    def _generate_portfolio_context(self, family_name: str) -> str:
-        """
-        Generates a portfolio context string from the CSV data for the specific family.
-        """
-        try:
-            df = pd.read_csv("data/portfolio.csv")
-            family_df = df[df['Family'] == family_name]
-            
-            if family_df.empty:
-                return "Client Portfolio Profile: No data available."
-
-            # Calculate Metrics
-            total_aum = family_df['Value_USD'].sum()
-            
-            # Top Allocation by Asset Class
-            allocation = family_df.groupby('Asset_Class')['Value_USD'].sum().sort_values(ascending=False)
-            top_class = allocation.index[0] if not allocation.empty else "N/A"
-            top_pct = (allocation.iloc[0] / total_aum * 100) if not allocation.empty else 0
-            
-            # Secondary Allocation
-            second_class = allocation.index[1] if len(allocation) > 1 else "N/A"
-            second_pct = (allocation.iloc[1] / total_aum * 100) if len(allocation) > 1 else 0
-            
-            # Cash Position
-            cash_df = family_df[family_df['Asset_Class'] == 'Cash']
-            cash_val = cash_df['Value_USD'].sum()
-            cash_pct = (cash_val / total_aum * 100)
-            
-            # Top Assets Names (for flavor)
-            top_assets = family_df.sort_values('Value_USD', ascending=False).head(3)['Asset_Name'].tolist()
-            top_assets_str = ", ".join(top_assets)
-
-            context = f"""
-Client Portfolio Profile ({family_name} Family):
-- Total AUM: ${total_aum:,.2f} USD
-- Top Allocation: {top_pct:.1f}% {top_class}
-- Secondary Allocation: {second_pct:.1f}% {second_class}
-- Cash Position: {cash_pct:.1f}%
-- Key Assets: {top_assets_str}
-"""
-            return context
-        except Exception as e:
-            return f"Client Portfolio Profile: Error loading data ({str(e)})"
+RESEARCHER_MODEL = "sonar-reasoning"
 
-    def run(self, query: str) -> str:
-        """
-        Executes the query against the Perplexity API with dynamic portfolio context.
-        """
-        pplx_api_key = os.getenv("PERPLEXITY_API_KEY")
-        if not pplx_api_key:
-            return "Error: PERPLEXITY_API_KEY not found in environment variables."
+# Market intelligence goes stale, so cached answers expire after RESEARCH_CACHE_TTL_SECONDS.
+RESEARCH_CACHE_TTL_SECONDS = 15 * 60
+RESEARCH_CACHE_MAX_ENTRIES = 512
+RESEARCH_CACHE_PATH = "data/cache/research.sqlite"
 
-        try:
-            chat = ChatPerplexity(
-                temperature=0, 
-                pplx_api_key=pplx_api_key, 
-                model="sonar-reasoning"
-            )
-            
-            system_prompt = """
+RESEARCHER_SYSTEM_PROMPT = """
 You are the Chief Investment Strategist for an Ultra-High-Net-Worth Family Office. Your goal is to provide actionable market intelligence that is directly relevant to the client's specific portfolio.
 
 Response Guidelines:
@@ -96,28 +43,228 @@ Input Structure:
 User Question: {input}
 {portfolio_context}
 """
-            
-            prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", system_prompt),
-                    ("human", "{input}"),
-                ]
+
+
+_research_cache = None
+_research_cache_lock = threading.Lock()
+
+
+def get_research_cache() -> ResponseCache:
+    """
+    Returns the process-wide research cache shared by every ResearcherAgent, so
+    one family's answer can serve another family with the same context.
+    """
+    global _research_cache
+    with _research_cache_lock:
+        if _research_cache is None:
+            _research_cache = ResponseCache(
+                ttl_seconds=RESEARCH_CACHE_TTL_SECONDS,
+                max_entries=RESEARCH_CACHE_MAX_ENTRIES,
+                path=RESEARCH_CACHE_PATH,
             )
-            
+        return _research_cache
+
+
+class ResearcherAgent:
+    def __init__(self, family_name: str = "Wayne", cache: ResponseCache = None, portfolio_context: str = None):
+        self.family_name = family_name
+        # A fixed profile (e.g. a brief shared by a whole batch) replaces the family's rollup
+        self._fixed_context = portfolio_context
+        self._context = None
+        self._context_version = None
+        # Pass ResponseCache(path=None) for a memory-only cache
+        self.cache = cache if cache is not None else get_research_cache()
+
+    @property
+    def portfolio_context(self) -> str:
+        """
+        Portfolio profile for the prompt, regenerated whenever the family's
+        rollup changes.
+        """
+        if self._fixed_context is not None:
+            return self._fixed_context
+        try:
+            rollup = get_rollups().get(self.family_name)
+        except Exception as e:
+            return f"Client Portfolio Profile: Error loading data ({str(e)})"
+        version = (id(rollup), rollup.version)
+        if version != self._context_version:
+            self._context = self._generate_portfolio_context(rollup)
+            self._context_version = version
+        return self._context
+
+    def _generate_portfolio_context(self, rollup: FamilyRollup) -> str:
+        """
+        Generates a portfolio context string from the family's rollup.
+        """
+        if rollup.count == 0:
+            return "Client Portfolio Profile: No data available."
+
+        # Calculate Metrics
+        total_aum = rollup.total
+
+        # Top Allocation by Asset Class
+        allocation = rollup.allocation("Asset_Class")
+        top_class = allocation[0][0] if allocation else "N/A"
+        top_pct = (allocation[0][1] / total_aum * 100) if allocation else 0
+
+        # Secondary Allocation
+        second_class = allocation[1][0] if len(allocation) > 1 else "N/A"
+        second_pct = (allocation[1][1] / total_aum * 100) if len(allocation) > 1 else 0
+
+        # Cash Position
+        cash_pct = (rollup.cash / total_aum * 100) if total_aum else 0
+
+        # Top Assets Names (for flavor)
+        top_assets_str = ", ".join(name for name, _ in rollup.top(3))
+
+        context = f"""
+Client Portfolio Profile ({rollup.family_name} Family):
+- Total AUM: ${total_aum:,.2f} USD
+- Top Allocation: {top_pct:.1f}% {top_class}
+- Secondary Allocation: {second_pct:.1f}% {second_class}
+- Cash Position: {cash_pct:.1f}%
+- Key Assets: {top_assets_str}
+"""
+        return context
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size; the shared response cache is not counted.
+        """
+        return len(self.portfolio_context.encode("utf-8"))
+
+    def _build_chain(self):
+        """
+        Builds the Perplexity chain with the market-strategist system prompt.
+        """
+        chat = create_chat_model(RESEARCHER_MODEL, provider="perplexity")
+        
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", RESEARCHER_SYSTEM_PROMPT),
+                ("human", "{input}"),
+            ]
+        )
+        return prompt | chat
+
+    def cache_key(self, query: str) -> str:
+        """
+        Cache key for a question: normalized query, model and portfolio context.
+        """
+        normalized = " ".join(query.lower().split()).rstrip("?!. ")
+        context_hash = hashlib.sha256(self.portfolio_context.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{RESEARCHER_MODEL}\0{context_hash}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def is_cached(self, query: str) -> bool:
+        return self.cache.contains(self.cache_key(query))
+
+    def run(self, query: str) -> str:
+        """
+        Executes the query against the Perplexity API with dynamic portfolio context.
+        """
+        return self.answer(query)["response"]
+
+    def answer(self, query: str) -> dict:
+        """
+        Answers from the response cache when possible, otherwise via Perplexity.
+        Returns a dictionary with 'response' and 'cache' ('hit' or 'miss').
+        """
+        key = self.cache_key(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {"response": cached, "cache": "hit"}
+
+        pplx_api_key = os.getenv("PERPLEXITY_API_KEY")
+        if not pplx_api_key:
+            return {"response": "Error: PERPLEXITY_API_KEY not found in environment variables.", "cache": "miss"}
+
+        try:
             # Inject context into the prompt
-            chain = prompt | chat
-            response = chain.invoke({
+            response = self._build_chain().invoke({
                 "input": query,
                 "portfolio_context": self.portfolio_context
             })
-            
-            # Clean up response to remove <think> tags if present
-            import re
-            clean_content = re.sub(r'<think>.*?</think>', '', response.content, flags=re.DOTALL).strip()
-            
-            return clean_content
         except Exception as e:
-            return f"Error executing researcher query: {str(e)}"
+            return {"response": f"Error executing researcher query: {str(e)}", "cache": "miss"}
+
+        # Clean up response to remove <think> tags if present
+        content = strip_think(response.content)
+        if content:
+            self.cache.set(key, content)
+        return {"response": content, "cache": "miss"}
+
+    async def arun(self, query: str) -> str:
+        """
+        Async version of `run`.
+        """
+        return (await self.aanswer(query))["response"]
+
+    async def aanswer(self, query: str) -> dict:
+        """
+        Async version of `answer`.
+        """
+        key = self.cache_key(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {"response": cached, "cache": "hit"}
+
+        pplx_api_key = os.getenv("PERPLEXITY_API_KEY")
+        if not pplx_api_key:
+            return {"response": "Error: PERPLEXITY_API_KEY not found in environment variables.", "cache": "miss"}
+
+        try:
+            response = await self._build_chain().ainvoke({
+                "input": query,
+                "portfolio_context": self.portfolio_context
+            })
+        except Exception as e:
+            return {"response": f"Error executing researcher query: {str(e)}", "cache": "miss"}
+
+        content = strip_think(response.content)
+        if content:
+            self.cache.set(key, content)
+        return {"response": content, "cache": "miss"}
+
+    async def astream(self, query: str):
+        """
+        Streams the answer tokens as they arrive, with <think> blocks filtered out.
+        A cached answer is yielded in one piece.
+        """
+        key = self.cache_key(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        pplx_api_key = os.getenv("PERPLEXITY_API_KEY")
+        if not pplx_api_key:
+            yield "Error: PERPLEXITY_API_KEY not found in environment variables."
+            return
+
+        think_filter = ThinkFilter()
+        parts = []
+        try:
+            async for chunk in self._build_chain().astream({
+                "input": query,
+                "portfolio_context": self.portfolio_context
+            }):
+                text = think_filter.feed(chunk.content)
+                if text:
+                    parts.append(text)
+                    yield text
+            text = think_filter.flush()
+            if text:
+                parts.append(text)
+                yield text
+        except Exception as e:
+            yield f"Error executing researcher query: {str(e)}"
+            return
+
+        # Only complete, non-empty answers are cached
+        content = "".join(parts).strip()
+        if content:
+            self.cache.set(key, content)
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
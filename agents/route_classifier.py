@@ -0,0 +1,96 @@
+import csv
+import re
+import threading
+
+import numpy as np
+
+ROUTER_QUERIES_PATH = "data/router_queries.csv"
+LABELS = ["Analyst", "Lawyer", "Researcher", "Hybrid"]
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def load_labelled_queries(path: str = ROUTER_QUERIES_PATH) -> list:
+    """
+    Loads (query, label) pairs from the labelled routing query set.
+    """
+    with open(path, newline="") as f:
+        return [(row["query"], row["label"]) for row in csv.DictReader(f)]
+
+
+def _features(query: str) -> set:
+    tokens = TOKEN_RE.findall(query.lower())
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+class RouteClassifier:
+    """
+    Offline router stage: a small softmax (multinomial logistic regression) model
+    over binary word unigram and bigram features, trained on the labelled query
+    set shipped in `data/router_queries.csv`.
+
+    `predict` returns the most likely label and its probability, which the
+    RouterAgent compares against its confidence threshold before deciding
+    whether to escalate to the LLM router.
+    """
+
+    def __init__(self, examples: list = None, l2: float = 3e-4, iterations: int = 2000,
+                 learning_rate: float = 4.0):
+        self.l2 = l2
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.fit(examples if examples is not None else load_labelled_queries())
+
+    def fit(self, examples: list):
+        vocabulary = sorted({f for query, _ in examples for f in _features(query)})
+        self.index = {feature: i for i, feature in enumerate(vocabulary)}
+        self.labels = [label for label in LABELS if any(label == l for _, l in examples)]
+
+        X = np.vstack([self._vectorize(query) for query, _ in examples])
+        Y = np.eye(len(self.labels))[[self.labels.index(label) for _, label in examples]]
+
+        # Plain full-batch gradient descent: the query set is small enough that
+        # training takes milliseconds and needs no external ML dependency.
+        W = np.zeros((X.shape[1], len(self.labels)))
+        for _ in range(self.iterations):
+            P = self._softmax(X @ W)
+            W -= self.learning_rate * (X.T @ (P - Y) / len(X) + self.l2 * W)
+        self.weights = W
+
+    def predict(self, query: str) -> tuple:
+        """
+        Returns (label, confidence) for the query.
+        """
+        probs = self._softmax(self._vectorize(query)[None, :] @ self.weights)[0]
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    def _vectorize(self, query: str) -> np.ndarray:
+        # Last column is the bias term; features are L2-normalised so long
+        # queries don't get more extreme probabilities just for being long.
+        x = np.zeros(len(self.index) + 1)
+        x[-1] = 1.0
+        hits = [self.index[f] for f in _features(query) if f in self.index]
+        if hits:
+            x[hits] = 1.0 / np.sqrt(len(hits))
+        return x
+
+    @staticmethod
+    def _softmax(Z: np.ndarray) -> np.ndarray:
+        Z = Z - Z.max(axis=1, keepdims=True)
+        E = np.exp(Z)
+        return E / E.sum(axis=1, keepdims=True)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_route_classifier() -> RouteClassifier:
+    """
+    Returns the shared RouteClassifier, training it on first use.
+    """
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = RouteClassifier()
+        return _classifier
@@ -1,23 +1,34 @@
-from langchain_openai import ChatOpenAI
+import asyncio
+import threading
+import time
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from agents.analyst import AnalystAgent
 from agents.lawyer import LawyerAgent
 from agents.researcher import ResearcherAgent
+from agents.llm_backends import create_chat_model
+from agents.async_runner import iterate_sync, run_sync
+from agents.route_classifier import get_route_classifier
+from agents.portfolio_context import PORTFOLIO_CONTEXT_TOKEN_BUDGET, PortfolioContextBuilder, count_tokens
+from agents.semantic_cache import family_fingerprint, get_semantic_cache
+from agents.tracing import current_trace, get_tracer, span
 
-class RouterAgent:
-    def __init__(self, family_name: str = "Wayne"):
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0)
-        self.analyst = AnalystAgent(family_name=family_name)
-        self.lawyer = LawyerAgent(family_name=family_name)
-        self.researcher = ResearcherAgent(family_name=family_name)
+# Local classifier predictions below this confidence are escalated to the LLM router.
+ROUTE_CONFIDENCE_THRESHOLD = 0.7
+# Upper bound on each concurrent Hybrid branch (Analyst, Researcher).
+BRANCH_TIMEOUT_SECONDS = 60.0
 
-    def route_and_execute(self, query: str) -> dict:
-        """
-        Analyzes the query and routes it to the appropriate agent.
-        Returns a dictionary with 'agent' and 'response'.
-        """
-        system_prompt = """
+AGENT_CLASSES = {
+    "analyst": AnalystAgent,
+    "lawyer": LawyerAgent,
+    "researcher": ResearcherAgent,
+}
+# Most frequently routed (and cheapest) agents first.
+WARM_UP_ORDER = ("analyst", "researcher", "lawyer")
+# Rough fixed cost of each agent's LLM client, prompt templates and chains.
+CLIENT_OVERHEAD_BYTES = 256 * 1024
+
+ROUTER_SYSTEM_PROMPT = """
         You are the Wealth Concierge Router. 
         Analyze the user's question and output ONLY the name of the single tool to use.
         
@@ -36,83 +47,471 @@ class RouterAgent:
         4. 'Hybrid': Use ONLY if the user asks two distinct questions that require combining internal facts AND external news.
            - Example: "What is the value of my Apple stock AND what is the latest news on Apple?"
         """
-        
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_prompt),
-                ("human", "{input}"),
-            ]
-        )
-        
-        chain = prompt | self.llm | StrOutputParser()
-        
+
+# Turns a follow-up into a question the router, caches and agents can answer on its own.
+FOLLOW_UP_PROMPT = """
+        You help the AI concierge of House {family}'s Family Office.
+        Rewrite the client's latest question so it can be understood without the conversation:
+        resolve pronouns and references ("it", "that trust", "what about Stark?") using the conversation.
+        If it is already self-contained, repeat it unchanged. Reply with the question only.
+
+        Conversation:
+        {history}
+
+        Latest question: {question}
+        """
+
+
+def create_llm_router(llm):
+    """
+    Builds the LLM routing chain, which outputs the name of the tool to use.
+    """
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", ROUTER_SYSTEM_PROMPT),
+            ("human", "{input}"),
+        ]
+    )
+    return prompt | llm | StrOutputParser()
+
+
+class RouterAgent:
+    def __init__(self, family_name: str = "Wayne", route_confidence_threshold: float = ROUTE_CONFIDENCE_THRESHOLD,
+                 branch_timeout: float = BRANCH_TIMEOUT_SECONDS, semantic_cache=None, warm_up: bool = False,
+                 context_token_budget: int = PORTFOLIO_CONTEXT_TOKEN_BUDGET):
+        self.family_name = family_name
+        self.llm = create_chat_model("gpt-4o")
+        # Sub-agents are built on first use (see `_get_agent`), not here
+        self._agents = {}
+        self._agent_locks = {name: threading.Lock() for name in AGENT_CLASSES}
+        self.construction_times = {}
+        self.classifier = get_route_classifier()
+        self.route_confidence_threshold = route_confidence_threshold
+        self.llm_router = create_llm_router(self.llm)
+        self.branch_timeout = branch_timeout
+        self.context_builder = PortfolioContextBuilder(token_budget=context_token_budget)
+        self.semantic_cache = semantic_cache if semantic_cache is not None else get_semantic_cache()
+        if warm_up:
+            self.warm_up()
+
+    @property
+    def analyst(self) -> AnalystAgent:
+        return self._get_agent("analyst")
+
+    @property
+    def lawyer(self) -> LawyerAgent:
+        return self._get_agent("lawyer")
+
+    @property
+    def researcher(self) -> ResearcherAgent:
+        return self._get_agent("researcher")
+
+    def _get_agent(self, name: str):
+        """
+        Returns the named sub-agent, building it exactly once on first use.
+        Construction time is recorded in `construction_times` (seconds).
+        """
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        with self._agent_locks[name]:
+            if name not in self._agents:
+                with span(f"build.{name}"):
+                    start = time.perf_counter()
+                    self._agents[name] = AGENT_CLASSES[name](family_name=self.family_name)
+                    self.construction_times[name] = time.perf_counter() - start
+            return self._agents[name]
+
+    async def _aget_agent(self, name: str):
+        """
+        Async version of `_get_agent`; construction runs in a worker thread so
+        it doesn't block the event loop.
+        """
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        return await asyncio.to_thread(self._get_agent, name)
+
+    def warm_up(self, names=WARM_UP_ORDER) -> list:
+        """
+        Builds the given sub-agents in background threads (e.g. while the user
+        is typing). Failures are logged; the agent is retried on first use.
+        Returns the started threads.
+        """
+        def build(name):
+            try:
+                self._get_agent(name)
+            except Exception as e:
+                print(f"Warning: Warm-up of {name} failed: {e}")
+
+        threads = []
+        for name in names:
+            if name in self._agents:
+                continue
+            thread = threading.Thread(target=build, args=(name,), name=f"warm-up-{name}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size of this router and the sub-agents built so far.
+        Grows as lazily built sub-agents come up.
+        """
+        agents = list(self._agents.values())
+        return CLIENT_OVERHEAD_BYTES * (1 + len(agents)) + sum(agent.memory_bytes() for agent in agents)
+
+    def route(self, query: str) -> dict:
+        """
+        Picks the agent for a query. The local classifier answers when it is
+        confident enough; otherwise the LLM router is asked.
+        Returns a dictionary with 'route', 'confidence' and 'router'.
+        """
+        return run_sync(self.aroute(query))
+
+    async def aroute(self, query: str) -> dict:
+        """
+        Async version of `route`.
+        """
+        with span("route") as route_span:
+            label, confidence = self.classifier.predict(query)
+            if confidence >= self.route_confidence_threshold:
+                routing = {"route": label, "confidence": confidence, "router": "local"}
+            else:
+                route = (await self.llm_router.ainvoke({"input": query})).strip()
+                routing = {"route": route, "confidence": confidence, "router": "llm"}
+            route_span.set(**routing)
+        current_trace().set(route=routing["route"], router=routing["router"])
+        return routing
+
+    def route_and_execute(self, query: str, conversation=None) -> dict:
+        """
+        Analyzes the query and routes it to the appropriate agent.
+        Returns a dictionary with 'agent', 'response' and 'semantic_cache'
+        ('hit'/'miss'), plus 'path' for Analyst and Lawyer answers and 'cache' for
+        Researcher answers. With a `conversation`, a follow-up question is first
+        rewritten into a standalone one ('standalone_query') and the answered
+        turn is recorded.
+        Synchronous wrapper around `aroute_and_execute`.
+        """
+        return run_sync(self.aroute_and_execute(query, conversation=conversation))
+
+    async def aroute_and_execute(self, query: str, routing: dict = None, conversation=None) -> dict:
+        """
+        Async version of `route_and_execute`. A question similar enough to one
+        already answered for this family is served from the semantic cache.
+        A `routing` from an earlier `aroute` (e.g. shared by a batch) skips the
+        routing step.
+        """
+        with get_tracer().trace("route_and_execute", family=self.family_name, query_chars=len(query)) as trace:
+            question = await self._astandalone_query(query, conversation)
+            cached, fingerprint, vector = await self._alookup_semantic_cache(question)
+            if cached is not None:
+                result = {**cached, "semantic_cache": "hit"}
+            else:
+                result = await self._aexecute(question, routing)
+                # Fast-path answers are cheaper to recompute than to keep (and never stale)
+                if vector is not None and is_answer(result) and result.get("path") != "fast_path":
+                    self.semantic_cache.store(self.family_name, question, vector, result, fingerprint)
+                result = {**result, "semantic_cache": "miss"}
+            if question != query:
+                result["standalone_query"] = question
+            _trace_result(trace, result)
+            _remember(conversation, question, result)
+            return result
+
+    async def _aexecute(self, query: str, routing: dict = None) -> dict:
+        """
+        Routes (unless `routing` is given) and executes a query. Hybrid queries
+        fan out to the Analyst and Researcher concurrently, each bounded by
+        `branch_timeout`.
+        """
         try:
-            route = chain.invoke({"input": query}).strip()
-            print(f"DEBUG: Routed to {route}")
-            
+            if routing is None:
+                routing = await self.aroute(query)
+            else:
+                current_trace().set(route=routing["route"], router=routing["router"])
+            route = routing["route"]
+
             if "Analyst" in route:
-                result = {"agent": "Analyst", "response": self.analyst.run(query)}
+                analyst = await self._aget_agent("analyst")
+                with span("analyst"):
+                    result = {"agent": "Analyst", **(await analyst.aanswer(query))}
             elif "Lawyer" in route:
-                result = {"agent": "Lawyer", "response": self.lawyer.run(query)}
+                lawyer = await self._aget_agent("lawyer")
+                with span("lawyer"):
+                    result = {"agent": "Lawyer", **(await lawyer.aanswer(query))}
             elif "Researcher" in route:
-                result = {"agent": "Researcher", "response": self.researcher.run(query)}
+                researcher = await self._aget_agent("researcher")
+                with span("researcher"):
+                    result = {"agent": "Researcher", **(await researcher.aanswer(query))}
             elif "Hybrid" in route:
-                print("DEBUG: Executing Hybrid Logic...")
-                
-                # Smart Context Fetching for Hybrid Queries
-                # If the user asks about "impact" or "affect", we bypass the Analyst LLM and 
-                # directly inject the raw portfolio dataframe to ensure the Combiner sees ALL assets.
-                if any(keyword in query.lower() for keyword in ["affect", "impact", "influence", "consequence", "outlook"]):
-                    print("DEBUG: Detected Impact Query - Injecting full portfolio dataframe...")
-                    # Get the dataframe directly from the analyst agent instance
-                    portfolio_str = self.analyst.df.to_markdown(index=False)
-                    analyst_resp = f"Current Portfolio Holdings:\n{portfolio_str}"
-                else:
-                    # Default to passing the raw query
-                    analyst_resp = self.analyst.run(query)
-
-                researcher_resp = self.researcher.run(query)
-                
-                # DEBUG PRINT
-                print(f"DEBUG - Analyst Says: {analyst_resp}") 
-                print(f"DEBUG - Researcher Says: {researcher_resp}")
-
-                # The Combiner Prompt: explicitly handles errors/empty responses
-                combiner_prompt = f"""
-                You are the Chief Investment Officer. I have gathered information from two sources to answer the user's query.
-                
-                User Query: {query}
-                
-                Source 1 (Client's Portfolio Data): 
-                {analyst_resp}
-                
-                Source 2 (External Market Intelligence): 
-                {researcher_resp}
-                
-                Instructions:
-                1. ANALYZE: Look at the specific assets listed in Source 1.
-                2. CONNECT: Explicitly map the market trends in Source 2 to the specific assets in Source 1.
-                   - Example: "The tariff war impacts your [Asset Name] because it is in the [Sector] sector..."
-                3. IGNORE Source 1 if it says "I don't know" or is empty, and just provide the market news.
-                4. FORMAT: Use a professional, advisory tone. Use bullet points for specific asset impacts.
-                """
-                
-                combiner_response = self.llm.invoke(combiner_prompt).content
+                combiner_prompt, fallback = await self._aprepare_hybrid(query)
+                if combiner_prompt is None:
+                    return {"agent": "Error", "response": fallback}
+                with span("combiner", prompt_chars=len(combiner_prompt)):
+                    combiner_response = (await self.llm.ainvoke(combiner_prompt)).content
                 result = {"agent": "Hybrid", "response": combiner_response}
             
             else:
                 result = {"agent": "Unknown", "response": "I'm not sure how to route this query."}
 
-            # Global Cleaning: Remove <think> tags from any agent's response
-            if "response" in result and isinstance(result["response"], str):
-                import re
-                result["response"] = re.sub(r'<think>.*?</think>', '', result["response"], flags=re.DOTALL).strip()
-            
+            # <think> blocks are stripped at the source (ResearcherAgent), so the
+            # responses here are already clean.
             return result
                 
         except Exception as e:
             return {"agent": "Error", "response": f"Routing error: {str(e)}"}
 
+    def stream_route_and_execute(self, query: str, conversation=None):
+        """
+        Synchronous generator wrapper around `astream_route_and_execute` (for Streamlit).
+        """
+        yield from iterate_sync(self.astream_route_and_execute(query, conversation))
+
+    async def astream_route_and_execute(self, query: str, conversation=None):
+        """
+        Streaming version of `aroute_and_execute`. Yields event dictionaries: first
+        {'agent': ...} (plus 'path'/'cache'/'semantic_cache'/'standalone_query' as
+        in `route_and_execute`) as soon as the route is known, then {'token': ...}
+        chunks as the answer is generated.
+        """
+        with get_tracer().trace("stream_route_and_execute", family=self.family_name, query_chars=len(query)) as trace:
+            question = await self._astandalone_query(query, conversation)
+            rewritten = {"standalone_query": question} if question != query else {}
+            cached, fingerprint, vector = await self._alookup_semantic_cache(question)
+            if cached is not None:
+                _trace_result(trace, {**cached, "semantic_cache": "hit"})
+                yield {**{k: v for k, v in cached.items() if k != "response"}, "semantic_cache": "hit", **rewritten}
+                yield {"token": cached["response"]}
+                _remember(conversation, question, cached)
+                return
+
+            result = {}
+            start = time.perf_counter()
+            async for event in self._astream_execute(question):
+                if "agent" in event:
+                    result = dict(event)
+                    result["response"] = ""
+                    event = {**event, "semantic_cache": "miss", **rewritten}
+                if "token" in event:
+                    if not result["response"]:
+                        trace.set(first_token_ms=round((time.perf_counter() - start) * 1000, 3))
+                    result["response"] += event["token"]
+                yield event
+
+            _trace_result(trace, {**result, "semantic_cache": "miss"})
+            if vector is not None and is_answer(result) and result.get("path") != "fast_path":
+                self.semantic_cache.store(self.family_name, question, vector, result, fingerprint)
+            _remember(conversation, question, result)
+
+    async def _astream_execute(self, query: str):
+        """
+        Streams the routing and execution of a query as event dictionaries.
+        """
+        try:
+            routing = await self.aroute(query)
+            route = routing["route"]
+
+            if "Analyst" in route:
+                analyst = await self._aget_agent("analyst")
+                if analyst.query_engine.parse(query) is not None:
+                    path = "fast_path"
+                else:
+                    path = "sql" if analyst.sql is not None else "llm_agent"
+                yield {"agent": "Analyst", "path": path}
+                tokens = analyst.astream(query)
+                stage = "analyst"
+            elif "Lawyer" in route:
+                lawyer = await self._aget_agent("lawyer")
+                fact_response = await asyncio.to_thread(lawyer.fact_answer, query)
+                yield {"agent": "Lawyer", "path": "fast_path" if fact_response is not None else "rag"}
+                tokens = lawyer.astream(query)
+                stage = "lawyer"
+            elif "Researcher" in route:
+                researcher = await self._aget_agent("researcher")
+                yield {"agent": "Researcher", "cache": "hit" if researcher.is_cached(query) else "miss"}
+                tokens = researcher.astream(query)
+                stage = "researcher"
+            elif "Hybrid" in route:
+                yield {"agent": "Hybrid"}
+                combiner_prompt, fallback = await self._aprepare_hybrid(query)
+                if combiner_prompt is None:
+                    yield {"agent": "Error"}
+                    yield {"token": fallback}
+                    return
+                tokens = _message_text(self.llm.astream(combiner_prompt))
+                stage = "combiner"
+            else:
+                yield {"agent": "Unknown"}
+                yield {"token": "I'm not sure how to route this query."}
+                return
+
+            with span(stage):
+                async for token in tokens:
+                    yield {"token": token}
+
+        except Exception as e:
+            yield {"agent": "Error"}
+            yield {"token": f"Routing error: {str(e)}"}
+
+    async def _astandalone_query(self, query: str, conversation) -> str:
+        """
+        Rewrites a follow-up question into a standalone one using the
+        conversation's bounded history, so prompt size stays constant. Other
+        questions, and follow-ups whose rewrite fails, are returned unchanged.
+        """
+        if conversation is None or not conversation.is_follow_up(query):
+            return query
+        history = conversation.context()
+        with span("follow_up", history_tokens=count_tokens(history)) as follow_up_span:
+            prompt = FOLLOW_UP_PROMPT.format(family=self.family_name, history=history, question=query)
+            try:
+                rewritten = (await self.llm.ainvoke(prompt)).content.strip().strip('"')
+            except Exception as e:
+                follow_up_span.set(error=str(e))
+                return query
+        current_trace().set(follow_up=True)
+        return rewritten or query
+
+    async def _alookup_semantic_cache(self, query: str) -> tuple:
+        """
+        Returns (cached_result, fingerprint, vector). A cache failure (e.g. no
+        embedding API) is treated as a miss that won't be stored.
+        """
+        # The Analyst fast path answers faster than a query embedding call. Only
+        # checked once the Analyst exists: building it here would make every
+        # Lawyer or Researcher question pay for the Analyst.
+        analyst = self._agents.get("analyst")
+        if analyst is not None and analyst.query_engine.parse(query) is not None:
+            return None, None, None
+        with span("semantic_cache") as cache_span:
+            try:
+                fingerprint = family_fingerprint(self.family_name)
+                cached, vector = await self.semantic_cache.alookup(self.family_name, query, fingerprint)
+                cache_span.set(result="miss" if cached is None else "hit")
+                return cached, fingerprint, vector
+            except Exception as e:
+                cache_span.set(result="unavailable", error=str(e))
+                return None, None, None
+
+    async def _aprepare_hybrid(self, query: str) -> tuple:
+        """
+        Gathers both Hybrid sources concurrently and builds the combiner prompt.
+        Returns (combiner_prompt, None), or (None, message) if both sources failed.
+        """
+        analyst, researcher = await asyncio.gather(
+            self._aget_agent("analyst"), self._aget_agent("researcher")
+        )
+        
+        # Smart Context Fetching for Hybrid Queries
+        # If the user asks about "impact" or "affect", we bypass the Analyst LLM and
+        # inject the portfolio directly: the holdings most relevant to the query (and
+        # the largest) row by row, the rest rolled up, within a fixed token budget.
+        if any(keyword in query.lower() for keyword in ["affect", "impact", "influence", "consequence", "outlook"]):
+            with span("hybrid.portfolio_context") as context_span:
+                context = self.context_builder.build(analyst.df, query)
+                context_span.set(**{k: v for k, v in context.items() if k != "text"})
+            current_trace().set(hybrid_context="portfolio_summary", context_tokens=context["tokens"])
+            analyst_branch = _completed(context["text"])
+        else:
+            # Default to passing the raw query
+            analyst_branch = self._run_branch("Analyst", analyst.arun(query))
+
+        # The two sources are independent, so fetch them concurrently
+        (analyst_ok, analyst_resp), (researcher_ok, researcher_resp) = await asyncio.gather(
+            analyst_branch,
+            self._run_branch("Researcher", researcher.arun(query)),
+        )
+        
+        if not analyst_ok and not researcher_ok:
+            return None, f"{analyst_resp}\n\n{researcher_resp}"
+
+        # The Combiner Prompt: explicitly handles errors/empty responses
+        combiner_prompt = f"""
+        You are the Chief Investment Officer. I have gathered information from two sources to answer the user's query.
+        
+        User Query: {query}
+        
+        Source 1 (Client's Portfolio Data): 
+        {analyst_resp}
+        
+        Source 2 (External Market Intelligence): 
+        {researcher_resp}
+        
+        Instructions:
+        1. ANALYZE: Look at the specific assets listed in Source 1.
+        2. CONNECT: Explicitly map the market trends in Source 2 to the specific assets in Source 1.
+           - Example: "The tariff war impacts your [Asset Name] because it is in the [Sector] sector..."
+        3. IGNORE Source 1 if it says "I don't know" or is empty, and just provide the market news.
+        4. FORMAT: Use a professional, advisory tone. Use bullet points for specific asset impacts.
+        """
+        return combiner_prompt, None
+
+    async def _run_branch(self, name: str, coro) -> tuple:
+        """
+        Awaits one Hybrid branch with a timeout. Returns (ok, text); a failed or
+        slow branch yields a short note instead of failing the whole query. The
+        agents report their own failures as an "Error ..." response; those count
+        as failed too, and the error text stays on the span rather than going
+        into the combiner prompt.
+        """
+        with span(f"hybrid.{name.lower()}") as branch_span:
+            try:
+                text = await asyncio.wait_for(coro, self.branch_timeout)
+            except asyncio.TimeoutError:
+                branch_span.set(error=f"timed out after {self.branch_timeout}s")
+                return False, f"{name} data unavailable: the request timed out."
+            except Exception as e:
+                branch_span.set(error=str(e))
+                return False, f"{name} data unavailable."
+            if text.startswith("Error"):
+                branch_span.set(error=text[:200])
+                return False, f"{name} data unavailable."
+            branch_span.set(response_chars=len(text))
+            return True, text
+
+
+def _trace_result(trace, result: dict):
+    """
+    Copies the outcome of a request (agent, path, cache hits) onto its trace.
+    """
+    trace.set(**{key: result[key] for key in ("agent", "path", "cache", "semantic_cache", "plan_cache") if key in result})
+    response = result.get("response", "")
+    if result.get("agent") == "Error" or response.startswith("Error"):
+        trace.fail(response[:200])
+
+
+def _remember(conversation, question: str, result: dict):
+    """
+    Records an answered question in the conversation (errors are left out).
+    """
+    if conversation is not None and is_answer(result):
+        conversation.add_turn(question, result["response"])
+
+
+def is_answer(result: dict) -> bool:
+    """
+    Whether a result is a successful answer from a real agent. Agents report
+    their own failures as a response starting with "Error", so those don't
+    count. Only answers go into the semantic cache and the conversation, and
+    a batch only treats answered jobs as done.
+    """
+    if result.get("agent") not in ("Analyst", "Lawyer", "Researcher", "Hybrid"):
+        return False
+    response = result.get("response", "")
+    return bool(response) and not response.startswith("Error")
+
+
+async def _completed(text: str) -> tuple:
+    return True, text
+
+
+async def _message_text(chunks):
+    async for chunk in chunks:
+        if chunk.content:
+            yield chunk.content
+
 if __name__ == "__main__":
     from dotenv import load_dotenv
     load_dotenv()
@@ -0,0 +1,174 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from agents.embedding_cache import CachedEmbeddings
+from agents.holdings_db import VALUE_COLUMNS
+from agents.llm_backends import create_embeddings
+from agents.portfolio_store import get_portfolio_store
+from agents.researcher import RESEARCH_CACHE_TTL_SECONDS
+from agents.sql_analyst import question_shape
+
+SIMILARITY_THRESHOLD = 0.92
+SEMANTIC_CACHE_TTL_SECONDS = 30 * 60
+# Market answers may not outlive the research cache's staleness bound.
+AGENT_TTL_SECONDS = {"Researcher": RESEARCH_CACHE_TTL_SECONDS, "Hybrid": RESEARCH_CACHE_TTL_SECONDS}
+SEMANTIC_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Family values a reused answer must agree on, besides numbers ("cash in USA" is not "cash in Switzerland").
+SLOT_COLUMNS = VALUE_COLUMNS + ["Entity_Owner", "Asset_Name"]
+# Rough per-entry bookkeeping overhead (dict, tuple, key) on top of the payload.
+ENTRY_OVERHEAD_BYTES = 512
+
+
+def family_fingerprint(family_name: str) -> str:
+    """
+    Fingerprint of everything a family's answers depend on: its portfolio rows
+    and its legal documents (by name, size and mtime).
+    """
+    parts = [get_portfolio_store().family_digest(family_name)]
+    doc_path = f"data/legal_docs/{family_name.lower()}"
+    if os.path.isdir(doc_path):
+        for name in sorted(os.listdir(doc_path)):
+            stat = os.stat(os.path.join(doc_path, name))
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """
+    Embedding-similarity answer cache, partitioned by family.
+
+    A query whose embedding has cosine similarity >= `threshold` with a cached
+    query of the same family reuses that answer (and its route), provided both
+    name the same family values and numbers (see `question_shape`). Entries expire
+    after `ttl_seconds`, or sooner for market answers (AGENT_TTL_SECONDS), and
+    are evicted least-recently-used first once their
+    estimated size exceeds `max_bytes`. A family's entries are dropped as soon
+    as its fingerprint (portfolio rows + legal docs) changes.
+    """
+
+    def __init__(self, embeddings, threshold: float = SIMILARITY_THRESHOLD,
+                 ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS, max_bytes: int = SEMANTIC_CACHE_MAX_BYTES):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        # entry id -> (family, vector, result, expires_at, size, slots); order is LRU order
+        self._entries = OrderedDict()
+        self._by_family = {}
+        self._fingerprints = {}
+        # family -> (fingerprint, {column: values}) for `question_shape`
+        self._known_values = {}
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def alookup(self, family_name: str, query: str, fingerprint: str):
+        """
+        Returns (result, vector) where result is the cached result dict or None;
+        pass `vector` back to `store` to avoid embedding the query twice.
+        """
+        vector = self._normalize(await self.embeddings.aembed_query(query))
+        slots = self._slots(family_name, query, fingerprint)
+        now = time.time()
+        with self._lock:
+            self._check_fingerprint(family_name, fingerprint)
+            live_ids = []
+            for entry_id in list(self._by_family.get(family_name, ())):
+                if self._entries[entry_id][3] <= now:
+                    self._evict(entry_id)
+                elif self._entries[entry_id][5] == slots:
+                    live_ids.append(entry_id)
+            best_id = None
+            if live_ids:
+                scores = np.stack([self._entries[i][1] for i in live_ids]) @ vector
+                best = int(scores.argmax())
+                if scores[best] >= self.threshold:
+                    best_id = live_ids[best]
+            if best_id is None:
+                self.misses += 1
+                return None, vector
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return dict(self._entries[best_id][2]), vector
+
+    def store(self, family_name: str, query: str, vector: np.ndarray, result: dict, fingerprint: str):
+        # A research answer served from the research cache is of unknown age;
+        # caching it again here could keep it past the staleness bound
+        if result.get("agent") == "Researcher" and result.get("cache") == "hit":
+            return
+        ttl = min(self.ttl_seconds, AGENT_TTL_SECONDS.get(result.get("agent"), self.ttl_seconds))
+        size = vector.nbytes + ENTRY_OVERHEAD_BYTES + sum(len(str(v)) for v in result.values())
+        if size > self.max_bytes:
+            return
+        slots = self._slots(family_name, query, fingerprint)
+        with self._lock:
+            self._check_fingerprint(family_name, fingerprint)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (family_name, vector, dict(result), time.time() + ttl, size, slots)
+            self._by_family.setdefault(family_name, set()).add(entry_id)
+            self.resident_bytes += size
+            while self.resident_bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+            }
+
+    def _slots(self, family_name: str, query: str, fingerprint: str) -> list:
+        """
+        The family values and numbers named in `query`, in order.
+        """
+        known = self._known_values.get(family_name)
+        if known is None or known[0] != fingerprint:
+            df = get_portfolio_store().family(family_name, columns=SLOT_COLUMNS)
+            known = (fingerprint, {column: [str(v) for v in df[column].dropna().unique() if str(v).strip()]
+                                   for column in SLOT_COLUMNS if column in df})
+            self._known_values[family_name] = known
+        return question_shape(query, known[1])[1]
+
+    def _check_fingerprint(self, family_name: str, fingerprint: str):
+        if self._fingerprints.get(family_name) == fingerprint:
+            return
+        # The family's data changed: none of its cached answers can be trusted.
+        for entry_id in list(self._by_family.get(family_name, ())):
+            self._evict(entry_id)
+        self._fingerprints[family_name] = fingerprint
+
+    def _evict(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._by_family[entry[0]].discard(entry_id)
+        self.resident_bytes -= entry[4]
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Returns the process-wide semantic cache shared by every RouterAgent.
+    """
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache(CachedEmbeddings(create_embeddings()))
+        return _semantic_cache
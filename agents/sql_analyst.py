@@ -0,0 +1,248 @@
+import asyncio
+import json
+import re
+import threading
+from collections import OrderedDict
+
+from agents.holdings_db import HOLDINGS_SCHEMA, MAX_ROWS, VALUE_COLUMNS, QueryError, get_holdings_db
+from agents.tracing import span
+
+# Question shapes whose generated SQL is kept.
+PLAN_CACHE_SIZE = 256
+MONEY_COLUMN = re.compile(r"value|usd|total|sum|aum|amount", re.IGNORECASE)
+NUMBER = r"\d+(?:\.\d+)?"
+
+SQL_PROMPT = """You write SQLite queries for a Family Office's portfolio analyst.
+
+Schema:
+{schema}
+
+The `holdings` table contains only this family's holdings. Known values:
+{values}
+
+Rules:
+- Write exactly one read-only SELECT statement, without comments or a trailing semicolon.
+- Every literal taken from the question (categories, names, numbers) must be a named parameter such as :asset_class, with its value in "params".
+- Give computed columns descriptive snake_case aliases, e.g. total_value_usd.
+
+Reply with JSON only: {{"sql": "...", "params": {{...}}}}
+
+Question: {question}"""
+
+
+class PlanCache:
+    """
+    Generated SQL keyed by question shape, shared by every family.
+
+    A shape is the question with the known column values and numbers it
+    mentions replaced by slots named after their column, so "How much is in
+    Switzerland?" and "How much is in USA?" share one plan: the first asks the
+    LLM, the second binds USA into the same parameterized SQL. "How much is in
+    Real Estate?" has an Asset_Class slot instead, so it gets its own plan.
+    A plan is only kept if every slot became a parameter (otherwise a literal
+    from the first question would leak into the second). SQLite reuses the
+    compiled statement for repeated SQL text.
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape: str):
+        with self._lock:
+            plan = self._plans.get(shape)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(shape)
+            self.hits += 1
+            return plan
+
+    def put(self, shape: str, slots: list, sql: str, params: dict) -> bool:
+        """
+        Stores the plan if it can be reused for other slot values. Params are
+        recorded as ("slot", index) or ("const", value).
+        """
+        template = {}
+        for name, value in params.items():
+            index = next((i for i, slot in enumerate(slots) if _same(slot, value)), None)
+            template[name] = ("slot", index) if index is not None else ("const", value)
+        used = {ref for kind, ref in template.values() if kind == "slot"}
+        if used != set(range(len(slots))):
+            return False
+        with self._lock:
+            self._plans[shape] = (sql, template)
+            self._plans.move_to_end(shape)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return True
+
+
+class SQLAnalyst:
+    """
+    Answers portfolio questions by having the LLM write parameterized SQL
+    against the declared holdings schema and running it on the indexed
+    holdings database, instead of letting an agent execute Python over the
+    whole frame.
+    """
+
+    def __init__(self, family_name: str, llm, db=None, plan_cache: PlanCache = None):
+        self.family_name = family_name
+        self.llm = llm
+        self.db = db or get_holdings_db()
+        self.plan_cache = plan_cache or get_plan_cache()
+
+    def answer(self, query: str) -> dict:
+        """
+        Returns 'response' plus 'sql', 'params', 'execution_ms' and 'plan_cache'
+        ('hit'/'miss'), or just 'response' if the query could not be answered.
+        """
+        shape, slots, plan, prompt = self._plan(query)
+        try:
+            if plan is None:
+                plan = _parse_plan(self.llm.invoke(prompt).content)
+            return self._run(shape, slots, plan)
+        except (QueryError, ValueError) as e:
+            return {"response": f"Error executing analyst query: {str(e)}"}
+
+    async def aanswer(self, query: str) -> dict:
+        """
+        Async version of `answer`; the query runs in a worker thread.
+        """
+        shape, slots, plan, prompt = await asyncio.to_thread(self._plan, query)
+        try:
+            if plan is None:
+                plan = _parse_plan((await self.llm.ainvoke(prompt)).content)
+            return await asyncio.to_thread(self._run, shape, slots, plan)
+        except (QueryError, ValueError) as e:
+            return {"response": f"Error executing analyst query: {str(e)}"}
+
+    def _plan(self, query: str) -> tuple:
+        """
+        Returns (shape, slots, cached plan or None, prompt for the LLM).
+        """
+        self.db.ensure_family(self.family_name)
+        # Shapes use every family's values so plans carry over between families
+        known = {column: self.db.distinct_values(None, column) for column in VALUE_COLUMNS}
+        shape, slots = question_shape(query, known)
+        cached = self.plan_cache.get(shape)
+        if cached is not None:
+            sql, template = cached
+            params = {name: slots[ref] if kind == "slot" else ref for name, (kind, ref) in template.items()}
+            return shape, slots, {"sql": sql, "params": params, "cached": True}, None
+        values = {column: self.db.distinct_values(self.family_name, column) for column in VALUE_COLUMNS}
+        prompt = SQL_PROMPT.format(
+            schema=HOLDINGS_SCHEMA,
+            values="\n".join(f"- {column}: {', '.join(values[column])}" for column in VALUE_COLUMNS),
+            question=query,
+        )
+        return shape, slots, None, prompt
+
+    def _run(self, shape: str, slots: list, plan: dict) -> dict:
+        with span("sql_query") as sql_span:
+            result = self.db.execute(self.family_name, plan["sql"], plan["params"])
+            sql_span.set(execution_ms=round(result["execution_ms"], 3), rows=len(result["rows"]))
+        if not plan.get("cached"):
+            self.plan_cache.put(shape, slots, plan["sql"], plan["params"])
+        return {
+            "response": format_result(result),
+            "sql": plan["sql"],
+            "params": plan["params"],
+            "execution_ms": result["execution_ms"],
+            "plan_cache": "hit" if plan.get("cached") else "miss",
+        }
+
+
+def question_shape(query: str, known_values: dict) -> tuple:
+    """
+    Returns (shape, slot values): the lowercased question with the known
+    values of each column ({column: [values]}) replaced by "{Column}" and
+    numbers by "{number}", in the order they appear. A value found in several
+    columns gets all of them, e.g. "{Asset_Class|Liquidity}".
+    """
+    text = " ".join(query.lower().split())
+    by_phrase = {}
+    for column, values in known_values.items():
+        for value in values:
+            entry = by_phrase.setdefault(value.lower(), [value, []])
+            entry[1].append(column)
+    alternatives = [re.escape(p) for p in sorted(by_phrase, key=len, reverse=True)]
+    pattern = re.compile(r"\b(" + "|".join(alternatives + [NUMBER]) + r")\b")
+    slots = []
+
+    def replace(match):
+        phrase = match.group(1)
+        if phrase in by_phrase:
+            value, columns = by_phrase[phrase]
+            slots.append(value)
+            return "{" + "|".join(sorted(columns)) + "}"
+        slots.append(float(phrase) if "." in phrase else int(phrase))
+        return "{number}"
+
+    return pattern.sub(replace, text), slots
+
+
+def format_result(result: dict) -> str:
+    """
+    One value as a sentence, anything else as a markdown table.
+    """
+    columns, rows = result["columns"], result["rows"]
+    if not rows:
+        return "No matching holdings."
+    if len(rows) == 1 and len(columns) == 1:
+        return f"{_label(columns[0])}: {_value(columns[0], rows[0][0])}."
+    lines = [
+        "| " + " | ".join(_label(c) for c in columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    lines += ["| " + " | ".join(_value(c, v) for c, v in zip(columns, row)) + " |" for row in rows]
+    if result["truncated"]:
+        lines.append(f"\nShowing the first {MAX_ROWS} rows.")
+    return "\n".join(lines)
+
+
+def _parse_plan(content: str) -> dict:
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError("The model did not return a SQL plan")
+    plan = json.loads(content[start:end + 1])
+    if not isinstance(plan.get("sql"), str) or not isinstance(plan.get("params", {}), dict):
+        raise ValueError("The model returned a malformed SQL plan")
+    return {"sql": plan["sql"], "params": plan.get("params", {})}
+
+
+def _same(slot, value) -> bool:
+    if isinstance(slot, str):
+        return isinstance(value, str) and slot.lower() == value.lower()
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and float(slot) == float(value)
+
+
+def _label(column: str) -> str:
+    text = column.replace("_", " ").strip()
+    return text[:1].upper() + text[1:]
+
+
+def _value(column: str, value) -> str:
+    if isinstance(value, float):
+        return f"${value:,.2f}" if MONEY_COLUMN.search(column) else f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+_plan_cache = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    """
+    Returns the process-wide SQL plan cache.
+    """
+    global _plan_cache
+    with _plan_cache_lock:
+        if _plan_cache is None:
+            _plan_cache = PlanCache()
+        return _plan_cache
@@ -0,0 +1,452 @@
+import json
+import os
+import shutil
+import threading
+from typing import Any, List
+from urllib.parse import quote, unquote
+
+import faiss
+import numpy as np
+from langchain_community.document_loaders import TextLoader
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agents.embedding_cache import CachedEmbeddings
+from agents.index_store import INDEX_DIR, hash_files
+from agents.legal_facts import extract_facts, merge_facts
+from agents.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from agents.llm_backends import create_embeddings
+
+TENANT_INDEX_DIR = os.path.join(INDEX_DIR, "tenants")
+# Shared state (model, next chunk id); each tenant's shard is a directory of its own
+STATE_NAME = "state.json"
+SHARD_VECTORS_NAME = "vectors.npz"
+SHARD_STATE_NAME = "shard.json"
+# Written by the single-file layout, which saved every tenant on every sync
+LEGACY_INDEX_NAME = "index.faiss"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# vector: MMR over FAISS (one embedding call per query); lexical: BM25 only;
+# hybrid: both lists fused by reciprocal rank; auto: lexical when the query
+# names a person or asset from the family's documents, otherwise hybrid
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid", "auto")
+DEFAULT_RETRIEVAL_MODE = "auto"
+
+
+class TenantIndex:
+    """
+    One persistent FAISS index shared by every family (tenant).
+
+    Every chunk gets a stable integer id and is tagged with its family. Searches
+    always run with a FAISS id selector restricted to the requesting family's
+    ids, so one tenant's query can never return another tenant's chunks, and a
+    family with no documents gets no results rather than someone else's.
+
+    Tenants are synced from their document folder incrementally, like
+    `LegalIndexStore`: only added, changed or removed files are re-embedded or
+    deleted, and adding or removing a tenant never rebuilds the others.
+
+    A BM25 index over the same chunk ids (`LexicalIndex`) is kept alongside
+    the vectors. It is rebuilt from the chunk texts on load rather than saved.
+
+    Facts extracted from each file (`legal_facts.extract_facts`) are stored
+    per file next to its chunks and replaced in the same sync, so they always
+    describe the same version of the documents as the chunks do.
+
+    On disk every tenant is a shard (its vectors, chunks and facts), so saving
+    after one family's sync writes that family only. The FAISS index is
+    rebuilt from the shards on load.
+    """
+
+    def __init__(self, embeddings, text_splitter, root: str = TENANT_INDEX_DIR):
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+        self.root = root
+        self._lock = threading.RLock()
+        self._sync_locks = {}
+        self._index = None
+        # chunk id -> Document
+        self._docs = {}
+        # family -> {relative path: {"sha256": ..., "ids": [...]}}
+        self._tenants = {}
+        # family -> (ids array, selector); rebuilt when the tenant changes
+        self._selectors = {}
+        # family -> {relative path: {field: [values]}}
+        self._facts = {}
+        self._next_id = 0
+        self._lexical = LexicalIndex()
+        # Tenants changed since their shard was last written
+        self._dirty = set()
+        self._load()
+
+    def sync(self, family_name: str, source_dir: str, save: bool = True) -> bool:
+        """
+        Brings a tenant in line with the .txt files in `source_dir`. A missing
+        folder removes the tenant. Returns True if anything changed. With
+        `save` the tenant's shard is written right away; otherwise `save()`
+        writes every changed shard later.
+        """
+        with self._lock:
+            sync_lock = self._sync_locks.setdefault(family_name, threading.Lock())
+        with sync_lock:
+            current = hash_files(source_dir) if os.path.isdir(source_dir) else {}
+            with self._lock:
+                files = dict(self._tenants.get(family_name, {}))
+            removed = [rel for rel in files if rel not in current]
+            changed = [rel for rel, digest in current.items() if files.get(rel, {}).get("sha256") != digest]
+            if not removed and not changed:
+                return False
+
+            # Load, split and embed outside the index lock so other tenants keep searching
+            new_docs, new_facts = [], {}
+            for rel in changed:
+                docs = TextLoader(os.path.join(source_dir, rel)).load()
+                new_facts[rel] = extract_facts("\n".join(doc.page_content for doc in docs))
+                for doc in self.text_splitter.split_documents(docs):
+                    doc.metadata["family"] = family_name
+                    doc.metadata["file"] = rel
+                    new_docs.append(doc)
+            vectors = None
+            if new_docs:
+                vectors = np.asarray(
+                    self.embeddings.embed_documents([doc.page_content for doc in new_docs]), dtype=np.float32
+                )
+
+            with self._lock:
+                stale_ids = [i for rel in removed + changed for i in files.get(rel, {}).get("ids", [])]
+                if stale_ids:
+                    self._index.remove_ids(np.asarray(stale_ids, dtype=np.int64))
+                    for chunk_id in stale_ids:
+                        del self._docs[chunk_id]
+                        self._lexical.remove(chunk_id)
+                for rel in removed + changed:
+                    files.pop(rel, None)
+
+                if new_docs:
+                    ids = np.arange(self._next_id, self._next_id + len(new_docs), dtype=np.int64)
+                    self._next_id += len(new_docs)
+                    if self._index is None:
+                        self._index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+                    self._index.add_with_ids(vectors, ids)
+                    for chunk_id, doc in zip(ids.tolist(), new_docs):
+                        self._docs[chunk_id] = doc
+                        self._lexical.add(chunk_id, family_name, doc.page_content)
+                        entry = files.setdefault(doc.metadata["file"], {"sha256": current[doc.metadata["file"]], "ids": []})
+                        entry["ids"].append(chunk_id)
+
+                facts = {rel: value for rel, value in self._facts.get(family_name, {}).items() if rel in files}
+                facts.update(new_facts)
+                if files:
+                    self._tenants[family_name] = files
+                    self._facts[family_name] = facts
+                else:
+                    self._tenants.pop(family_name, None)
+                    self._facts.pop(family_name, None)
+                self._selectors.pop(family_name, None)
+                self._dirty.add(family_name)
+                if save:
+                    self.save(family_name)
+            return True
+
+    def remove(self, family_name: str, save: bool = True) -> bool:
+        """
+        Deletes all of a tenant's chunks. Other tenants are untouched.
+        """
+        with self._lock:
+            sync_lock = self._sync_locks.setdefault(family_name, threading.Lock())
+        with sync_lock, self._lock:
+            files = self._tenants.pop(family_name, None)
+            self._facts.pop(family_name, None)
+            self._selectors.pop(family_name, None)
+            if not files:
+                return False
+            ids = [i for entry in files.values() for i in entry["ids"]]
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+            for chunk_id in ids:
+                del self._docs[chunk_id]
+                self._lexical.remove(chunk_id)
+            self._dirty.add(family_name)
+            if save:
+                self.save(family_name)
+            return True
+
+    def families(self) -> list:
+        with self._lock:
+            return sorted(self._tenants)
+
+    def has_tenant(self, family_name: str) -> bool:
+        with self._lock:
+            return family_name in self._tenants
+
+    def chunk_count(self, family_name: str) -> int:
+        with self._lock:
+            return sum(len(entry["ids"]) for entry in self._tenants.get(family_name, {}).values())
+
+    def facts(self, family_name: str) -> dict:
+        """
+        The family's extracted facts: field -> {"values": [...], "files": [...],
+        "by_file": {file: [...]}}.
+        """
+        with self._lock:
+            return merge_facts(self._facts.get(family_name, {}))
+
+    def similarity_search_with_score(self, family_name: str, vector, k: int = 4) -> list:
+        """
+        Returns up to `k` (Document, L2 distance) pairs from the family's chunks.
+        """
+        with self._lock:
+            return [(self._docs[i], score) for i, score in self._search(family_name, vector, k)]
+
+    def max_marginal_relevance_search(self, family_name: str, vector, k: int = 4,
+                                      fetch_k: int = 20, lambda_mult: float = 0.5) -> list:
+        """
+        MMR over the family's `fetch_k` nearest chunks, matching FAISS's retriever.
+        """
+        with self._lock:
+            hits = self._search(family_name, vector, fetch_k)
+            if not hits:
+                return []
+            candidates = [self._index.reconstruct(i) for i, _ in hits]
+            picked = maximal_marginal_relevance(
+                np.asarray(vector, dtype=np.float32), candidates, k=min(k, len(candidates)), lambda_mult=lambda_mult
+            )
+            return [self._docs[hits[p][0]] for p in picked]
+
+    def lexical_search(self, family_name: str, query: str, k: int = 4) -> list:
+        """
+        Top `k` chunks by BM25. Needs no embedding.
+        """
+        with self._lock:
+            return [self._docs[i] for i, _ in self._lexical.search(family_name, query, k)]
+
+    def hybrid_search(self, family_name: str, query: str, vector, k: int = 4, fetch_k: int = 20) -> list:
+        """
+        Fuses the `fetch_k` nearest chunks and the `fetch_k` best BM25 chunks by
+        reciprocal rank, then moves chunks naming an entity from the query to
+        the front, keeping the fused order otherwise.
+        """
+        with self._lock:
+            vector_ids = [i for i, _ in self._search(family_name, vector, fetch_k)]
+            lexical_ids = [i for i, _ in self._lexical.search(family_name, query, fetch_k)]
+            fused = reciprocal_rank_fusion(vector_ids, lexical_ids)
+            return [self._docs[i] for i in self._rerank(family_name, query, fused)[:k]]
+
+    def query_entities(self, family_name: str, query: str) -> list:
+        """
+        Names of people or assets from the family's documents mentioned in the query.
+        """
+        with self._lock:
+            return self._lexical.entities_in(family_name, query)
+
+    def as_retriever(self, family_name: str, **kwargs) -> "TenantRetriever":
+        return TenantRetriever(index=self, family_name=family_name, **kwargs)
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size: float32 vectors, id maps and chunk texts.
+        """
+        with self._lock:
+            if self._index is None:
+                return 0
+            texts = sum(len(doc.page_content) for doc in self._docs.values())
+            return int(self._index.ntotal * (self._index.d * 4 + 24) + texts + self._lexical.memory_bytes())
+
+    def tenant_bytes(self, family_name: str) -> int:
+        """
+        A tenant's share of `memory_bytes`.
+        """
+        with self._lock:
+            ids = [i for entry in self._tenants.get(family_name, {}).values() for i in entry["ids"]]
+            if not ids:
+                return 0
+            texts = sum(len(self._docs[i].page_content) for i in ids)
+            return int(len(ids) * (self._index.d * 4 + 24) + texts)
+
+    def save(self, family_name: str = None):
+        """
+        Writes the shards of the tenants changed since they were last saved,
+        or only `family_name`'s, each file atomically, then the shared state.
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            families = [family_name] if family_name is not None else sorted(self._dirty)
+            for family in families:
+                self._save_shard(family)
+                self._dirty.discard(family)
+            _write_json(os.path.join(self.root, STATE_NAME),
+                        {"embedding_model": self._model_name(), "next_id": self._next_id})
+            legacy_path = os.path.join(self.root, LEGACY_INDEX_NAME)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+    def _save_shard(self, family_name: str):
+        """
+        Writes one tenant's vectors, then its chunks, files and facts; a
+        tenant without documents loses its shard. Must be called with the
+        lock held.
+        """
+        path = os.path.join(self.root, quote(family_name, safe=""))
+        files = self._tenants.get(family_name)
+        if not files:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        ids = np.asarray([i for entry in files.values() for i in entry["ids"]], dtype=np.int64)
+        os.makedirs(path, exist_ok=True)
+        vectors_path = os.path.join(path, SHARD_VECTORS_NAME)
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.savez(f, ids=ids, vectors=self._index.reconstruct_batch(ids))
+        os.replace(vectors_path + ".tmp", vectors_path)
+        _write_json(os.path.join(path, SHARD_STATE_NAME), {
+            "files": files,
+            "facts": self._facts.get(family_name, {}),
+            "docs": {str(i): [self._docs[i].page_content, self._docs[i].metadata] for i in ids.tolist()},
+        })
+
+    def _search(self, family_name: str, vector, k: int) -> list:
+        """
+        Nearest (id, distance) pairs restricted to the family's ids. Must be
+        called with the lock held.
+        """
+        selector = self._selector(family_name)
+        if selector is None:
+            return []
+        ids, id_selector = selector
+        params = faiss.SearchParameters()
+        params.sel = id_selector
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        distances, found = self._index.search(query, min(k, len(ids)), params=params)
+        return [(int(i), float(d)) for i, d in zip(found[0], distances[0]) if i != -1]
+
+    def _rerank(self, family_name: str, query: str, ids: list) -> list:
+        """
+        Stable sort putting chunks that mention more of the query's entities
+        first. Must be called with the lock held.
+        """
+        entities = set(self._lexical.entities_in(family_name, query))
+        if not entities:
+            return ids
+        return sorted(ids, key=lambda i: -len(entities & self._lexical.chunk_entities(i)))
+
+    def _selector(self, family_name: str):
+        selector = self._selectors.get(family_name)
+        if selector is None:
+            files = self._tenants.get(family_name)
+            if not files:
+                return None
+            ids = np.asarray([i for entry in files.values() for i in entry["ids"]], dtype=np.int64)
+            # The selector references `ids`, so keep them alive together
+            selector = (ids, faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+            self._selectors[family_name] = selector
+        return selector
+
+    def _load(self):
+        state_path = os.path.join(self.root, STATE_NAME)
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Vectors from a different embedding model are not comparable.
+        if state.get("embedding_model") != self._model_name():
+            return
+        # The single-file layout (everything in this file); tenants re-sync into shards
+        if "docs" in state:
+            return
+        self._next_id = state["next_id"]
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            try:
+                with np.load(os.path.join(path, SHARD_VECTORS_NAME)) as arrays:
+                    ids, vectors = arrays["ids"], arrays["vectors"]
+                with open(os.path.join(path, SHARD_STATE_NAME)) as f:
+                    shard = json.load(f)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Could not load tenant index shard {name} ({e}). Re-syncing it.")
+                continue
+            # A crash between the two writes leaves them out of sync; the tenant then re-syncs
+            if sorted(ids.tolist()) != sorted(int(i) for i in shard["docs"]):
+                print(f"Warning: Tenant index shard {name} is incomplete. Re-syncing it.")
+                continue
+            family_name = unquote(name)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+            self._index.add_with_ids(vectors, ids)
+            self._tenants[family_name] = shard["files"]
+            self._facts[family_name] = shard["facts"]
+            for i, (content, metadata) in shard["docs"].items():
+                self._docs[int(i)] = Document(page_content=content, metadata=metadata)
+                self._lexical.add(int(i), family_name, content)
+            if len(ids):
+                self._next_id = max(self._next_id, int(ids.max()) + 1)
+
+    def _model_name(self) -> str:
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+
+class TenantRetriever(BaseRetriever):
+    """
+    Retriever over one family's slice of a `TenantIndex`; see RETRIEVAL_MODES.
+    """
+
+    index: Any
+    family_name: str
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    mode: str = DEFAULT_RETRIEVAL_MODE
+
+    def _lexical_only(self, query: str) -> List[Document]:
+        """
+        The BM25 results when this query can skip the embedding call, else None.
+        """
+        if self.mode == "lexical" or (self.mode == "auto" and self.index.query_entities(self.family_name, query)):
+            docs = self.index.lexical_search(self.family_name, query, self.k)
+            # In auto mode, fall back to hybrid rather than answer from nothing
+            if docs or self.mode == "lexical":
+                return docs
+        return None
+
+    def _search(self, query: str, vector) -> List[Document]:
+        if self.mode == "vector":
+            return self.index.max_marginal_relevance_search(
+                self.family_name, vector, self.k, self.fetch_k, self.lambda_mult
+            )
+        return self.index.hybrid_search(self.family_name, query, vector, self.k, self.fetch_k)
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        docs = self._lexical_only(query)
+        if docs is not None:
+            return docs
+        return self._search(query, self.index.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        docs = self._lexical_only(query)
+        if docs is not None:
+            return docs
+        return self._search(query, await self.index.embeddings.aembed_query(query))
+
+
+def _write_json(path: str, value: dict):
+    with open(path + ".tmp", "w") as f:
+        json.dump(value, f)
+    os.replace(path + ".tmp", path)
+
+
+_tenant_index = None
+_tenant_index_lock = threading.Lock()
+
+
+def get_tenant_index() -> TenantIndex:
+    """
+    Returns the process-wide legal document index shared by every LawyerAgent.
+    """
+    global _tenant_index
+    with _tenant_index_lock:
+        if _tenant_index is None:
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+            _tenant_index = TenantIndex(CachedEmbeddings(create_embeddings()), text_splitter)
+        return _tenant_index
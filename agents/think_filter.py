@@ -0,0 +1,81 @@
+import re
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+THINK_RE = re.compile(r"<think>.*?</think>", flags=re.DOTALL | re.IGNORECASE)
+
+
+def strip_think(text: str) -> str:
+    """
+    Removes <think>...</think> reasoning blocks from a complete response.
+    """
+    return THINK_RE.sub("", text).strip()
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """
+    Length of the longest suffix of `text` that is a proper prefix of `tag`.
+    """
+    for k in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:k]):
+            return k
+    return 0
+
+
+class ThinkFilter:
+    """
+    Incremental version of `strip_think` for token streams.
+
+    Tags may be split across chunks (e.g. "<thi" + "nk>"), so a possible partial
+    tag at the end of a chunk is held back until the next chunk decides it.
+    Leading whitespace is dropped like `strip_think` does.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._inside = False
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a chunk and returns the text that is safe to display.
+        """
+        self._buffer += chunk
+        out = []
+        while self._buffer:
+            lower = self._buffer.lower()
+            if self._inside:
+                end = lower.find(THINK_CLOSE)
+                if end == -1:
+                    keep = _partial_tag_length(lower, THINK_CLOSE)
+                    self._buffer = self._buffer[len(self._buffer) - keep:] if keep else ""
+                    break
+                self._buffer = self._buffer[end + len(THINK_CLOSE):]
+                self._inside = False
+            else:
+                start = lower.find(THINK_OPEN)
+                if start == -1:
+                    keep = _partial_tag_length(lower, THINK_OPEN)
+                    out.append(self._buffer[:len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep:] if keep else ""
+                    break
+                out.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(THINK_OPEN):]
+                self._inside = True
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        """
+        Returns any held-back text at the end of the stream. An unterminated
+        think block is dropped.
+        """
+        rest = "" if self._inside else self._buffer
+        self._buffer = ""
+        self._inside = False
+        return self._emit(rest)
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
@@ -0,0 +1,490 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+TRACE_DIR = "data/traces"
+TRACE_PATH = os.path.join(TRACE_DIR, "traces.jsonl")
+METRICS_PATH = os.path.join(TRACE_DIR, "metrics.prom")
+PROFILE_DIR = os.path.join(TRACE_DIR, "profiles")
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+TRACE_BACKUPS = 5
+# Requests slower than this are profiled when profiling is enabled.
+SLOW_REQUEST_SECONDS = 10.0
+PROFILE_INTERVAL_SECONDS = 0.01
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace = contextvars.ContextVar("wealthbrain_trace", default=None)
+_current_span = contextvars.ContextVar("wealthbrain_span", default=None)
+# LangChain adds the handler in this variable to every run started while it is set.
+_callback_handler = contextvars.ContextVar("wealthbrain_trace_callbacks", default=None)
+register_configure_hook(_callback_handler, inheritable=True)
+
+
+class _NoopSpan:
+    """
+    Stand-in for spans and traces when tracing is disabled or no trace is active.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def fail(self, message: str):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    One timed stage of a trace. Use as a context manager; spans opened inside
+    it (including LangChain runs) become its children.
+    """
+
+    __slots__ = ("trace", "name", "parent", "attrs", "start", "duration", "error", "_token")
+
+    def __init__(self, trace, name: str, parent=None, **attrs):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def begin(self):
+        self.start = time.perf_counter()
+        return self
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        self.trace.spans.append(self)
+
+    def __enter__(self):
+        self.begin()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _reset(_current_span, self._token)
+        self.finish(exc)
+        return False
+
+    def to_dict(self) -> dict:
+        record = {
+            "name": self.name,
+            "parent": self.parent.name if self.parent is not None else None,
+            "offset_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class Trace:
+    """
+    All spans, token counts and attributes of one request.
+    """
+
+    def __init__(self, tracer, name: str, **attrs):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.attrs = attrs
+        self.spans = []
+        self.tokens = Counter()
+        self.started_at = None
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._tokens = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, message: str):
+        self.error = message
+
+    def add_tokens(self, model: str, prompt: int, completion: int, estimated: bool):
+        self.tokens["prompt"] += prompt
+        self.tokens["completion"] += completion
+        if estimated:
+            self.tokens["estimated"] += prompt + completion
+        self.tracer.metrics.add_tokens(model, prompt, completion)
+
+    def __enter__(self):
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self._tokens = (
+            _current_trace.set(self),
+            _current_span.set(None),
+            _callback_handler.set(TracingCallbackHandler(self)),
+        )
+        self.tracer.profiler_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        trace_token, span_token, handler_token = self._tokens
+        _reset(_callback_handler, handler_token)
+        _reset(_current_span, span_token)
+        _reset(_current_trace, trace_token)
+        if exc is not None and self.error is None:
+            self.error = f"{type(exc).__name__}: {exc}"
+        self.tracer.record(self)
+        return False
+
+    def to_dict(self) -> dict:
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": "error" if self.error else "ok",
+            "attrs": self.attrs,
+            "tokens": dict(self.tokens),
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda span: span.start)],
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records LangChain LLM, retriever and tool runs as spans of a trace, with
+    token counts. Providers that don't report usage (e.g. when streaming) get
+    an estimate of 4 characters per token, flagged as estimated.
+    """
+
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._runs = {}
+
+    def _start(self, run_id, name: str, **attrs):
+        self._runs[run_id] = Span(self.trace, name, _current_span.get(), **attrs).begin()
+
+    def _finish(self, run_id, error=None):
+        span = self._runs.pop(run_id, None)
+        if span is not None:
+            span.finish(error)
+        return span
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt_chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        self._start(run_id, "llm", model=_model_name(serialized, kwargs), prompt_chars=prompt_chars)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm", model=_model_name(serialized, kwargs), prompt_chars=sum(map(len, prompts)))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._finish(run_id)
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("completion_tokens") is not None:
+            prompt, completion, estimated = usage.get("prompt_tokens", 0), usage["completion_tokens"], False
+        else:
+            text_chars = sum(len(g.text) for batch in response.generations for g in batch)
+            prompt, completion, estimated = span.attrs.get("prompt_chars", 0) // 4, text_chars // 4, True
+        span.set(prompt_tokens=prompt, completion_tokens=completion, estimated_tokens=estimated)
+        self.trace.add_tokens(span.attrs["model"], prompt, completion, estimated)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retriever")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        span = self._finish(run_id)
+        if span is not None:
+            span.set(documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, f"tool:{(serialized or {}).get('name', 'tool')}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+
+def _model_name(serialized, kwargs) -> str:
+    params = kwargs.get("invocation_params") or {}
+    name = params.get("model") or params.get("model_name")
+    if not name and serialized:
+        name = (serialized.get("kwargs") or {}).get("model") or (serialized.get("id") or ["unknown"])[-1]
+    return name or "unknown"
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def set_gauge(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            self.gauges[(name, labels)] = value
+
+    def observe(self, name: str, labels: tuple, seconds: float):
+        with self._lock:
+            buckets, total = self.histograms.get((name, labels), ([0] * len(DURATION_BUCKETS), [0.0, 0]))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            total[0] += seconds
+            total[1] += 1
+            self.histograms[(name, labels)] = (buckets, total)
+
+    def add_tokens(self, model: str, prompt: int, completion: int):
+        self.inc("wealthbrain_llm_tokens_total", (("model", model), ("kind", "prompt")), prompt)
+        self.inc("wealthbrain_llm_tokens_total", (("model", model), ("kind", "completion")), completion)
+
+    def record(self, trace: Trace):
+        agent = str(trace.attrs.get("agent", "unknown"))
+        status = "error" if trace.error else "ok"
+        self.inc("wealthbrain_requests_total", (("agent", agent), ("status", status)))
+        self.observe("wealthbrain_request_duration_seconds", (("agent", agent),), trace.duration)
+        for span in trace.spans:
+            self.observe("wealthbrain_stage_duration_seconds", (("stage", span.name),), span.duration)
+            if span.error:
+                self.inc("wealthbrain_stage_errors_total", (("stage", span.name),))
+        for key, value in trace.attrs.items():
+            if key.endswith("cache") and value in ("hit", "miss"):
+                self.inc("wealthbrain_cache_lookups_total", (("cache", key), ("result", value)))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                _declare(lines, name, "counter")
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                _declare(lines, name, "gauge")
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+            for (name, labels), (buckets, (total, count)) in sorted(self.histograms.items()):
+                _declare(lines, name, "histogram")
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _declare(lines: list, name: str, kind: str):
+    declaration = f"# TYPE {name} {kind}"
+    if declaration not in lines:
+        lines.append(declaration)
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of each traced request's thread every `interval` seconds
+    and keeps the collapsed stacks (flame graph "folded" format). Requests that
+    share the event loop thread share its samples.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._thread = None
+
+    def start(self, trace_id: str):
+        with self._lock:
+            self._active[trace_id] = (threading.get_ident(), Counter())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, trace_id: str) -> Counter:
+        with self._lock:
+            entry = self._active.pop(trace_id, None)
+        return entry[1] if entry else Counter()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in active:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    samples[";".join(reversed(stack))] += 1
+
+
+class Tracer:
+    """
+    Collects request traces and writes each as one line of a rotating JSONL
+    file, plus aggregate metrics in the Prometheus text format.
+
+    Disabled unless `enabled` (or WEALTHBRAIN_TRACING=1); then `trace` and
+    `span` return a shared no-op object, so instrumented code pays only a
+    context variable lookup. With `profile_slow` (or WEALTHBRAIN_PROFILE_SLOW=1)
+    every request is stack-sampled and the samples of those slower than
+    `slow_seconds` are written next to the traces.
+    """
+
+    def __init__(self, enabled: bool = None, path: str = TRACE_PATH, metrics_path: str = METRICS_PATH,
+                 max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS,
+                 profile_slow: bool = None, slow_seconds: float = SLOW_REQUEST_SECONDS):
+        self.enabled = _env_flag("WEALTHBRAIN_TRACING") if enabled is None else enabled
+        self.path = path
+        self.metrics_path = metrics_path
+        self.metrics = Metrics()
+        self.slow_seconds = slow_seconds
+        profile_slow = _env_flag("WEALTHBRAIN_PROFILE_SLOW") if profile_slow is None else profile_slow
+        self.profiler = SamplingProfiler() if profile_slow else None
+        self._logger = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"wealthbrain.traces.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+
+    def trace(self, name: str, **attrs):
+        """
+        Starts a request trace (context manager) that becomes the current trace.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Trace(self, name, **attrs)
+
+    def profiler_start(self, trace: Trace):
+        if self.profiler is not None:
+            self.profiler.start(trace.trace_id)
+
+    def record(self, trace: Trace):
+        record = trace.to_dict()
+        if self.profiler is not None:
+            samples = self.profiler.stop(trace.trace_id)
+            if trace.duration >= self.slow_seconds and samples:
+                record["profile"] = self._write_profile(trace.trace_id, samples)
+        self.metrics.record(trace)
+        try:
+            self._logger.info(json.dumps(record, default=str))
+            self.write_prometheus()
+        except Exception as e:
+            print(f"Warning: Could not write trace ({e})")
+
+    def prometheus_text(self) -> str:
+        return self.metrics.render()
+
+    def write_prometheus(self):
+        if not self.metrics_path:
+            return
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self.metrics_path)
+
+    def _write_profile(self, trace_id: str, samples: Counter) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{trace_id}.folded")
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def _reset(var, token):
+    try:
+        var.reset(token)
+    except ValueError:
+        # Exited from another context (e.g. a generator closed elsewhere)
+        pass
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def span(name: str, **attrs):
+    """
+    Opens a span in the current trace, or a no-op if no trace is active.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return Span(trace, name, _current_span.get(), **attrs)
+
+
+def current_trace():
+    """
+    Returns the active trace, or a no-op stand-in accepting `set`.
+    """
+    return _current_trace.get() or NOOP_SPAN
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Returns the process-wide tracer, configured from the environment.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
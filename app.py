@@ -1,10 +1,16 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from agents.router import RouterAgent
-import pandas as pd
+# Only light imports here: the agents (langchain, pandas, FAISS, the model
+# clients) load when a family is opened, or earlier in the background prewarm
+from agents.prewarm import PREWARM_ENABLED, get_prewarmer, start_prewarm
 
 
+# Messages rendered per rerun; older ones appear on request
+CHAT_WINDOW_MESSAGES = 20
+# Messages kept for display; the conversation summary remembers older turns
+MAX_STORED_MESSAGES = 200
+
 # Load environment variables
 load_dotenv()
 
@@ -144,15 +150,87 @@ if "selected_family" not in st.session_state:
     st.session_state.selected_family = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "conversation" not in st.session_state:
+    st.session_state.conversation = None
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW_MESSAGES
 
-# Initialize Router Agent (Cached per family)
-@st.cache_resource
+# Router Agents come from a shared pool bounded by memory budget and idle time
 def get_router_agent(family_name):
-    return RouterAgent(family_name=family_name)
+    from agents.agent_pool import get_agent_pool
+    return get_agent_pool().get(family_name)
 
 def reset_session():
     st.session_state.selected_family = None
     st.session_state.messages = []
+    st.session_state.conversation = None
+    st.session_state.chat_window = CHAT_WINDOW_MESSAGES
+
+def show_earlier_messages():
+    st.session_state.chat_window += CHAT_WINDOW_MESSAGES
+
+def add_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+    del st.session_state.messages[:-MAX_STORED_MESSAGES]
+
+# The chat reruns as a fragment: a new message re-renders only the chat
+# (the latest messages), not the sidebar or the whole page
+@st.fragment
+def chat(family, router):
+    st.title(f"AI Concierge for House {family}")
+    st.markdown(f"Ask me about the {family} portfolio, legal documents, or market trends.")
+
+    # Display Chat History (the most recent window)
+    messages = st.session_state.messages
+    hidden = max(0, len(messages) - st.session_state.chat_window)
+    if hidden:
+        st.button(f"Show earlier messages ({hidden} hidden)", on_click=show_earlier_messages)
+    for message in messages[hidden:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # User Input
+    if prompt := st.chat_input("How can I help you today?"):
+        # Add user message to history
+        add_message("user", prompt)
+        with st.chat_message("user"):
+            st.markdown(prompt)
+            
+        # Generate Response
+        with st.chat_message("assistant"):
+            message_placeholder = st.empty()
+            message_placeholder.markdown("Thinking...")
+            
+            try:
+                # Route and Execute, rendering tokens as they stream in; the
+                # conversation resolves follow-ups and records the turn
+                header = ""
+                response_text = ""
+                for event in router.stream_route_and_execute(prompt, st.session_state.conversation):
+                    if "agent" in event:
+                        # Note when the fast path or a cached answer served the query
+                        path_note = " · fast path" if event.get("path") == "fast_path" else ""
+                        cached = "hit" in (event.get("cache"), event.get("semantic_cache"))
+                        path_note += " · cached" if cached else ""
+                        header = f"**[{event['agent']} Agent{path_note}]**\n\n"
+                        if "standalone_query" in event:
+                            header += f"_Follow-up read as: {event['standalone_query']}_\n\n"
+                        response_text = ""
+                    if "token" in event:
+                        response_text += event["token"]
+                    message_placeholder.markdown(f"{header}{response_text}▌")
+                
+                # Format the final output
+                final_output = f"{header}{response_text or 'No response generated.'}"
+                message_placeholder.markdown(final_output)
+                
+                # Add assistant message to history
+                add_message("assistant", final_output)
+                
+            except Exception as e:
+                error_msg = f"An error occurred: {str(e)}"
+                message_placeholder.error(error_msg)
+                add_message("assistant", error_msg)
 
 # --- Home Page: Family Selection ---
 if st.session_state.selected_family is None:
@@ -215,9 +293,20 @@ if st.session_state.selected_family is None:
                 st.session_state.selected_family = family['name']
                 st.rerun()
 
+    # Started after the cards are on screen, so the page never waits for it
+    if PREWARM_ENABLED:
+        start_prewarm([family["name"] for family in families])
+
 # --- Chat Interface ---
 else:
+    from agents.agent_pool import get_agent_pool
+    from agents.conversation import Conversation
+    from agents.portfolio_rollups import get_rollups
+    from agents.portfolio_store import get_portfolio_store
+
     family = st.session_state.selected_family
+    if st.session_state.conversation is None:
+        st.session_state.conversation = Conversation()
     
     # Sidebar
     with st.sidebar:
@@ -232,15 +321,13 @@ else:
         
         # Portfolio Status
         try:
-            df = pd.read_csv("data/portfolio.csv")
-            family_df = df[df['Family'] == family]
-            total_aum = family_df['Value_USD'].sum()
+            rollup = get_rollups().get(family)
             
-            st.metric("Total AUM", f"${total_aum:,.0f}")
-            st.success(f"Connected to Portfolio ({len(family_df)} Assets)")
+            st.metric("Total AUM", f"${rollup.total:,.0f}")
+            st.success(f"Connected to Portfolio ({rollup.count} Assets)")
             
             with st.expander("View Portfolio Data"):
-                st.dataframe(family_df)
+                st.dataframe(get_portfolio_store().family(family))
         except Exception as e:
             st.error(f"Portfolio Data Error: {str(e)}")
             
@@ -257,51 +344,24 @@ else:
             
         st.markdown("---")
         st.markdown("**System Status:** 🟢 Online")
+        pool_stats = get_agent_pool().stats()
+        st.caption(
+            f"Agent pool: {pool_stats['entries']} families, "
+            f"{pool_stats['resident_bytes'] / 1024 ** 2:,.0f} / {pool_stats['max_bytes'] / 1024 ** 2:,.0f} MB, "
+            f"{pool_stats['hits']} hits, {pool_stats['evictions']} evictions"
+        )
+        prewarmer = get_prewarmer()
+        if prewarmer is not None:
+            prewarm = prewarmer.report()
+            st.caption(
+                f"Prewarm: {prewarm['state']} ({prewarm['seconds']:.1f}s, "
+                f"{prewarm['families']} families, {len(prewarm['errors'])} errors)"
+            )
 
     # Main Chat Area
-    st.title(f"AI Concierge for House {family}")
-    st.markdown(f"Ask me about the {family} portfolio, legal documents, or market trends.")
-
-    # Display Chat History
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
-    # User Input
-    if prompt := st.chat_input("How can I help you today?"):
-        # Add user message to history
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-            
-        # Generate Response
-        with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            message_placeholder.markdown("Thinking...")
-            
-            try:
-                # Initialize Router with selected family
-                router = get_router_agent(family)
-                
-                # Route and Execute
-                result = router.route_and_execute(prompt)
-                
-                agent_name = result.get("agent", "Unknown")
-                response_text = result.get("response", "No response generated.")
-                
-                # Format the final output
-                final_output = f"**[{agent_name} Agent]**\n\n{response_text}"
-                
-                # FINAL SAFETY CLEAN: Remove <think> tags if they slipped through
-                import re
-                final_output = re.sub(r'<think>.*?</think>', '', final_output, flags=re.DOTALL | re.IGNORECASE).strip()
-                
-                message_placeholder.markdown(final_output)
-                
-                # Add assistant message to history
-                st.session_state.messages.append({"role": "assistant", "content": final_output})
-                
-            except Exception as e:
-                error_msg = f"An error occurred: {str(e)}"
-                message_placeholder.error(error_msg)
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+    try:
+        router = get_router_agent(family)
+    except Exception as e:
+        st.error(f"Agent Error: {str(e)}")
+    else:
+        chat(family, router)
@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from generate_docs import synthetic_families, write_family_docs
+
+# Keys only need to exist; every model call goes to the fake backends.
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ.setdefault("PERPLEXITY_API_KEY", "pplx-offline-benchmark")
+
+ASSET_CLASSES = ["Cash", "Equities", "Real Estate", "Private Equity", "Commodities", "Art", "Fixed Income", "Collectibles"]
+LOCATIONS = ["Singapore", "USA", "UK", "Switzerland", "Westeros", "Essos", "North", "Stormlands", "Braavos"]
+CUSTODIANS = ["DBS", "Goldman Sachs", "Savills", "Morgan Stanley", "UBS", "Freeport", "Iron Bank"]
+LIQUIDITY = ["High", "Medium", "Low", "Illiquid"]
+
+FAST_PATH_QUERIES = [
+    "What is my total AUM?",
+    "How much cash do I have?",
+    "List my equities",
+    "What are my top 5 assets?",
+    "Break down my portfolio by asset class",
+]
+AGENT_QUERIES = ["Which of my holdings look most exposed to a rate cut?"]
+LAWYER_QUERIES = ["Who are the beneficiaries of the will?", "Who is the trustee?", "What does the insurance exclude?"]
+LAWYER_RAG_QUERIES = ["What happens to the trust assets if the trustee steps down?"]
+RESEARCH_QUERIES = ["What is the outlook for gold?", "How will tariffs affect US tech?"]
+HYBRID_QUERIES = ["What is my real estate exposure and what is the latest news on property markets?"]
+# A long session: each question is followed by a follow-up the router rewrites
+CONVERSATION_TURNS = 60
+FOLLOW_UP_QUERIES = ["And how much of that is in cash?", "What about those in Switzerland?"]
+
+
+def write_portfolio(path: str, families: list, rows: int, seed: int = 0, chunk_rows: int = 1_000_000):
+    """
+    Writes a synthetic portfolio.csv with the real schema, spreading `rows`
+    holdings over `families` (each family gets at least one). Rows are
+    generated and appended `chunk_rows` at a time to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    family_names = np.array([family.title() for family in families])
+    for start in range(0, rows, chunk_rows):
+        count = min(chunk_rows, rows - start)
+        owner = rng.integers(0, len(families), count)
+        if start == 0:
+            owner[:min(count, len(families))] = np.arange(min(count, len(families)))
+        names = pd.Series(family_names[owner])
+        asset_class = pd.Series(np.array(ASSET_CLASSES)[rng.integers(0, len(ASSET_CLASSES), count)])
+        ids = pd.Series(np.arange(start, start + count)).astype(str).str.zfill(8)
+        frame = pd.DataFrame({
+            "Asset_ID": "S" + ids,
+            "Asset_Name": asset_class + " Holding " + ids,
+            "Asset_Class": asset_class,
+            "Location": np.array(LOCATIONS)[rng.integers(0, len(LOCATIONS), count)],
+            "Value_USD": np.round(rng.lognormal(13, 1.5, count), 2),
+            "Custodian": np.array(CUSTODIANS)[rng.integers(0, len(CUSTODIANS), count)],
+            "Liquidity": np.array(LIQUIDITY)[rng.integers(0, len(LIQUIDITY), count)],
+            "Entity_Owner": names + " Family Trust",
+            "Family": names,
+        })
+        frame.to_csv(path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+
+
+def maxrss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def latency_summary(latencies: list) -> dict:
+    if not latencies:
+        return {"count": 0}
+    ms = sorted(t * 1000 for t in latencies)
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.mean(ms),
+        "p50_ms": statistics.median(ms),
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "max_ms": ms[-1],
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, time.perf_counter() - start
+
+
+class Benchmark:
+    """
+    Runs each phase quietly (agents print DEBUG lines and verbose chains) and
+    records its results plus the process memory high-water mark after it.
+    """
+
+    def __init__(self):
+        self.results = {}
+
+    def phase(self, name: str, fn):
+        print(f"- {name}...", flush=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            result["seconds"] = time.perf_counter() - start
+        result["maxrss_bytes"] = maxrss_bytes()
+        self.results[name] = result
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the agents with deterministic fake models.")
+    parser.add_argument("--families", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=10_000, help="Total synthetic portfolio rows")
+    parser.add_argument("--samples", type=int, default=10, help="Families sampled for per-agent timings")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Simulated seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Simulated seconds per generated token")
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Simulated seconds per embedding call")
+    parser.add_argument("--embedding-per-text", type=float, default=0.0001)
+    parser.add_argument("--embedding-size", type=int, default=1536)
+    parser.add_argument("--workspace", default=None, help="Keep generated data here instead of a temp dir")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    output_path = os.path.abspath(args.output)
+    workspace = args.workspace or tempfile.mkdtemp(prefix="wealthbrain-bench-")
+    os.makedirs(os.path.join(workspace, "data"), exist_ok=True)
+    shutil.copy(os.path.join(repo_dir, "data", "router_queries.csv"), os.path.join(workspace, "data"))
+    bench = Benchmark()
+    rng = random.Random(0)
+
+    def generate_data():
+        families = synthetic_families(args.families)
+        for family, data in families.items():
+            write_family_docs(os.path.join(workspace, "data", "legal_docs", family), family, data)
+        write_portfolio(os.path.join(workspace, "data", "portfolio.csv"), list(families), args.rows)
+        return {"families": len(families), "rows": args.rows}
+
+    bench.phase("generate_data", generate_data)
+    # Agents resolve their data paths ("data/...") relative to the working directory
+    os.chdir(workspace)
+    sys.path.insert(0, repo_dir)
+
+    from agents.fake_backends import FakeEmbeddings, FakeRateLimiter, install_fake_backends
+    from agents.llm_scheduler import BATCH, LLMScheduler, lane, set_scheduler
+    # Agent timings shouldn't include client-side throttling; see the rate_limits phase
+    unlimited = {"rpm": 1e9, "tpm": 1e12}
+    set_scheduler(LLMScheduler(limits={"openai": unlimited, "perplexity": unlimited, "embeddings": unlimited}))
+    backends = install_fake_backends(
+        chat_latency=args.chat_latency,
+        token_latency=args.token_latency,
+        response_tokens=args.response_tokens,
+        embedding_latency=args.embedding_latency,
+        embedding_per_text=args.embedding_per_text,
+        embedding_size=args.embedding_size,
+        rules=[("Wealth Concierge Router", "Hybrid"), ("Rewrite the client's latest question", "What is my total AUM?")],
+    )
+    from agents.analyst import AnalystAgent
+    from agents.batch import BatchRunner
+    from agents.conversation import Conversation
+    from agents.lawyer import LawyerAgent
+    from agents.portfolio_context import count_tokens
+    from agents.portfolio_store import get_portfolio_store
+    from agents.researcher import ResearcherAgent
+    from agents.response_cache import ResponseCache
+    from agents.route_classifier import load_labelled_queries
+    from agents.router import RouterAgent
+    from agents.semantic_cache import SemanticCache
+    from agents.tenant_index import get_tenant_index
+
+    families = sorted(synthetic_families(args.families))
+    sampled = rng.sample(families, min(args.samples, len(families)))
+
+    def portfolio_load():
+        store = get_portfolio_store()
+        _, parse_seconds = timed(store.family, sampled[0].title())
+        lookups = [timed(store.family, family.title())[1] for family in sampled]
+        return {"first_load_seconds": parse_seconds, "family_lookup": latency_summary(lookups)}
+
+    def index_build():
+        index = get_tenant_index()
+        for family in families:
+            index.sync(family, os.path.join("data", "legal_docs", family), save=False)
+        _, save_seconds = timed(index.save)
+        return {
+            "tenants": len(index.families()),
+            "estimated_bytes": index.memory_bytes(),
+            "save_seconds": save_seconds,
+        }
+
+    def index_query():
+        index = get_tenant_index()
+        latencies = []
+        for family in sampled:
+            for query in LAWYER_QUERIES:
+                start = time.perf_counter()
+                index.max_marginal_relevance_search(family, index.embeddings.embed_query(f"{family} {query}"))
+                latencies.append(time.perf_counter() - start)
+        return {"mmr_search_with_embedding": latency_summary(latencies)}
+
+    def routing():
+        router = RouterAgent(family_name=sampled[0].title())
+        # Threshold above 1 sends every query to the LLM router
+        llm_router = RouterAgent(family_name=sampled[0].title(), route_confidence_threshold=1.01)
+        local, llm = [], []
+        queries = [query for query, _ in load_labelled_queries()]
+        for query in queries:
+            routed, seconds = timed(router.route, query)
+            (local if routed["router"] == "local" else llm).append(seconds)
+        forced_llm = [timed(llm_router.route, query)[1] for query in queries[:20]]
+        return {
+            "local": latency_summary(local),
+            "llm": latency_summary(llm),
+            "llm_only": latency_summary(forced_llm),
+        }
+
+    def analyst():
+        construction, fast, agent = [], [], []
+        for family in sampled:
+            analyst_agent, seconds = timed(AnalystAgent, family.title())
+            construction.append(seconds)
+            for query in FAST_PATH_QUERIES:
+                result, seconds = timed(analyst_agent.answer, query)
+                (fast if result["path"] == "fast_path" else agent).append(seconds)
+            for query in AGENT_QUERIES:
+                agent.append(timed(analyst_agent.answer, query)[1])
+        return {
+            "construction": latency_summary(construction),
+            "fast_path": latency_summary(fast),
+            "llm_agent": latency_summary(agent),
+        }
+
+    def lawyer():
+        construction, fast, rag = [], [], []
+        for family in sampled:
+            lawyer_agent, seconds = timed(LawyerAgent, family.title())
+            construction.append(seconds)
+            for query in LAWYER_QUERIES + LAWYER_RAG_QUERIES:
+                result, seconds = timed(lawyer_agent.answer, query)
+                (fast if result["path"] == "fast_path" else rag).append(seconds)
+        return {
+            "construction": latency_summary(construction),
+            "fast_path": latency_summary(fast),
+            "rag": latency_summary(rag),
+        }
+
+    def researcher():
+        construction, misses, hits = [], [], []
+        for family in sampled:
+            researcher_agent, seconds = timed(ResearcherAgent, family.title(), ResponseCache())
+            construction.append(seconds)
+            for query in RESEARCH_QUERIES:
+                misses.append(timed(researcher_agent.answer, query)[1])
+                hits.append(timed(researcher_agent.answer, query)[1])
+        return {
+            "construction": latency_summary(construction),
+            "cache_miss": latency_summary(misses),
+            "cache_hit": latency_summary(hits),
+        }
+
+    def hybrid():
+        latencies, errors = [], 0
+        # Always ask the (fake) LLM router, which answers Hybrid; no semantic cache hits
+        semantic_cache = SemanticCache(FakeEmbeddings(args.embedding_size), threshold=1.01)
+        for family in sampled:
+            router = RouterAgent(family_name=family.title(), route_confidence_threshold=1.01,
+                                 semantic_cache=semantic_cache)
+            for i, query in enumerate(HYBRID_QUERIES):
+                result, seconds = timed(router.route_and_execute, f"{query} ({i})")
+                latencies.append(seconds)
+                errors += result["agent"] != "Hybrid"
+        return {"route_and_execute": latency_summary(latencies), "errors": errors}
+
+    def batch():
+        throughput, routers = {}, {}
+        # No semantic cache hits, like the hybrid phase
+        semantic_cache = SemanticCache(FakeEmbeddings(args.embedding_size), threshold=1.01)
+
+        def router_for(family):
+            if family not in routers:
+                routers[family] = RouterAgent(family_name=family.title(), semantic_cache=semantic_cache)
+            return routers[family]
+
+        for concurrency in (1, 4, 16):
+            runner = BatchRunner(concurrency=concurrency, router_factory=router_for)
+            # A distinct suffix per run keeps the research cache from answering
+            pairs = [(family, f"{query} (batch {concurrency})") for family in sampled
+                     for query in LAWYER_QUERIES + RESEARCH_QUERIES]
+            summary = runner.run(pairs, os.path.join(workspace, f"batch_{concurrency}.jsonl"), resume=False)
+            throughput[str(concurrency)] = {
+                key: summary[key] for key in ("completed", "errors", "research_fetches", "queries_per_minute")
+            }
+        return {"by_concurrency": throughput}
+
+    def conversation():
+        # Follow-up latency and history size should stay flat as the session grows
+        router = RouterAgent(family_name=sampled[0].title(),
+                             semantic_cache=SemanticCache(FakeEmbeddings(args.embedding_size), threshold=1.01))
+        session = Conversation()
+        follow_ups, history_tokens = [], []
+        for turn in range(CONVERSATION_TURNS):
+            if turn % 2:
+                history_tokens.append(count_tokens(session.context()))
+                follow_ups.append(timed(router.route_and_execute, FOLLOW_UP_QUERIES[turn // 2 % 2], session)[1])
+            else:
+                router.route_and_execute(FAST_PATH_QUERIES[turn // 2 % len(FAST_PATH_QUERIES)], session)
+        tenth = max(1, len(follow_ups) // 10)
+        return {
+            "turns": session.turn_count,
+            "follow_up_first": latency_summary(follow_ups[:tenth]),
+            "follow_up_last": latency_summary(follow_ups[-tenth:]),
+            "history_tokens_max": max(history_tokens),
+            "history_tokens_budget": session.token_budget,
+            "summary_tokens": count_tokens(session.summary),
+        }
+
+    def rate_limits():
+        # The fake provider accepts 10 requests/second; the scheduler is set to 20 so it sees 429s
+        limiter = FakeRateLimiter(10, window_seconds=1.0)
+        set_scheduler(LLMScheduler(limits={"openai": {"rpm": 1200, "tpm": 1e9}}, backoff_base=0.1, backoff_max=1.0))
+        install_fake_backends(chat_latency=args.chat_latency, rate_limiters={"openai": limiter})
+        from agents.llm_backends import create_chat_model
+        chat = create_chat_model("gpt-4o")
+
+        async def call(i, lane_name):
+            start = time.perf_counter()
+            with lane(lane_name):
+                await chat.ainvoke(f"rate limit probe {i}")
+            return lane_name, time.perf_counter() - start
+
+        async def burst():
+            batch_calls = [asyncio.create_task(call(i, BATCH)) for i in range(60)]
+            await asyncio.sleep(0.5)
+            interactive_calls = [asyncio.create_task(call(100 + i, "interactive")) for i in range(5)]
+            return await asyncio.gather(*batch_calls, *interactive_calls)
+
+        results = asyncio.run(burst())
+        return {
+            "accepted": limiter.accepted,
+            "rate_limited": limiter.rejected,
+            "batch": latency_summary([seconds for lane_name, seconds in results if lane_name == BATCH]),
+            "interactive": latency_summary([seconds for lane_name, seconds in results if lane_name != BATCH]),
+        }
+
+    bench.phase("portfolio_load", portfolio_load)
+    bench.phase("index_build", index_build)
+    bench.phase("index_query", index_query)
+    bench.phase("routing", routing)
+    bench.phase("analyst", analyst)
+    bench.phase("lawyer", lawyer)
+    bench.phase("researcher", researcher)
+    bench.phase("hybrid", hybrid)
+    bench.phase("batch", batch)
+    bench.phase("conversation", conversation)
+    bench.phase("rate_limits", rate_limits)
+
+    report = {
+        "args": vars(args),
+        "python": platform.python_version(),
+        "chat_calls": sum(chat.calls for chat in backends["chat"]),
+        "embedding_texts": sum(embeddings.texts for embeddings in backends["embeddings"]),
+        "phases": bench.results,
+    }
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    if not args.workspace:
+        os.chdir(repo_dir)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    for name, result in bench.results.items():
+        print(f"{name:>15}: {result['seconds']:8.2f}s  max RSS {result['maxrss_bytes'] / 1024 ** 2:8.1f} MB")
+    print(f"Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
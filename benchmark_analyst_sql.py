@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+from agents.fake_backends import FakeChatModel
+from agents.holdings_db import HoldingsDatabase
+from agents.portfolio_store import PortfolioStore, ingest_csv
+from agents.sql_analyst import PlanCache, SQLAnalyst
+from benchmark import latency_summary, write_portfolio
+from benchmark_portfolio_storage import dir_bytes
+from generate_docs import synthetic_families
+
+# (name, Python the pandas agent would run, SQL the SQL backend would run, params)
+QUERIES = [
+    ("total", "df['Value_USD'].sum()", "SELECT SUM(Value_USD) AS total_value_usd FROM holdings", {}),
+    (
+        "filtered_sum",
+        "df[df['Asset_Class'] == 'Equities']['Value_USD'].sum()",
+        "SELECT SUM(Value_USD) AS total_value_usd FROM holdings WHERE Asset_Class = :asset_class",
+        {"asset_class": "Equities"},
+    ),
+    (
+        "group_by",
+        "df.groupby('Location', observed=True)['Value_USD'].sum().sort_values(ascending=False)",
+        "SELECT Location, SUM(Value_USD) AS total_value_usd FROM holdings GROUP BY Location ORDER BY 2 DESC",
+        {},
+    ),
+    (
+        "top_n",
+        "df.nlargest(5, 'Value_USD')[['Asset_Name', 'Value_USD']]",
+        "SELECT Asset_Name, Value_USD FROM holdings ORDER BY Value_USD DESC LIMIT :n",
+        {"n": 5},
+    ),
+    (
+        "two_filters",
+        "len(df[(df['Liquidity'] == 'Low') & (df['Custodian'] == 'UBS')])",
+        "SELECT COUNT(*) AS holdings FROM holdings WHERE Liquidity = :liquidity AND Custodian = :custodian",
+        {"liquidity": "Low", "custodian": "UBS"},
+    ),
+]
+# A question whose generated SQL is cached by shape, and one more of that shape
+SHAPE_QUESTIONS = ["How much do I hold in Switzerland?", "How much do I hold in USA?"]
+SHAPE_PLAN = '{"sql": "SELECT SUM(Value_USD) AS total_value_usd FROM holdings WHERE Location = :location", "params": {"location": "Switzerland"}}'
+
+
+def run_size(rows: int, family_count: int, samples: int, llm_latency: float, tmp: str) -> dict:
+    csv_path = os.path.join(tmp, "portfolio.csv")
+    dataset_dir = os.path.join(tmp, "portfolio")
+    db_path = os.path.join(tmp, "holdings.sqlite")
+    names = [family.title() for family in synthetic_families(family_count)]
+    write_portfolio(csv_path, names, rows)
+    ingest_csv(csv_path, dataset_dir)
+    os.remove(csv_path)
+    store = PortfolioStore(path=csv_path, dataset_dir=dataset_dir, cache_size=0)
+
+    start = time.perf_counter()
+    db = HoldingsDatabase(db_path, store)
+    db.sync()
+    load_seconds = time.perf_counter() - start
+    sampled = random.Random(0).sample(names, min(samples, len(names)))
+
+    pandas_load, pandas_times, sql_times = [], {}, {}
+    for family in sampled:
+        # What the pandas agent pays per question: the family frame plus its generated code
+        start = time.perf_counter()
+        df = store.family(family)
+        pandas_load.append(time.perf_counter() - start)
+        tool = PythonAstREPLTool(locals={"df": df})
+        for name, code, sql, params in QUERIES:
+            start = time.perf_counter()
+            tool.run(code)
+            pandas_times.setdefault(name, []).append(time.perf_counter() - start)
+            sql_times.setdefault(name, []).append(db.execute(family, sql, params)["execution_ms"] / 1000)
+
+    llm = FakeChatModel(latency_seconds=llm_latency, rules=[(f"Question: {SHAPE_QUESTIONS[0]}", SHAPE_PLAN)])
+    analyst = SQLAnalyst(sampled[0], llm, db=db, plan_cache=PlanCache())
+    end_to_end = {}
+    for question in SHAPE_QUESTIONS:
+        start = time.perf_counter()
+        result = analyst.answer(question)
+        end_to_end[result["plan_cache"]] = (time.perf_counter() - start) * 1000
+
+    return {
+        "rows": rows,
+        "rows_per_family": rows // family_count,
+        "sqlite_load_seconds": load_seconds,
+        "sqlite_bytes": os.path.getsize(db_path),
+        "parquet_bytes": dir_bytes(dataset_dir),
+        "pandas_family_load": latency_summary(pandas_load),
+        "pandas": {name: latency_summary(times) for name, times in pandas_times.items()},
+        "sql": {name: latency_summary(times) for name, times in sql_times.items()},
+        "plans": {name: db.explain(sampled[0], sql, params) for name, _, sql, params in QUERIES},
+        "sql_end_to_end_ms": end_to_end,
+        "llm_calls": llm.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL backend vs pandas agent execution latency for the Analyst.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=5, help="Families queried per size")
+    parser.add_argument("--llm-latency", type=float, default=0.5,
+                        help="Seconds per fake LLM call in the end-to-end plan cache check")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run_size(rows, args.families, args.samples, args.llm_latency, tmp)
+        results.append(result)
+        print(f"\n--- {rows:,} rows ({result['rows_per_family']:,} per family) ---")
+        print(f"SQLite load {result['sqlite_load_seconds']:.1f}s, {result['sqlite_bytes'] / 1024 ** 2:.1f} MB "
+              f"(Parquet {result['parquet_bytes'] / 1024 ** 2:.1f} MB); "
+              f"pandas family load p50 {result['pandas_family_load']['p50_ms']:.2f} ms")
+        for name, *_ in QUERIES:
+            print(f"{name:>14}: pandas p50 {result['pandas'][name]['p50_ms']:.3f} ms, "
+                  f"SQL p50 {result['sql'][name]['p50_ms']:.3f} ms")
+        print("SQL end to end: " + ", ".join(
+            f"plan cache {state} {ms:.1f} ms" for state, ms in result["sql_end_to_end_ms"].items()
+        ) + f" ({result['llm_calls']} LLM call; the pandas agent makes at least 2 per question)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+from agents.code_pool import CodeExecutionPool
+from agents.portfolio_store import PortfolioStore, ingest_csv
+from benchmark import latency_summary, write_portfolio
+from benchmark_analyst_sql import QUERIES
+from generate_docs import synthetic_families
+
+RUNAWAY_CODE = "while True: pass"
+MEMORY_BOMB_CODE = "blocks = [bytearray(256 * 1024 ** 2) for _ in range(64)]"
+# CPU-bound snippet used for the parallel throughput check
+HEAVY_CODE = "df.groupby(['Location', 'Asset_Class'], observed=True)['Value_USD'].describe()"
+STATUS_CODE = "open('/proc/self/status').read()"
+
+
+def memory_mb(status: str) -> dict:
+    """
+    Private (anonymous) and file-backed resident memory from /proc/<pid>/status.
+    """
+    fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+    return {key: int(fields[key].split()[0]) / 1024 for key in ("RssAnon", "RssFile") if key in fields}
+
+
+def timed_runs(fn, code: str, count: int) -> list:
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn(code)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def concurrent_runs(pool: CodeExecutionPool, jobs: list) -> tuple:
+    """
+    Runs (family, code) jobs on one thread each; returns (wall seconds, outputs).
+    """
+    outputs = [None] * len(jobs)
+
+    def run(i, family, code):
+        outputs[i] = pool.run(family, code)
+
+    threads = [threading.Thread(target=run, args=(i, *job)) for i, job in enumerate(jobs)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyst code execution: in-process REPL vs the worker pool.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--samples", type=int, default=5, help="Runs per query")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Seconds before a snippet is killed")
+    parser.add_argument("--memory-mb", type=int, default=1024, help="Heap limit per worker")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "portfolio.csv")
+        dataset_dir = os.path.join(tmp, "portfolio")
+        names = [family.title() for family in synthetic_families(args.families)]
+        write_portfolio(csv_path, names, args.rows)
+        ingest_csv(csv_path, dataset_dir)
+        os.remove(csv_path)
+        store = PortfolioStore(path=csv_path, dataset_dir=dataset_dir)
+        family = random.Random(0).choice(names)
+
+        pool = CodeExecutionPool(
+            workers=args.workers, timeout_seconds=args.timeout, memory_limit=args.memory_mb * 1024 * 1024,
+            frame_dir=os.path.join(tmp, "frames"), store=store,
+        )
+        start = time.perf_counter()
+        pool.warm([family])
+        warm_seconds = time.perf_counter() - start
+
+        inline = PythonAstREPLTool(locals={"df": store.family(family)})
+        latency = {}
+        for name, code, _, _ in QUERIES:
+            latency[name] = {
+                "inline": latency_summary(timed_runs(inline.run, code, args.samples)),
+                "pool": latency_summary(timed_runs(lambda c: pool.run(family, c), code, args.samples)),
+            }
+        worker_memory = memory_mb(pool.run(family, STATUS_CODE))
+
+        # A runaway snippet holds one worker until it is killed; the others keep answering
+        runaway = threading.Thread(target=pool.run, args=(family, RUNAWAY_CODE))
+        runaway.start()
+        time.sleep(0.1)
+        during_runaway = latency_summary(timed_runs(lambda c: pool.run(family, c), QUERIES[1][1], args.samples))
+        runaway.join()
+        memory_bomb = pool.run(family, MEMORY_BOMB_CODE)
+
+        # Once per worker first, so neither measurement pays first-run costs
+        concurrent_runs(pool, [(family, HEAVY_CODE)] * args.workers)
+        serial = sum(timed_runs(lambda c: pool.run(family, c), HEAVY_CODE, args.workers))
+        parallel, _ = concurrent_runs(pool, [(family, HEAVY_CODE)] * args.workers)
+
+        result = {
+            "rows_per_family": args.rows // args.families,
+            "warm_seconds": warm_seconds,
+            "latency": latency,
+            "worker_memory_mb": worker_memory,
+            "during_runaway": during_runaway,
+            "memory_bomb": memory_bomb,
+            "parallel_speedup": serial / parallel,
+            "stats": pool.stats(),
+        }
+        pool.close()
+
+    print(f"--- {result['rows_per_family']:,} rows per family, {args.workers} workers ---")
+    print(f"Pool start and frame export: {warm_seconds:.2f}s")
+    for name, times in latency.items():
+        print(f"{name:>14}: inline p50 {times['inline']['p50_ms']:.2f} ms, pool p50 {times['pool']['p50_ms']:.2f} ms")
+    print(f"Worker resident memory: {worker_memory.get('RssAnon', 0):.0f} MB private, "
+          f"{worker_memory.get('RssFile', 0):.0f} MB shared file pages")
+    print(f"While a runaway snippet ran: p50 {during_runaway['p50_ms']:.2f} ms")
+    print(f"Memory bomb: {memory_bomb}")
+    print(f"Parallel speedup with {args.workers} workers: {result['parallel_speedup']:.2f}x "
+          f"({os.cpu_count()} CPUs)")
+    print(f"Pool stats: {result['stats']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "result": result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
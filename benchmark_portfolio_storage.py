@@ -0,0 +1,128 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from agents.portfolio_store import PortfolioStore, ingest_csv
+from benchmark import write_portfolio
+from generate_docs import synthetic_families
+
+RESEARCHER_COLUMNS = ["Asset_Name", "Asset_Class", "Value_USD"]
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size (Linux); 0 where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def latency_summary(latencies: list) -> dict:
+    ms = sorted(t * 1000 for t in latencies)
+    return {
+        "mean_ms": statistics.mean(ms),
+        "p50_ms": statistics.median(ms),
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+    }
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def run_layout(layout: str, csv_path: str, dataset_dir: str, families: list) -> dict:
+    """
+    Loads the sampled families from one layout in a fresh process, so RSS
+    deltas and cold-read timings are not polluted by the other layout.
+    """
+    rss_before = rss_bytes()
+    full, projected = [], []
+    if layout == "csv":
+        # The previous loader: parse the whole file, then select the family
+        start = time.perf_counter()
+        df = pd.read_csv(csv_path, dtype={"Family": "category", "Asset_Class": "category",
+                                          "Liquidity": "category", "Location": "category"})
+        first_seconds = time.perf_counter() - start
+        for family in families:
+            start = time.perf_counter()
+            df[df["Family"] == family].reset_index(drop=True)
+            full.append(time.perf_counter() - start)
+    else:
+        # Cache size 0: every lookup is a cold read of its partition
+        store = PortfolioStore(path=csv_path + ".absent", dataset_dir=dataset_dir, cache_size=0)
+        start = time.perf_counter()
+        store.family(families[0])
+        first_seconds = time.perf_counter() - start
+        for family in families:
+            start = time.perf_counter()
+            store.family(family)
+            full.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.family(family, columns=RESEARCHER_COLUMNS)
+            projected.append(time.perf_counter() - start)
+
+    result = {
+        "layout": layout,
+        "first_load_seconds": first_seconds,
+        "rss_delta_bytes": rss_bytes() - rss_before,
+        "family_load": latency_summary(full),
+    }
+    if projected:
+        result["family_load_projected"] = latency_summary(projected)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Family-partitioned Parquet vs CSV portfolio loading.")
+    parser.add_argument("--families", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=50, help="Families loaded per layout")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "portfolio.csv")
+        dataset_dir = os.path.join(tmp, "portfolio")
+        names = [family.title() for family in synthetic_families(args.families)]
+        write_portfolio(csv_path, names, args.rows)
+
+        start = time.perf_counter()
+        ingest_csv(csv_path, dataset_dir)
+        ingest_seconds = time.perf_counter() - start
+        sampled = random.Random(0).sample(names, min(args.samples, len(names)))
+
+        results = []
+        ctx = multiprocessing.get_context("spawn")
+        for layout in ("csv", "parquet"):
+            with ctx.Pool(1) as pool:
+                result = pool.apply(run_layout, (layout, csv_path, dataset_dir, sampled))
+            results.append(result)
+            print(f"{layout:>8}: first load {result['first_load_seconds'] * 1000:.1f} ms, "
+                  f"family p50 {result['family_load']['p50_ms']:.3f} ms, "
+                  f"RSS +{result['rss_delta_bytes'] / 1024 ** 2:.1f} MB")
+        print(f"Ingest {ingest_seconds:.2f}s; CSV {os.path.getsize(csv_path) / 1024 ** 2:.1f} MB, "
+              f"Parquet {dir_bytes(dataset_dir) / 1024 ** 2:.1f} MB; "
+              f"projected family p50 {results[1]['family_load_projected']['p50_ms']:.3f} ms")
+        storage = {
+            "ingest_seconds": ingest_seconds,
+            "csv_bytes": os.path.getsize(csv_path),
+            "parquet_bytes": dir_bytes(dataset_dir),
+        }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "storage": storage, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agents.index_store import LegalIndexStore
+from agents.tenant_index import CHUNK_OVERLAP, CHUNK_SIZE, TenantIndex
+from generate_docs import synthetic_families, write_family_docs
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size (Linux); 0 where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def latency_summary(latencies: list) -> dict:
+    ms = sorted(t * 1000 for t in latencies)
+    return {
+        "mean_ms": statistics.mean(ms),
+        "p50_ms": statistics.median(ms),
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+    }
+
+
+def run_layout(layout: str, docs_dir: str, index_dir: str, families: list, queries: int, dim: int) -> dict:
+    """
+    Builds one layout over all families and measures memory and MMR latency.
+    Runs in a fresh process so RSS deltas are not polluted by the other layout.
+    """
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    rss_before = rss_bytes()
+
+    start = time.perf_counter()
+    if layout == "per_family":
+        store = LegalIndexStore(embeddings, splitter, root=index_dir)
+        stores = {family: store.load(family, os.path.join(docs_dir, family)) for family in families}
+    else:
+        index = TenantIndex(embeddings, splitter, root=index_dir)
+        for family in families:
+            index.sync(family, os.path.join(docs_dir, family), save=False)
+        index.save()
+    build_seconds = time.perf_counter() - start
+    rss_after = rss_bytes()
+
+    rng = random.Random(0)
+    workload = [rng.choice(families) for _ in range(queries)]
+    vectors = [embeddings.embed_query(f"Who are the beneficiaries of the {family} will?") for family in workload]
+    latencies, leaks = [], 0
+    for family, vector in zip(workload, vectors):
+        start = time.perf_counter()
+        if layout == "per_family":
+            docs = stores[family].max_marginal_relevance_search_by_vector(vector, k=4, fetch_k=20)
+        else:
+            docs = index.max_marginal_relevance_search(family, vector, k=4, fetch_k=20)
+        latencies.append(time.perf_counter() - start)
+        leaks += sum(1 for doc in docs if os.path.join(docs_dir, family) not in doc.metadata.get("source", ""))
+
+    result = {
+        "layout": layout,
+        "families": len(families),
+        "build_seconds": build_seconds,
+        "rss_delta_bytes": rss_after - rss_before,
+        "query": latency_summary(latencies),
+        "cross_tenant_results": leaks,
+    }
+    if layout == "tenant":
+        result["estimated_bytes"] = index.memory_bytes()
+        # Onboarding and offboarding a tenant must not rebuild the others
+        extra = os.path.join(docs_dir, "_extra")
+        write_family_docs(extra, "_extra", synthetic_families(1, seed=1)["house00000"])
+        start = time.perf_counter()
+        index.sync("_extra", extra)
+        result["add_tenant_seconds"] = time.perf_counter() - start
+        start = time.perf_counter()
+        index.remove("_extra")
+        result["remove_tenant_seconds"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared multi-tenant index vs one FAISS index per family.")
+    parser.add_argument("--families", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding size (text-embedding-ada-002 is 1536)")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "legal_docs")
+        families = synthetic_families(args.families)
+        for family, data in families.items():
+            write_family_docs(os.path.join(docs_dir, family), family, data)
+
+        results = []
+        ctx = multiprocessing.get_context("spawn")
+        for layout in ("per_family", "tenant"):
+            with ctx.Pool(1) as pool:
+                result = pool.apply(run_layout, (
+                    layout, docs_dir, os.path.join(tmp, layout), list(families), args.queries, args.dim,
+                ))
+            results.append(result)
+            print(f"{layout:>10}: build {result['build_seconds']:.2f}s, "
+                  f"RSS +{result['rss_delta_bytes'] / 1024 ** 2:.1f} MB, "
+                  f"query p50 {result['query']['p50_ms']:.3f} ms / p95 {result['query']['p95_ms']:.3f} ms, "
+                  f"cross-tenant results {result['cross_tenant_results']}")
+        tenant = results[1]
+        print(f"Tenant add {tenant['add_tenant_seconds'] * 1000:.1f} ms, "
+              f"remove {tenant['remove_tenant_seconds'] * 1000:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import os
+import tempfile
+import time
+from dotenv import load_dotenv
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agents.tenant_index import CHUNK_OVERLAP, CHUNK_SIZE, RETRIEVAL_MODES, TenantIndex
+from evaluate_router import latency_summary
+from generate_docs import families, synthetic_families, write_distractor_docs, write_family_docs
+
+# Load env vars
+load_dotenv()
+
+
+def labelled_queries(data: dict) -> list:
+    """
+    (query, relevant files) pairs for one family, written against the
+    documents `write_family_docs` produces for it.
+    """
+    queries = [(f"Is {name} a beneficiary?", {"will.txt"}) for name in data["beneficiaries"]]
+    queries += [(f"Does the family trust hold {asset}?", {"trust_deed.txt"}) for asset in data["assets"]]
+    queries += [
+        (f"What role does {data['trustee']} have?", {"will.txt", "trust_deed.txt"}),
+        ("Who is the executor of the will?", {"will.txt"}),
+        ("What does clause II of the will say?", {"will.txt"}),
+        ("Who is the trustee and what assets are held?", {"trust_deed.txt"}),
+        ("What does the insurance policy exclude?", {"insurance_policy.txt"}),
+        ("How much is the annual premium?", {"insurance_policy.txt"}),
+        ("What is the target return and risk tolerance of the investment mandate?", {"investment_agreement.txt"}),
+    ]
+    return queries
+
+
+def build_index(embeddings, corpus: dict, root: str, distractors: int = 0) -> TenantIndex:
+    """
+    Indexes each family's documents plus `distractors` correspondence files,
+    so a family has more chunks than the k being evaluated.
+    """
+    index = TenantIndex(
+        embeddings, RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP),
+        root=os.path.join(root, "index"),
+    )
+    for family, data in corpus.items():
+        path = os.path.join(root, "docs", family)
+        write_family_docs(path, family, data)
+        write_distractor_docs(path, family, data, distractors)
+        index.sync(family, path, save=False)
+    return index
+
+
+def evaluate(index: TenantIndex, corpus: dict, mode: str, ks: list) -> dict:
+    """
+    Mean recall@k for each k, per-query latencies and the number of query
+    embedding calls made.
+    """
+    # Only the fake embeddings count their calls
+    calls_before = getattr(index.embeddings, "calls", None)
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for family, data in corpus.items():
+        retriever = index.as_retriever(family, k=max(ks), mode=mode)
+        for query, relevant in labelled_queries(data):
+            start = time.perf_counter()
+            docs = retriever.invoke(query)
+            latencies.append(time.perf_counter() - start)
+            for k in ks:
+                found = {doc.metadata["file"] for doc in docs[:k]}
+                recalls[k].append(len(found & relevant) / len(relevant))
+    return {
+        "recall": {k: sum(values) / len(values) for k, values in recalls.items()},
+        "latencies": latencies,
+        "embedding_calls": None if calls_before is None else index.embeddings.calls - calls_before,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the Lawyer's retrieval modes on the generated legal docs.")
+    parser.add_argument("--synthetic-families", type=int, default=20,
+                        help="Generated families added to the built-in ones")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--distractors", type=int, default=8,
+                        help="Correspondence files added per family, so recall@k isn't trivially 100%%")
+    parser.add_argument("--offline", action="store_true", help="Use fake embeddings even if OPENAI_API_KEY is set")
+    parser.add_argument("--embedding-latency", type=float, default=0.2,
+                        help="Seconds per fake embedding call, standing in for the API round trip")
+    args = parser.parse_args()
+
+    if args.offline or not os.getenv("OPENAI_API_KEY"):
+        from agents.fake_backends import FakeEmbeddings
+
+        embeddings = FakeEmbeddings(latency_seconds=args.embedding_latency)
+        print("Using fake embeddings: vector recall is at chance level, latencies include "
+              f"{args.embedding_latency * 1000:.0f} ms per embedding call.")
+    else:
+        from agents.llm_backends import create_embeddings
+
+        embeddings = create_embeddings()
+
+    corpus = {**families, **synthetic_families(args.synthetic_families)}
+    query_count = sum(len(labelled_queries(data)) for data in corpus.values())
+    print(f"Evaluating on {query_count} queries over {len(corpus)} families")
+
+    with tempfile.TemporaryDirectory() as root:
+        index = build_index(embeddings, corpus, root, args.distractors)
+        min_chunks = min(index.chunk_count(family) for family in corpus)
+        print(f"Chunks per family: at least {min_chunks}")
+        if max(args.k) >= min_chunks:
+            print(f"Warning: k={max(args.k)} retrieves every chunk of some families; recall there is 100% in every mode.")
+        for mode in RETRIEVAL_MODES:
+            result = evaluate(index, corpus, mode, args.k)
+            print(f"\n--- {mode} ---")
+            print("Recall: " + ", ".join(f"@{k} {recall:.1%}" for k, recall in result["recall"].items()))
+            print(f"Latency: {latency_summary(result['latencies'])}")
+            if result["embedding_calls"] is not None:
+                print(f"Query embedding calls: {result['embedding_calls']}")
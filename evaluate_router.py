@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import statistics
+import time
+from dotenv import load_dotenv
+
+from agents.route_classifier import LABELS, RouteClassifier, load_labelled_queries
+
+# Load env vars
+load_dotenv()
+
+
+def normalize_route(route: str) -> str:
+    """
+    Maps raw router output to a label the same way RouterAgent does.
+    """
+    for label in LABELS:
+        if label in route:
+            return label
+    return "Unknown"
+
+
+def latency_summary(latencies: list) -> str:
+    ms = sorted(t * 1000 for t in latencies)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"mean {statistics.mean(ms):.3f} ms, p50 {statistics.median(ms):.3f} ms, p95 {p95:.3f} ms"
+
+
+def cross_validate(examples: list, folds: int) -> list:
+    """
+    Returns (expected, predicted, confidence, seconds) per query, in input order,
+    each predicted by a classifier that did not see it during training.
+    """
+    fold_of = list(range(len(examples)))
+    random.Random(0).shuffle(fold_of)
+    results = [None] * len(examples)
+    for fold in range(folds):
+        train = [e for i, e in enumerate(examples) if fold_of[i] % folds != fold]
+        classifier = RouteClassifier(train)
+        for i, (query, label) in enumerate(examples):
+            if fold_of[i] % folds != fold:
+                continue
+            start = time.perf_counter()
+            predicted, confidence = classifier.predict(query)
+            results[i] = (label, predicted, confidence, time.perf_counter() - start)
+    return results
+
+
+def evaluate_llm(examples: list) -> list:
+    from langchain_openai import ChatOpenAI
+    from agents.router import create_llm_router
+
+    chain = create_llm_router(ChatOpenAI(model="gpt-4o", temperature=0))
+    results = []
+    for query, label in examples:
+        start = time.perf_counter()
+        predicted = normalize_route(chain.invoke({"input": query}))
+        results.append((label, predicted, 1.0, time.perf_counter() - start))
+    return results
+
+
+def accuracy(results: list) -> float:
+    return sum(expected == predicted for expected, predicted, _, _ in results) / max(len(results), 1)
+
+
+if __name__ == "__main__":
+    from agents.router import ROUTE_CONFIDENCE_THRESHOLD
+
+    parser = argparse.ArgumentParser(description="Evaluate the local router against the LLM router.")
+    parser.add_argument("--threshold", type=float, default=ROUTE_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+
+    examples = load_labelled_queries()
+    print(f"Evaluating on {len(examples)} labelled queries (threshold {args.threshold:.2f})")
+
+    print("\n--- Local Classifier ---")
+    local = cross_validate(examples, args.folds)
+    accepted = [r for r in local if r[2] >= args.threshold]
+    print(f"Accuracy ({args.folds}-fold CV): {accuracy(local):.1%}")
+    print(f"Coverage above threshold: {len(accepted) / len(local):.1%}")
+    print(f"Accuracy above threshold: {accuracy(accepted):.1%}")
+    print(f"Latency: {latency_summary([r[3] for r in local])}")
+
+    print("\n--- LLM Router ---")
+    if not os.getenv("OPENAI_API_KEY"):
+        print("SKIPPING: No OPENAI_API_KEY found.")
+    else:
+        llm = evaluate_llm(examples)
+        print(f"Accuracy: {accuracy(llm):.1%}")
+        print(f"Latency: {latency_summary([r[3] for r in llm])}")
+
+        # Local answers when confident, otherwise escalate (as RouterAgent.route does)
+        combined = [
+            r_local if r_local[2] >= args.threshold else (r_llm[0], r_llm[1], r_llm[2], r_local[3] + r_llm[3])
+            for r_local, r_llm in zip(local, llm)
+        ]
+        print("\n--- Local + LLM Escalation ---")
+        print(f"Accuracy: {accuracy(combined):.1%}")
+        print(f"Latency: {latency_summary([r[3] for r in combined])}")
+        print(f"LLM calls saved: {len(accepted) / len(local):.1%}")
@@ -1,4 +1,5 @@
 import os
+import random
 
 families = {
     "wayne": {
@@ -30,8 +31,12 @@ families = {
 
 doc_types = ["will", "trust_deed", "insurance_policy", "investment_agreement"]
 
-for family, data in families.items():
-    base_path = f"data/legal_docs/{family}"
+
+def write_family_docs(base_path, family, data):
+    """
+    Writes the four legal documents for one family into `base_path`.
+    """
+    os.makedirs(base_path, exist_ok=True)
     
     # Will
     with open(f"{base_path}/will.txt", "w") as f:
@@ -64,4 +69,62 @@ for family, data in families.items():
         f.write("Target Return: 15% per annum.\n")
         f.write("Restrictions: No investment in rival houses.\n")
 
-print("Legal docs generated successfully.")
+
+# Correspondence filed next to the legal documents in evaluations. It mentions
+# the same people, assets and terms without stating the facts, so retrieval
+# has to rank the real document above it.
+DISTRACTOR_TEMPLATES = [
+    "Minutes of the {house} estate committee. {trustee} reported on the upkeep of {asset}; repairs were "
+    "approved within the annual budget. {person} asked when the next valuation of {asset} is due.",
+    "Letter to {person}. You are invited to the annual family review of House {house}. Questions about "
+    "whether you are a beneficiary of any arrangement, or who acts as executor, should go to counsel.",
+    "Note on the insurance renewal for House {house}. The brokers proposed a higher premium and further "
+    "exclusions for {asset}; {trustee} asked for alternatives and no decision was taken.",
+    "Investment committee memo for House {house}. {person} questioned the risk tolerance and target "
+    "return discussed at the last meeting; {trustee} will present options on {asset} next quarter.",
+    "Household correspondence of House {house}. {person} wrote to {trustee} about travel plans, staff "
+    "changes at {asset} and the calendar for the coming season.",
+]
+
+
+def write_distractor_docs(base_path, family, data, count, seed=0):
+    """
+    Writes `count` correspondence files for one family into `base_path`.
+    """
+    os.makedirs(base_path, exist_ok=True)
+    rng = random.Random(f"{seed}:{family}")
+    for i in range(count):
+        text = rng.choice(DISTRACTOR_TEMPLATES).format(
+            house=family.title(),
+            trustee=data["trustee"],
+            person=rng.choice(data["beneficiaries"]),
+            asset=rng.choice(data["assets"]),
+        )
+        with open(f"{base_path}/correspondence_{i:02d}.txt", "w") as f:
+            f.write(f"CORRESPONDENCE FILE {i + 1} - HOUSE {family.upper()}\n\n{text}\n")
+
+
+def synthetic_families(count, seed=0):
+    """
+    Generates `count` families shaped like `families`, for benchmarks.
+    """
+    rng = random.Random(seed)
+    first_names = ["Aldric", "Bryn", "Cass", "Dorian", "Elena", "Fenn", "Gwen", "Hal", "Isolde", "Joss"]
+    assets = ["Manor", "Vineyard", "Shipyard", "Mine", "Harbour", "Keep", "Forest", "Mill"]
+    result = {}
+    for i in range(count):
+        house = f"house{i:05d}"
+        name = house.title()
+        result[house] = {
+            "beneficiaries": [f"{first} {name}" for first in rng.sample(first_names, rng.randint(2, 5))],
+            "assets": [f"{name} {asset}" for asset in rng.sample(assets, 2)],
+            "trustee": f"{rng.choice(first_names)} {name}",
+        }
+    return result
+
+
+if __name__ == "__main__":
+    for family, data in families.items():
+        write_family_docs(f"data/legal_docs/{family}", family, data)
+
+    print("Legal docs generated successfully.")
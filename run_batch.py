@@ -0,0 +1,60 @@
+import argparse
+import csv
+import datetime
+from dotenv import load_dotenv
+
+from agents.batch import BATCH_CONCURRENCY, BatchRunner
+from agents.portfolio_store import get_portfolio_store
+
+# Load env vars
+load_dotenv()
+
+# Questions asked for every family in the nightly report.
+NIGHTLY_QUESTIONS = [
+    "What is my total AUM?",
+    "Break down my portfolio by liquidity",
+    "Which legal documents or trust terms expire or need renewal soon?",
+    "What is the market outlook for the coming quarter?",
+]
+
+
+def read_pairs(path: str) -> list:
+    """
+    Reads (family, query) pairs from a CSV with 'family' and 'query' columns.
+    """
+    with open(path, newline="") as f:
+        return [(row["family"], row["query"]) for row in csv.DictReader(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run (family, query) pairs in a batch, e.g. the nightly reports.")
+    parser.add_argument("--input", default=None, help="CSV with family,query columns (default: nightly questions)")
+    parser.add_argument("--families", nargs="*", default=None, help="Families for the nightly questions (default: all)")
+    parser.add_argument("--output", default=f"data/reports/nightly-{datetime.date.today().isoformat()}.jsonl")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--fresh", action="store_true", help="Ignore results already in the output file")
+    parser.add_argument("--no-shared-research", action="store_true",
+                        help="Fetch market questions per family instead of once per batch")
+    args = parser.parse_args()
+
+    if args.input:
+        pairs = read_pairs(args.input)
+    else:
+        families = args.families or get_portfolio_store().families()
+        pairs = [(family, question) for family in families for question in NIGHTLY_QUESTIONS]
+
+    runner = BatchRunner(concurrency=args.concurrency, share_research=not args.no_shared_research)
+
+    def progress(record):
+        print(f"[{runner.stats['completed']}/{len(pairs)}] {record['family']}: {record['query']} "
+              f"-> {record.get('agent')} ({record['seconds']:.1f}s)", flush=True)
+
+    summary = runner.run(pairs, args.output, resume=not args.fresh, on_result=progress)
+    print(f"{summary['completed']} completed ({summary['skipped']} already done, {summary['errors']} errors) "
+          f"in {summary['seconds']:.1f}s: {summary['queries_per_minute']:.1f} queries/min. "
+          f"LLM routing calls: {summary['routing_llm_calls']}, research fetches: {summary['research_fetches']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Modules whose import cost is tracked; app.py must only need the first ones for the picker
+IMPORT_TARGETS = [
+    "agents.prewarm",
+    "agents.agent_pool",
+    "agents.conversation",
+    "agents.portfolio_store",
+    "agents.llm_backends",
+    "agents.tenant_index",
+    "agents.lawyer",
+    "agents.researcher",
+    "agents.analyst",
+    "agents.router",
+]
+# Imported by the picker page they would mean a heavy import crept back in
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_community", "langchain_experimental",
+                 "langchain_openai", "openai", "faiss", "pandas", "pyarrow"]
+PICKER_TARGET_SECONDS = 1.0
+
+# Runs in a fresh interpreter: renders the picker page, then waits for the prewarm if it started
+PICKER_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_seconds = time.perf_counter() - start
+if os.environ.get("WEALTHBRAIN_FAKE_BACKENDS") == "1":
+    from agents.fake_backends import install_fake_backends
+    install_fake_backends()
+at = AppTest.from_file(sys.argv[3], default_timeout=120)
+at.secrets["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "")
+at.secrets["PERPLEXITY_API_KEY"] = os.environ.get("PERPLEXITY_API_KEY", "")
+start = time.perf_counter()
+at.run()
+picker_seconds = time.perf_counter() - start
+heavy = sorted(m for m in json.loads(sys.argv[1]) if m in sys.modules)
+start = time.perf_counter()
+at.run()
+rerun_seconds = time.perf_counter() - start
+result = {
+    "streamlit_import_seconds": streamlit_seconds,
+    "picker_seconds": picker_seconds,
+    "picker_rerun_seconds": rerun_seconds,
+    "picker_errors": [e.value for e in at.exception],
+    "heavy_modules_on_picker": heavy,
+}
+from agents.prewarm import get_prewarmer
+prewarmer = get_prewarmer()
+if prewarmer is not None:
+    prewarmer.wait(float(sys.argv[2]))
+    result["prewarm"] = prewarmer.report()
+print(json.dumps(result))
+"""
+
+
+def import_times(module: str) -> dict:
+    """
+    Imports `module` in a fresh interpreter with -X importtime. Returns its
+    cumulative import time and the slowest third-party imports made directly
+    by the agents modules, i.e. the ones worth deferring.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1]}
+    total, direct = 0, {}
+    # Lines are printed children first; read backwards, each line's parent is the last shallower one
+    stack = []
+    for line in reversed(proc.stderr.splitlines()):
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        parent = stack[-1][1] if stack else None
+        stack.append((depth, name))
+        if name == module:
+            total = int(cumulative) / 1e6
+        elif parent and parent.startswith("agents") and not name.startswith("agents"):
+            direct[f"{parent}: {name}"] = int(cumulative) / 1e6
+    slowest = sorted(direct.items(), key=lambda item: item[1], reverse=True)[:3]
+    return {"seconds": total, "slowest": dict(slowest)}
+
+
+def picker_startup(prewarm: bool, fake_backends: bool = False, prewarm_timeout: float = 0) -> dict:
+    """
+    Renders the picker page in a fresh interpreter. With `fake_backends` it
+    runs in a scratch copy of the portfolio and documents, since an index
+    built with the fake embeddings would replace the real one.
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, WEALTHBRAIN_PREWARM="1" if prewarm else "0",
+               WEALTHBRAIN_FAKE_BACKENDS="1" if fake_backends else "0",
+               PYTHONPATH=os.pathsep.join(filter(None, [repo_dir, os.environ.get("PYTHONPATH")])))
+    workspace = tempfile.mkdtemp(prefix="wealthbrain-startup-") if fake_backends else None
+    try:
+        if workspace:
+            for name in ("portfolio", "legal_docs"):
+                if os.path.isdir(os.path.join("data", name)):
+                    shutil.copytree(os.path.join("data", name), os.path.join(workspace, "data", name))
+        proc = subprocess.run(
+            [sys.executable, "-c", PICKER_SCRIPT, json.dumps(HEAVY_MODULES), str(prewarm_timeout),
+             os.path.join(repo_dir, "app.py")],
+            capture_output=True, text=True, env=env, cwd=workspace or os.getcwd(),
+        )
+    finally:
+        if workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and startup-time report for the Streamlit app.")
+    parser.add_argument("--no-prewarm", action="store_true", help="Don't measure the background prewarm")
+    parser.add_argument("--fake-backends", action="store_true",
+                        help="Prewarm with the offline fakes in a scratch copy of data/ (no API keys needed)")
+    parser.add_argument("--prewarm-timeout", type=float, default=300.0)
+    parser.add_argument("--max-picker-seconds", type=float, default=PICKER_TARGET_SECONDS,
+                        help="Exit with status 1 if the picker page takes longer")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    imports = {module: import_times(module) for module in IMPORT_TARGETS}
+    print("--- Import time (fresh interpreter each) ---")
+    for module, result in imports.items():
+        if "error" in result:
+            print(f"{module:>24}: failed ({result['error']})")
+            continue
+        print(f"{module:>24}: {result['seconds']:.2f}s")
+        for name, seconds in result["slowest"].items():
+            print(f"{'':>24}    {seconds:.2f}s  {name}")
+
+    # The picker alone first: the prewarm (and the fakes) import the heavy modules on purpose
+    startup = picker_startup(prewarm=False)
+    print("--- Picker page (cold process) ---")
+    print(f"Streamlit import: {startup['streamlit_import_seconds']:.2f}s")
+    print(f"First render: {startup['picker_seconds']:.2f}s, rerun: {startup['picker_rerun_seconds']:.2f}s")
+    print(f"Heavy modules loaded by the picker: {', '.join(startup['heavy_modules_on_picker']) or 'none'}")
+    if startup["picker_errors"]:
+        print(f"Errors: {startup['picker_errors']}")
+    prewarm = None
+    if not args.no_prewarm:
+        with_prewarm = picker_startup(True, args.fake_backends, args.prewarm_timeout)
+        prewarm = with_prewarm.get("prewarm")
+        startup["picker_seconds_with_prewarm"] = with_prewarm["picker_seconds"]
+        startup["prewarm"] = prewarm
+        print(f"First render with the prewarm on: {with_prewarm['picker_seconds']:.2f}s")
+    if prewarm:
+        print(f"--- Prewarm ({prewarm['families']} families): {prewarm['state']} in {prewarm['seconds']:.2f}s ---")
+        for key, resources in prewarm["timings"].items():
+            print(f"{key:>24}: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in resources.items()))
+        for key, error in prewarm["errors"].items():
+            print(f"{key:>24}: failed ({error})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "imports": imports, "startup": startup}, f, indent=2)
+
+    if startup["picker_errors"] or startup["picker_seconds"] > args.max_picker_seconds:
+        print(f"Picker page over budget ({args.max_picker_seconds:.2f}s) or failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -63,10 +63,47 @@ def test_router():
     except Exception as e:
         print(f"FAILED: {e}")
 
+def test_sql_plan_cache():
+    print("\n--- Testing SQL Plan Cache ---")
+    try:
+        from agents.sql_analyst import PlanCache, question_shape
+        known = {"Location": ["Stormlands", "USA"], "Asset_Class": ["Real Estate", "Equity"]}
+        cache = PlanCache()
+        shape, slots = question_shape("How much is in Stormlands?", known)
+        cache.put(shape, slots, "SELECT SUM(Value_USD) FROM holdings WHERE Location = :location",
+                  {"location": "Stormlands"})
+        # Same column: the plan is reused
+        assert cache.get(question_shape("How much is in USA?", known)[0]) is not None
+        # A value from another column must not bind into the Location plan
+        assert cache.get(question_shape("How much is in Real Estate?", known)[0]) is None
+        print("Response: OK")
+    except Exception as e:
+        print(f"FAILED: {e!r}")
+
+def test_sql_family_scope():
+    print("\n--- Testing SQL Family Scope ---")
+    try:
+        from agents.holdings_db import QueryError, _scoped
+        # Comments must not hide a schema-qualified table from the scope check
+        for sql in ["SELECT DISTINCT Family FROM main/**/.holdings",
+                    "SELECT DISTINCT Family FROM main -- x\n.holdings"]:
+            try:
+                _scoped(sql)
+                raise AssertionError(f"Not rejected: {sql!r}")
+            except QueryError:
+                pass
+        # A comment marker inside a string literal is just text
+        _scoped("SELECT * FROM holdings WHERE Asset_Name = '--'")
+        print("Response: OK")
+    except Exception as e:
+        print(f"FAILED: {e!r}")
+
 if __name__ == "__main__":
     print("Starting System Verification...")
     test_analyst()
     test_lawyer()
     test_researcher()
     test_router()
+    test_sql_plan_cache()
+    test_sql_family_scope()
     print("\nVerification Complete.")